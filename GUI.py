@@ -1,9 +1,34 @@
 import os
+import time
 from md_file import MD_file
 from utils import *
+from snapshot import WD_snapshot
+from md_index import MD_index, PD_index
+from propagate import MD_propagation
+from schema import Schema_compaction
+from export import MD_export
+from io_worker import IO_worker
+from watcher import diff_snapshots
+from moves import match_moves
+import instrumentation
 import tkinter as tk
 import tkinter.ttk as ttk
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
+
+
+# maximal number of search results shown in the treeview
+MAX_SEARCH_RESULTS = 5000
+
+# milliseconds between two looks for changes found by the watcher
+WATCH_INTERVAL = 500
+
+# milliseconds between two heartbeats of the Tk main loop while profiling
+HEARTBEAT_INTERVAL = 100
+# a heartbeat later than this (seconds) counts as a stall of the main loop
+STALL_THRESHOLD = 0.05
+
+# directories with more entries are inserted into the tree in chunks of this size between the events of the main loop
+TREE_CHUNK = 1000
 
 
 class GUI:
@@ -16,25 +41,56 @@ class GUI:
         - buttons for fast process options
         - buttons to add and remove keywords
     """
-    def __init__(self, working_dir, MD_files, keywords, processes):
+    def __init__(self, working_dir, MD_files, keywords, processes, snapshot=None, process_index=None, watcher=None, master=None):
         """
         Initializes the GUI handler
 
             working_dir     - string    ... path to the working directory
-            MD_files        - dict      ... dict containing MD_file dict wrapper for the metadata files
+            MD_files        - MD_file_dict ... lazy dict containing MD_file dict wrapper for the metadata files
+                                            (None while the startup still loads the working directory, see attach)
             keywords        - list      ... list containing all metadata keywords 
             processes       - PD_handler... object which handels the process descriptions
+            snapshot        - WD_snapshot ... snapshot of the working directory (created if not given)
+            process_index   - PD_index  ... index from process description to data files attached to MD_files
+                                            (built with the first process edit if not given)
+            watcher         - WD_watcher ... started watcher, new and removed files are shown while the tool runs (optional)
+            master          - tk.Tk     ... the hidden root window of the tool which becomes the main window (created if not given)
         """
         # saving important parameters
         self.working_dir = working_dir
+        # without MD_files the startup shows the snapshot once it is scanned (see show_snapshot)
+        if snapshot is None and not MD_files is None:
+            snapshot = WD_snapshot(working_dir)
+        self.snapshot = snapshot
         self.MD_files = MD_files
         self.keywords = keywords
         self.processes = processes
+        self.process_index = process_index
+
+        # the running [>], [>>] or [>>>] propagation (only one at a time)
+        self.propagation = None
+        # the running migration of metadata files with old keywords (only the latest one)
+        self.compaction = None
+        # the running export of all metadata (only one at a time)
+        self.export = None
 
-        # creating the tk master window
-        self.master = tk.Tk()
+        self.watcher = watcher
+
+        # creating the tk master window (or showing the root window which was used for the dialogs)
+        if master is None:
+            self.master = tk.Tk()
+        else:
+            self.master = master
+            self.master.deiconify()
         self.master.title("Metadata Tool")
 
+        # every access to the MD_files runs on this thread, in the order of the requests
+        self.io = IO_worker(self.master, on_error=self.on_io_error)
+        # path of the data file which is loaded in the background (the entries still show the last file)
+        self.loading = None
+        # True if the metadata of the shown data file could not be loaded (nothing is saved for it)
+        self.load_failed = False
+
         # creating a frame for the treeview
         self.tree_frame = tk.Frame(self.master)
 
@@ -46,8 +102,16 @@ class GUI:
         # using selectmode browse disables multiple selections in the treeview
         self.tree = ttk.Treeview(self.tree_frame, selectmode="browse")
         self.tree.heading("#0" ,text="File List")
-        self.tree.grid(column=0, row=1, sticky="ns")
-        self.tree_frame.rowconfigure(1, weight=1)
+        self.tree.grid(column=0, row=2, sticky="ns")
+        self.tree_frame.rowconfigure(2, weight=1)
+
+        # creating the search box which filters the treeview
+        # (the index over the metadata is built with the first search)
+        self.index = None
+        self.search_stringvar = tk.StringVar(self.master)
+        self.search_entry = tk.Entry(self.tree_frame, font = "Courier 11", textvariable=self.search_stringvar)
+        self.search_entry.grid(column=0, row=1, sticky="ew", pady=5)
+        self.search_entry.bind("<Return>", self.on_search)
 
         # loading the logo (as a gif because tkinter)
         # and displaying the logo abouth the tree view
@@ -56,9 +120,25 @@ class GUI:
         self.logo_canvas.create_image((0,0), image=self.logo, anchor="nw")
         self.logo_canvas.grid(column=0, row=0, sticky="nw", pady=5)
 
+        # button to export the metadata of all data files as csv or json lines
+        self.export_button = tk.Button(self.tree_frame, font = "Courier 11", text="export metadata",
+                                       bg = "gray70", command=self.start_export)
+        self.export_button.grid(column=0, row=3, sticky="ew", pady=5)
+
+        # status line with a progress bar while the startup loads the working directory (hidden otherwise)
+        self.status_stringvar = tk.StringVar(self.master)
+        self.status_label = tk.Label(self.tree_frame, font = "Courier 10", textvariable=self.status_stringvar, anchor="w")
+        self.status_bar = ttk.Progressbar(self.tree_frame, orient="horizontal", mode="indeterminate")
+
+        # chunks of large directories which are still inserted into the tree belong to this filling
+        self.tree_generation = 0
+
         # filling the treeview object
-        self.root = self.tree.insert("", "end", text=os.path.relpath(self.working_dir, os.getcwd()), open=True)
-        self.create_treeview(self.working_dir, self.root)
+        if not self.snapshot is None:
+            self.fill_treeview()
+
+        # binding the tree open event to fill directories on demand
+        self.tree.bind("<<TreeviewOpen>>", self.on_tree_open)
 
         # binding the tree select event to the treeview object to open the selected metadata file
         self.tree.bind("<<TreeviewSelect>>", self.on_tree_selection)
@@ -66,6 +146,14 @@ class GUI:
         # topframe is needed to create the list of entries later on
         self.topframe = None
 
+        # look for changes of the working directory from time to time
+        if not self.watcher is None:
+            self.master.after(WATCH_INTERVAL, self.poll_watcher)
+
+        # phases which end in a callback (timed while profiling)
+        self.selection_timer = None
+        self.propagation_timer = None
+
         # file_name=None is needed to counter a bug when adding or removing keywords
         # but no tree item is selected
         self.file_name = None
@@ -74,39 +162,262 @@ class GUI:
         self.last_opened_file = None
 
 
+    def fill_treeview(self):
+        """
+        Function which (re)creates the root element of the treeview,
+        only the first level is inserted, directories are filled when they are opened
+        """
+        with instrumentation.phase("tree build"):
+            self.create_tree_root()
+
+    def create_tree_root(self):
+        """
+        Function which inserts the root element and the first level of the treeview
+        """
+        # remove everything if the tree was already filled
+        self.tree.delete(*self.tree.get_children())
+        self.tree_generation += 1
+
+        # tree element -> absolute path of the file or directory
+        self.tree_paths = {}
+        # directory elements
+        self.tree_directories = set()
+        # directory element -> placeholder child which is replaced once the directory is opened
+        self.tree_placeholders = {}
+        # absolute path of a directory -> its element
+        self.tree_elements = {}
+
+        self.root = self.tree.insert("", "end", text=os.path.relpath(self.working_dir, os.getcwd()), open=True)
+        self.tree_paths[self.root] = os.path.abspath(self.working_dir)
+        self.tree_directories.add(self.root)
+        self.tree_elements[os.path.abspath(self.working_dir)] = self.root
+        self.create_treeview(self.working_dir, self.root)
+
+    def on_search(self, event):
+        """
+        Function which filters the treeview to the data files matching the search query
+        (see MD_index.query for the syntax), an empty query shows all files again
+        """
+        query = self.search_stringvar.get().strip()
+
+        if self.snapshot is None:
+            return
+
+        if query == "":
+            self.fill_treeview()
+            return
+
+        if self.is_loading():
+            return
+
+        # the index is built and queried in the background
+        self.io.submit(self.run_query, query, callback=self.show_search_results)
+
+    def run_query(self, query):
+        """
+        Function which answers a search query (runs on the I/O worker)
+
+            query   - string    ... the query
+        returns:
+            results - list      ... sorted paths to the matching data files
+        """
+        # build the index with the first search, it is kept up to date afterwards
+        if self.index is None:
+            self.index = MD_index()
+            self.MD_files.attach_index(self.index)
+
+        return sorted(self.index.query(query))
+
+    def show_search_results(self, results):
+        """
+        Function which shows the results of a search
+
+            results - list  ... paths to the matching data files
+        """
+        # show the results as a flat list below the root element
+        self.tree.delete(*self.tree.get_children())
+        self.tree_generation += 1
+        self.tree_paths = {}
+        self.tree_directories = set()
+        self.tree_placeholders = {}
+        self.tree_elements = {}
+
+        self.root = self.tree.insert("", "end", text=str(len(results)) + " files found", open=True)
+        self.tree_directories.add(self.root)
+        # tk gets slow with too many elements, only the first ones are shown
+        for path in results[:MAX_SEARCH_RESULTS]:
+            element = self.tree.insert(self.root, "end", text=os.path.relpath(path, self.working_dir))
+            self.tree_paths[element] = path
+
     def create_treeview(self, path, parent):   
         """
-        Recursive function which adds an tree element for each data file in the given path
+        Function which adds an tree element for each data file and directory in the given path.
+        Directories get a placeholder child and are filled when they are opened.
 
             path    - string        ... path to the directory which should be processed
             parent  - tree element  ... the parent element of this directory
         """ 
-        # iterate over all elements in path
-        for p in os.listdir(path):
-            # concatenate the path and p
-            abspath = os.path.join(path, p)
-            # checking if its not a metadata directory
-            if not "metadata" == p:
-                #insert the element into the treeview
-                parent_element = self.tree.insert(parent, "end", text=p, open=True)
-
-                # if the added element is a directory 
-                if os.path.isdir(abspath):
-                    # execute this function with the directory and the directory element as parent
-                    self.create_treeview(abspath, parent_element)
+        # iterate over all elements in path (metadata directories are already left out)
+        children = self.snapshot.children(path)
+        for p, is_dir in children[:TREE_CHUNK]:
+            self.insert_tree_element(path, parent, p, is_dir)
+
+        # the rest of a large directory follows in chunks, so the window stays responsive
+        if len(children) > TREE_CHUNK:
+            self.master.after(1, self.insert_tree_chunk, path, parent, children, TREE_CHUNK, self.tree_generation)
+
+    def insert_tree_chunk(self, path, parent, children, start, generation):
+        """
+        Function which inserts the next chunk of a large directory into the tree
+
+            path        - string        ... path to the directory
+            parent      - tree element  ... the element of this directory
+            children    - tuple         ... (name, is_dir) pairs of the directory
+            start       - int           ... index of the first entry of this chunk
+            generation  - int           ... filling of the tree the chunk belongs to
+        """
+        # the tree was filled again in the meantime (e.g. by a search)
+        if generation != self.tree_generation or not self.tree.exists(parent):
+            return
+
+        with instrumentation.phase("tree build"):
+            for p, is_dir in children[start:start + TREE_CHUNK]:
+                self.insert_tree_element(path, parent, p, is_dir)
+
+        if start + TREE_CHUNK < len(children):
+            self.master.after(1, self.insert_tree_chunk, path, parent, children, start + TREE_CHUNK, generation)
+
+    def insert_tree_element(self, path, parent, name, is_dir, index="end"):
+        """
+        Function which adds one tree element for a data file or directory
+
+            path    - string        ... path to the directory which contains the entry
+            parent  - tree element  ... the element of this directory
+            name    - string        ... name of the entry
+            is_dir  - bool          ... if the entry is a directory
+            index   - int/string    ... position below the parent
+        """
+        #insert the element into the treeview (closed by default)
+        element = self.tree.insert(parent, index, text=name, open=False)
+        self.tree_paths[element] = os.path.abspath(os.path.join(path, name))
+
+        # if the added element is a directory 
+        if is_dir:
+            self.tree_directories.add(element)
+            self.tree_elements[self.tree_paths[element]] = element
+            # add a placeholder so that the directory can be opened
+            self.tree_placeholders[element] = self.tree.insert(element, "end", text="...")
+
+    def forget_tree_element(self, element):
+        """
+        Function which removes a tree element and everything below it
+        """
+        for child in self.tree.get_children(element):
+            self.forget_tree_element(child)
+
+        path = self.tree_paths.pop(element, None)
+        if element in self.tree_directories:
+            self.tree_directories.discard(element)
+            self.tree_placeholders.pop(element, None)
+            self.tree_elements.pop(path, None)
+
+    def poll_watcher(self):
+        """
+        Function which looks for changes found by the watcher and applies them in the background
+        """
+        dirs = self.watcher.changes()
+        if len(dirs) > 0:
+            self.io.submit(self.apply_changes, dirs, callback=self.show_changes)
+        self.master.after(WATCH_INTERVAL, self.poll_watcher)
+
+    def apply_changes(self, dirs):
+        """
+        Function which lists the changed directories again and adds and removes
+        the data files in the MD_files, the metadata of renamed data files is moved with them (runs on the I/O worker)
+
+            dirs    - set   ... paths to the changed directories
+        returns:
+            changed - set   ... directories whose entries changed
+        """
+        snapshot = self.snapshot.rescan(dirs)
+        added, removed, changed = diff_snapshots(self.snapshot, snapshot, dirs)
+
+        # renamed data files are recognised by the identities saved in the manifest (see moves.py)
+        manifest = self.MD_files.manifest
+        new_files = []
+        if not manifest is None:
+            for path in added:
+                try:
+                    new_files.append((path, os.stat(path)))
+                except OSError:
+                    pass
+
+            for old, new in match_moves(removed, new_files, manifest.data_files):
+                # the metadata is moved before the new data file is added (which would create an empty one)
+                if self.MD_files.rename(old, new):
+                    manifest.data_files.pop(old, None)
+                    removed.remove(old)
+                    added.remove(new)
+
+        for path in removed:
+            self.MD_files.remove(path)
+        for path in added:
+            self.MD_files.add(path)
+
+        # data files added while the tool runs can be renamed as well
+        for path, st in new_files:
+            manifest.set_identity(path, st)
+
+        # the snapshot is immutable, replacing it is seen by the main thread at once
+        self.snapshot = snapshot
+        return changed
+
+    def show_changes(self, changed):
+        """
+        Function which updates the opened directories of the tree (callback of apply_changes)
+
+            changed - set   ... directories whose entries changed
+        """
+        for dir in changed:
+            element = self.tree_elements.get(os.path.abspath(dir))
+            # directories which were not opened yet are filled when they are opened
+            if element is None or element in self.tree_placeholders:
+                continue
+
+            existing = {self.tree.item(child, "text"): child for child in self.tree.get_children(element)}
+            children = self.snapshot.children(dir)
+            names = set(name for name, _ in children)
+
+            for name, child in existing.items():
+                if not name in names:
+                    self.forget_tree_element(child)
+                    self.tree.delete(child)
+
+            for i, (name, is_dir) in enumerate(children):
+                if not name in existing:
+                    self.insert_tree_element(dir, element, name, is_dir, index=i)
+
+    def on_tree_open(self, event):
+        """
+        Function which fills a directory element the first time it is opened
+        """
+        element = self.tree.focus()
+
+        # only directories which were not opened before have a placeholder
+        if element in self.tree_placeholders:
+            with instrumentation.phase("tree build"):
+                self.tree.delete(self.tree_placeholders.pop(element))
+                self.create_treeview(self.tree_paths[element], element)
 
     def get_tree_path(self, item):
         """
-        Recursive Function to calculate the filepath to a given tree element.
+        Function to get the filepath to a given tree element.
 
             item    - tree element  ... the element of the tree view for which the path should be created
         returns
-            path    - string        ... file path to the tree element
+            path    - string        ... file path to the tree element (None for placeholders)
         """
-        if self.tree.parent(item) == "":
-            return self.tree.item(item)["text"]
-        else:
-            return os.path.abspath(os.path.join(self.get_tree_path(self.tree.parent(item)), self.tree.item(item)["text"]))
+        return self.tree_paths.get(item)
 
     def edit_scroll_frame_focus(self, event, edit_canvas):
         """
@@ -145,10 +456,8 @@ class GUI:
         if i < len(self.entry_list)-1: # exclude the last entry
             self.entry_list[i+1].focus_set()
 
-        # get the path to the data file
-        path = os.path.abspath(self.file_name.get())
         # save the metadata of the entry box
-        self.MD_files[path][self.keywords[i]] = self.stringvar_list[i].get()
+        self.save_entry(i)
 
     def on_up_button(self, event, i):
         """
@@ -159,10 +468,8 @@ class GUI:
         if i > 1: # exclude the first entry
             self.entry_list[i-1].focus_set()
 
-        # get the path to the data file
-        path = os.path.abspath(self.file_name.get())
         # save the metadata of the entry box
-        self.MD_files[path][self.keywords[i]] = self.stringvar_list[i].get()
+        self.save_entry(i)
 
     def on_entry_focus_loss(self, event, i):
         """
@@ -170,10 +477,171 @@ class GUI:
 
             i   - index     ... index of the entry in the entry list
         """
+        # save the metadata of the entry box
+        self.save_entry(i)
+
+    def save_entry(self, i):
+        """
+        Function which saves the metadata of one entry box in the background
+
+            i   - index     ... index of the entry in the entry list
+        """
+        # the entries still show the last file while a new one is loaded
+        if self.topframe is None or not self.loading is None or self.load_failed:
+            return
+
         # get the path to the data file
         path = os.path.abspath(self.file_name.get())
-        # save the metadata of the entry box
-        self.MD_files[path][self.keywords[i]] = self.stringvar_list[i].get()
+        self.io.submit(self.write_metadata, path, {self.keywords[i]: self.stringvar_list[i].get()})
+
+    def write_metadata(self, path, data):
+        """
+        Function which saves metadata to the MD_file of a data file (runs on the I/O worker)
+
+            path    - string    ... path to the data file
+            data    - dict      ... keyword, information pairs
+        """
+        self.MD_files[path].update(data)
+
+    def read_metadata(self, path, descr):
+        """
+        Function which loads the metadata of a data file (runs on the I/O worker)
+
+            path    - string    ... path to the data file
+            descr   - string    ... process description (text or ID) which replaces an unknown one
+        returns:
+            data    - dict      ... keyword, information pairs
+        """
+        md = self.MD_files[path]
+
+        # make sure, that an up to date description (or the ID of one) is saved
+        if not self.processes.is_known(md[self.keywords[0]]):
+            md[self.keywords[0]] = descr
+
+        return dict(md.data)
+
+    def show_metadata(self, path, data):
+        """
+        Function which fills the entries with the loaded metadata (callback of read_metadata)
+
+            path    - string    ... path to the data file
+            data    - dict      ... keyword, information pairs
+        """
+        # another file was selected in the meantime
+        if self.loading != path:
+            return
+        self.loading = None
+
+        for i,keyword in enumerate(self.keywords):
+            # process description (the name is also found for an ID)
+            if i == 0:
+                self.stringvar_list[i].set(self.processes[[data.get(keyword, "")]])
+            # every other entry
+            else:
+                self.stringvar_list[i].set(data.get(keyword, ""))
+
+        # the selection ends once the entries show the file
+        instrumentation.end(self.selection_timer)
+        self.selection_timer = None
+
+    def on_metadata_error(self, path):
+        """
+        Function which stops waiting for the metadata of a data file which could not be loaded
+        (errback of read_metadata, the error itself is shown by on_io_error)
+
+            path    - string    ... path to the data file
+        """
+        if self.loading != path:
+            return
+        self.loading = None
+
+        # the entries do not show this file (nothing is saved), selecting it again loads it again
+        self.load_failed = True
+        for stringvar in self.stringvar_list:
+            stringvar.set("")
+
+        instrumentation.end(self.selection_timer)
+        self.selection_timer = None
+
+    def show_snapshot(self, snapshot):
+        """
+        Function which fills the tree once the startup scanned the working directory
+
+            snapshot    - WD_snapshot   ... snapshot of the working directory
+        """
+        self.snapshot = snapshot
+        self.fill_treeview()
+
+    def attach(self, MD_files, process_index=None, watcher=None):
+        """
+        Function which hands the MD_files created by the startup to the GUI
+
+            MD_files        - MD_file_dict  ... lazy dict containing MD_file dict wrapper for the metadata files
+            process_index   - PD_index      ... index from process description to data files attached to MD_files (optional)
+            watcher         - WD_watcher    ... started watcher (optional)
+        """
+        self.MD_files = MD_files
+        self.process_index = process_index
+
+        self.watcher = watcher
+        if not self.watcher is None:
+            self.master.after(WATCH_INTERVAL, self.poll_watcher)
+
+    def is_loading(self):
+        """
+        Function to check if the startup still loads the metadata (the user is told to wait)
+        """
+        if self.MD_files is None:
+            messagebox.showinfo("Loading", "The metadata of the working directory is still loading.\nPlease try again in a moment.")
+            return True
+        return False
+
+    def show_status(self, text, done=None, total=None):
+        """
+        Function which shows the status line with a progress bar below the tree
+
+            text    - string    ... what is done at the moment
+            done    - int       ... number of handled files (None for a progress bar without an end)
+            total   - int       ... number of all files
+        """
+        self.status_label.grid(column=0, row=4, sticky="ew")
+        self.status_bar.grid(column=0, row=5, sticky="ew", pady=(0, 5))
+
+        if done is None:
+            self.status_stringvar.set(text + " ...")
+            if str(self.status_bar["mode"]) != "indeterminate":
+                self.status_bar.config(mode="indeterminate")
+            self.status_bar.start(20)
+        else:
+            self.status_stringvar.set(text + " " + str(done) + " / " + str(total))
+            self.status_bar.stop()
+            self.status_bar.config(mode="determinate", maximum=max(1, total), value=done)
+
+    def hide_status(self):
+        """
+        Function which hides the status line
+        """
+        self.status_bar.stop()
+        self.status_label.grid_remove()
+        self.status_bar.grid_remove()
+
+    def heartbeat(self):
+        """
+        Function which is called from the Tk main loop every HEARTBEAT_INTERVAL while profiling
+        and records how much later than planned it was called
+        """
+        now = time.perf_counter()
+        late = now - self.heartbeat_time - HEARTBEAT_INTERVAL / 1000
+        if late > STALL_THRESHOLD:
+            instrumentation.record("tk stall", late)
+        self.heartbeat_time = now
+        self.master.after(HEARTBEAT_INTERVAL, self.heartbeat)
+
+    def on_io_error(self, error):
+        """
+        Function which shows errors of the I/O worker
+        """
+        messagebox.showerror("Error", "Reading or writing the metadata failed:\n" + str(error))
 
     def on_ctrl_s(self, event):
         """
@@ -227,18 +695,18 @@ class GUI:
             element = self.tree.selection()[0]
             # second get the path of this tree element
             path = self.get_tree_path(element)
+
+            # check if the element is a directory or placeholder (only files should be opened)
+            if path is None or element in self.tree_directories:
+                self.tree.selection_remove(element)
+                return
         else:
             path = os.path.abspath(self.last_selection)
 
-        # check if the path is a directory (only files should be opened)
-        if os.path.isdir(path):
-            self.tree.selection_remove(element)
-            return
-        else:
-            self.last_selection = path
+        self.last_selection = path
 
-        # abort if the file is already opened
-        if not self.topframe is None and os.path.abspath(self.file_name.get()) == path:
+        # abort if the file is already opened (a file which could not be loaded is loaded again)
+        if not self.topframe is None and os.path.abspath(self.file_name.get()) == path and not self.load_failed:
             return
         # control output
         print("changed to file: ", path)
@@ -256,60 +724,65 @@ class GUI:
             # do not save empty strings if this is the first opened file
             save_md = False
 
+        # the entries still show an older file if the last one was not loaded yet (nothing to save)
+        if not self.loading is None or self.load_failed:
+            save_md = False
+        self.load_failed = False
+
         # if we want to save the metadata 
         # (everytime except the first time we click on a data file because then the entry variables are empty)
         if save_md:
             # save the path of the closed data file in a temp variable to save the meta data
             old_path = os.path.abspath(self.file_name.get())
+            # save the last opened information
+            self.last_opened_file = [stringvar.get() for stringvar in self.stringvar_list]
+
+        # make sure the process description is valid and use No Description if not
+        if not self.processes.has_name(self.stringvar_list[0].get()):
+            self.stringvar_list[0].set(self.processes[[""]])
+
+        if save_md:
+            # the worker saves the closed file before it reads anything requested later
+            self.io.submit(self.write_metadata, old_path, self.get_current_metadata())
         
         # set the filename label to the newly opened file
         self.file_name.set(os.path.relpath(path, os.getcwd()))
 
-        if save_md:
-            self.last_opened_file = []
-        # iterate over the keywords and load the metadata from the corresponding file
-        # save the metadata of the closed file to the disc
-        # (everytime except the first time we click on a data file because then the entry variables are empty)
-        for i,keyword in enumerate(self.keywords):
-            if save_md:
-                # save the last opened information
-                self.last_opened_file.append(self.stringvar_list[i].get())
-            # process description
-            if i == 0:
-                # make sure the process description is valid and use No Description if not
-                if not self.stringvar_list[i].get() in self.processes.get_process_names():
-                    self.stringvar_list[i].set(self.processes[[""]])
-
-                if save_md:
-                    self.MD_files[old_path][keyword] = self.processes[self.stringvar_list[i].get()]
-
-                # make sure, that an up to date description is saved
-                if not self.MD_files[path][keyword] in self.processes.get_process_descriptions():
-                    self.MD_files[path][keyword] = self.processes[self.stringvar_list[i].get()]
-                self.stringvar_list[i].set(self.processes[[self.MD_files[path][keyword]]])
-            # every other entry
-            else:
-                if save_md:
-                    self.MD_files[old_path][keyword] = self.stringvar_list[i].get()
-                self.stringvar_list[i].set(self.MD_files[path][keyword])
+        # load the metadata in the background and fill the entries when it is read
+        self.loading = path
+        self.selection_timer = instrumentation.begin("selection")
+        self.io.submit(self.read_metadata, path, self.processes.get_value(self.stringvar_list[0].get(), DEFAULT_PROCESS_IDS == "on"),
+                       callback=lambda data: self.show_metadata(path, data), errback=lambda error: self.on_metadata_error(path))
 
     def save_current_metadata(self, path=None):
         """
         Function which saves the metadata for the currently opened file
         """
-        # if a file was opened
-        if not self.topframe is None:
+        # if a file was opened (and not still loading)
+        if not self.topframe is None and self.loading is None and not self.load_failed:
             # if no path is given
             if path is None:
                 # create the path
                 path = os.path.abspath(self.file_name.get())
 
-            # save each entry
-            for i,keyword in enumerate(self.keywords):
-                if i == 0:
-                    self.MD_files[path][keyword] = self.processes[self.stringvar_list[i].get()]
-                else:
-                    self.MD_files[path][keyword] = self.stringvar_list[i].get()
+            # collect each entry and save them with one write (in the background)
+            self.io.submit(self.write_metadata, path, self.get_current_metadata())
+
+    def get_current_metadata(self):
+        """
+        Function which collects the metadata of the entries
+
+        returns:
+            data    - dict  ... keyword, information pairs
+        """
+        data = {}
+        for i,keyword in enumerate(self.keywords):
+            if i == 0:
+                # the text or the ID of the description (MD_TOOL_PROCESS_IDS)
+                data[keyword] = self.processes.get_value(self.stringvar_list[i].get(), DEFAULT_PROCESS_IDS == "on")
+            else:
+                data[keyword] = self.stringvar_list[i].get()
+        return data
 
     def update_keywords(self, keyword_string, window):
         """
@@ -318,6 +791,8 @@ class GUI:
             keyword_string  - string        ... input string from the add/remove text
             window          - tk.Toplevel   ... the opened window to close it correctly
         """
+        if self.is_loading():
+            return
 
         # parse the keyword string
         keyword_list = keyword_string.split("\n")
@@ -351,12 +826,10 @@ class GUI:
             # save current metadata
             self.save_current_metadata()
 
-            # iterate over the md files and update the keywords
-            for md in self.MD_files:
-                # update keywords
-                self.MD_files[md].set_keywords(keyword_list)
-                # save md to disc
-                self.MD_files[md].write()
+            # only a new version of the keywords is created, the files are migrated when they are read
+            self.io.submit(self.MD_files.set_keywords, keyword_list)
+            self.io.submit(save_schema, self.MD_files.schema)
+            self.start_compaction()
             
             # update keywords of gui
             self.keywords = keyword_list
@@ -436,10 +909,10 @@ class GUI:
         if name == "":
             return
 
-        if name in self.processes.get_process_names() and name != old_name:
+        if self.processes.has_name(name) and name != old_name:
             return
 
-        if descr in self.processes.get_process_descriptions() and (old_name == "+" or descr != self.processes[old_name]):
+        if self.processes.has_description(descr) and (old_name == "+" or descr != self.processes[old_name]):
             return
 
         # close the window and free self.master
@@ -450,17 +923,15 @@ class GUI:
             self.stringvar_list[0].set(name)
 
         # if the name needs to be updated
-        if old_name in self.processes.get_process_names() and name != old_name:
+        if self.processes.has_name(old_name) and name != old_name:
             # if the description needs to be updated
             if self.processes[old_name] != descr:
-                # update the saved descriptions for old name
-                for md in self.MD_files:
-                    # if one md file uses the old description
-                    if self.MD_files[md][self.keywords[0]] == self.processes[old_name]:
-                        # set the new description
-                        self.MD_files[md][self.keywords[0]] = descr
+                old_descr = self.processes[old_name]
                 # update the internal description
                 self.processes[old_name] = descr
+                # update the saved descriptions for old name
+                # (only the files which use the old description as text, the IDs of the old description stay valid)
+                self.set_process_description(old_descr, self.processes.get_value(old_name, DEFAULT_PROCESS_IDS == "on"))
             # update the name of the edited process
             self.processes[[descr]] = name
         else:
@@ -471,6 +942,32 @@ class GUI:
         self.create_edit_process_window()
 
 
+    def set_process_description(self, old_descr, descr):
+        """
+        Function which replaces a process description in all files which use it (in the background)
+
+            old_descr   - string    ... the process description which should be replaced
+            descr       - string    ... the new process description
+        """
+        self.io.submit(self.replace_process_description, old_descr, descr)
+
+    def replace_process_description(self, old_descr, descr):
+        """
+        Function which replaces a process description in all files which use it (runs on the I/O worker)
+
+            old_descr   - string    ... the process description which should be replaced
+            descr       - string    ... the new process description
+        """
+        # build the index with the first process edit, it is kept up to date afterwards
+        if self.process_index is None:
+            self.process_index = PD_index(self.keywords[0])
+            self.MD_files.attach_index(self.process_index)
+
+        # the files are loaded in parallel chunks, each file is written once
+        with self.MD_files.transaction():
+            for _, md in self.MD_files.items(self.process_index.files(old_descr)):
+                md[self.keywords[0]] = descr
+
     def edit_process(self, name, edit_processes_window):
         """
         Function which opens an editor window to edit a process description
@@ -483,7 +980,7 @@ class GUI:
             """
             # 1. clear the text widget
             editor.delete('1.0', "end")
-            if name in self.processes.get_process_names():
+            if self.processes.has_name(name):
                 # 2. insert the description
                 editor.insert("end", self.processes[name])
 
@@ -536,10 +1033,9 @@ class GUI:
             window  - tk.Toplevel() ... handler to the process editing window
         """
         if messagebox.askokcancel("Are you sure?", "Do you really want to delete\n\"" + name + "\"?\nFiles with this process description\nwill be set to \"No Description\"."):
-            # loop over md files and delete these process description
-            for md in self.MD_files:
-                if self.MD_files[md][self.keywords[0]] == self.processes[name]:
-                    self.MD_files[md][self.keywords[0]] = ""
+            # set the files with this process description to no description
+            # (the IDs of the process are resolved to no description without writing the files)
+            self.set_process_description(self.processes[name], "")
             # delete the process description
             self.processes.remove(name, self.processes[name])
 
@@ -688,6 +1184,9 @@ class GUI:
 
             i   - index     ... index of the keyword
         """
+        if self.is_loading():
+            return
+
         # temp list to check if the keyword is a duplicate
         tmp = list(self.keywords)
         tmp.remove(tmp[i])
@@ -697,12 +1196,10 @@ class GUI:
             # new keyword
             n_keyword = self.stringvar_label_list[i].get()
 
-            # iterate over the md files and update the ith keyword
-            for md in self.MD_files:
-                # update keywords
-                self.MD_files[md].update_keyword(i, n_keyword)
-                # save md to disc
-                self.MD_files[md].write()
+            # only a new version of the keywords is created, the files are migrated when they are read
+            self.io.submit(self.MD_files.update_keyword, i, n_keyword)
+            self.io.submit(save_schema, self.MD_files.schema)
+            self.start_compaction()
 
             # update self.keywords
             self.keywords[i] = n_keyword
@@ -781,47 +1278,233 @@ class GUI:
             subdirectories      - bool      ... should subdirectories be also overwritten
             workingdir          - bool      ... should all files in the working dir be overwritten
         """
+        # only one propagation at a time (and not while the entries still show the last file)
+        if self.topframe is None or not self.propagation is None or not self.loading is None or self.load_failed:
+            return
+        if self.is_loading():
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.file_name.get()))
+
         if workingdir:
             # ask if they really want to do this
-            if messagebox.askyesno("Copy metadata to all other files", "Do you really want to copy the currently input metadata to all files?\n\nWarning:\nThis will overwrite metadata of the other files!"):
-                for md_path in self.MD_files:
-                    self.save_current_metadata(path=md_path)
+            if not messagebox.askyesno("Copy metadata to all other files", "Do you really want to copy the currently input metadata to all files?\n\nWarning:\nThis will overwrite metadata of the other files!"):
+                return
+            targets = list(self.snapshot.data_files)
 
         elif subdirectories:
             # ask if they really want to do this
-            if messagebox.askyesno("Copy metadata to the directory and subdirectories", "Do you really want to copy the currently input metadata to all files in this directory and all its subdirectories?\n\nWarning:\nThis will overwrite metadata of the other files!"):
-                # get all datafiles in this directory and its subdirectory
-                # initialize data file list
-                files_in_dir_and_subs = []
-
-                # create directory walk
-                w = os.walk(os.path.dirname(os.path.abspath(self.file_name.get())))
-                # filling the list with all file paths
-                for root, _, files in w:
-                    # iterate over all files
-                    for f in files:
-                        # create the path
-                        path = os.path.join(root, f)
-
-                        # check if metadata is in the filename or directory above
-                        if not "metadata" in f and not "metadata" in os.path.split(root)[1]:
-                            files_in_dir_and_subs.append(os.path.normpath(path))
-
-                # loop over the files and set the metadata
-                for file_path in files_in_dir_and_subs:
-                    self.save_current_metadata(path=file_path)
+            if not messagebox.askyesno("Copy metadata to the directory and subdirectories", "Do you really want to copy the currently input metadata to all files in this directory and all its subdirectories?\n\nWarning:\nThis will overwrite metadata of the other files!"):
+                return
+            # get all datafiles in this directory and its subdirectory
+            targets = self.snapshot.data_files_below(directory)
 
         else:
             # ask if they really want to do this
-            if messagebox.askyesno("Copy metadata to directory", "Do you really want to copy the currently input metadata to the whole directory?\n\nWarning:\nThis will overwrite metadata of the other files in this directory!"):
-                # create a list with all paths to files in the directory
-                files_in_dir = [os.path.join(os.path.dirname(os.path.abspath(self.file_name.get())), f) \
-                                for f in os.listdir(os.path.dirname(os.path.abspath(self.file_name.get()))) \
-                                if os.path.isfile(os.path.join(os.path.dirname(os.path.abspath(self.file_name.get())), f))]
+            if not messagebox.askyesno("Copy metadata to directory", "Do you really want to copy the currently input metadata to the whole directory?\n\nWarning:\nThis will overwrite metadata of the other files in this directory!"):
+                return
+            # get all datafiles in the directory
+            targets = list(self.snapshot.data_files_in(directory))
+
+        self.propagation = MD_propagation(self.MD_files, self.get_current_metadata(), targets)
+        self.propagation_timer = instrumentation.begin("bulk apply")
+        self.create_progress_window()
+        # the batches run one by one on the I/O worker, so the window stays responsive
+        self.io.submit(self.propagation.step, callback=self.on_propagation_step, errback=self.on_propagation_error)
+
+    def start_compaction(self):
+        """
+        Function which saves the metadata files with old keywords in the background,
+        the batches run on the I/O worker between the requests of the user
+        """
+        if DEFAULT_COMPACTION == "off":
+            return
+
+        # a running compaction is replaced by one for the newest keywords
+        if not self.compaction is None:
+            self.compaction.cancel()
+
+        compaction = Schema_compaction(self.MD_files)
+        self.compaction = compaction
+        self.io.submit(compaction.step, callback=lambda more: self.on_compaction_step(compaction, more),
+                       errback=lambda error: self.on_compaction_step(compaction, False))
+
+    def on_compaction_step(self, compaction, more):
+        """
+        Function which requests the next batch of a compaction
+
+            compaction  - Schema_compaction ... the compaction which handled a batch
+            more        - bool              ... False if the compaction is finished or cancelled
+        """
+        if not compaction is self.compaction:
+            return
+
+        if more:
+            # the status line shows the progress (the total is known after the first batch)
+            self.show_status("migrating metadata files", compaction.done(), compaction.summary["files"])
+            self.io.submit(compaction.step, callback=lambda more: self.on_compaction_step(compaction, more),
+                           errback=lambda error: self.on_compaction_step(compaction, False))
+            return
+
+        self.compaction = None
+        self.hide_status()
+        if compaction.summary["failed"] > 0:
+            messagebox.showwarning("Migrate metadata files", str(compaction.summary["failed"]) + " metadata files could not be saved with the new keywords.\n"
+                                   + "They are migrated again when they are opened.")
+
+    def start_export(self):
+        """
+        Function which asks for the output file and streams the metadata of all data files into it,
+        the batches run on the I/O worker like the propagation
+        """
+        if not self.export is None or self.is_loading():
+            return
+
+        path = filedialog.asksaveasfilename(title="Export metadata", defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+        if not path:
+            return
+
+        # the metadata is read straight from the files (or the database), no MD_files are created
+        self.export = MD_export(self.snapshot.data_files, path, self.keywords, self.processes, schema=self.MD_files.schema,
+                                store=self.MD_files.store, workers=DEFAULT_WORKERS)
+        self.create_export_window()
+        # the export reads the metadata files, saves which still wait in the journal are written first
+        if not self.MD_files.journal is None:
+            self.io.submit(self.MD_files.journal.commit)
+        self.io.submit(self.export.step, callback=self.on_export_step, errback=self.on_export_error)
+
+    def create_export_window(self):
+        """
+        Function which opens a window showing the progress of the export with a cancel button
+        """
+        total = len(self.snapshot.data_files)
+        self.export_window = tk.Toplevel(self.master)
+        self.export_window.title("Exporting metadata")
+
+        self.export_label = tk.Label(self.export_window, text="0 / " + str(total) + " files", font = "Courier 12")
+        self.export_label.grid(column=0, row=0, padx=10, pady=10, sticky="w")
+
+        self.export_bar = ttk.Progressbar(self.export_window, orient="horizontal", length=400, mode="determinate",
+                                          maximum=max(1, total))
+        self.export_bar.grid(column=0, row=1, padx=10, pady=10, sticky="ew")
+
+        cancel_button = tk.Button(self.export_window, text="cancel", font = "Courier 12", bg="gray",
+                                  command=self.export.cancel)
+        cancel_button.grid(column=0, row=2, padx=10, pady=10, sticky="ew")
+
+        # closing the window cancels the export
+        self.export_window.protocol("WM_DELETE_WINDOW", self.export.cancel)
+
+    def on_export_step(self, more):
+        """
+        Function which shows the progress after one batch of the export and requests the next one
+
+            more    - bool  ... False if the export is finished or cancelled
+        """
+        total = len(self.snapshot.data_files)
+        self.export_bar["value"] = self.export.done()
+        self.export_label.config(text=str(self.export.done()) + " / " + str(total) + " files")
+
+        if more:
+            self.io.submit(self.export.step, callback=self.on_export_step, errback=self.on_export_error)
+            return
 
-                # loop over the files and set the metadata
-                for file_path in files_in_dir:
-                    self.save_current_metadata(path=file_path)
+        summary = self.finish_export()
+
+        message = "exported: " + str(summary["exported"]) + "\nfailed: " + str(summary["failed"])
+        if summary["cancelled"]:
+            message = "Cancelled after " + str(summary["files"]) + " of " + str(total) + " files.\n\n" + message
+        for error in summary["errors"][:5]:
+            message += "\n\n" + error["path"] + ":\n" + error["error"]
+        messagebox.showinfo("Export metadata", message)
+
+    def finish_export(self):
+        """
+        Function which closes the progress window of the export
+
+        returns:
+            summary - dict  ... summary of the export
+        """
+        summary = self.export.summary
+        self.export = None
+        self.export_window.destroy()
+        return summary
+
+    def on_export_error(self, error):
+        """
+        Function which stops an export whose batch failed (errback of MD_export.step,
+        the error itself is shown by on_io_error, the records written so far stay in the file)
+        """
+        export = self.export
+        self.finish_export()
+        # the output is closed on the worker like the batches
+        if not export.finished:
+            self.io.submit(export.close)
+
+    def create_progress_window(self):
+        """
+        Function which opens a window showing the progress of the propagation with a cancel button
+        """
+        self.progress_window = tk.Toplevel(self.master)
+        self.progress_window.title("Copying metadata")
+
+        self.progress_label = tk.Label(self.progress_window, text="0 / " + str(len(self.propagation.targets)) + " files", font = "Courier 12")
+        self.progress_label.grid(column=0, row=0, padx=10, pady=10, sticky="w")
+
+        self.progress_bar = ttk.Progressbar(self.progress_window, orient="horizontal", length=400, mode="determinate",
+                                            maximum=max(1, len(self.propagation.targets)))
+        self.progress_bar.grid(column=0, row=1, padx=10, pady=10, sticky="ew")
+
+        cancel_button = tk.Button(self.progress_window, text="cancel", font = "Courier 12", bg="gray",
+                                  command=self.propagation.cancel)
+        cancel_button.grid(column=0, row=2, padx=10, pady=10, sticky="ew")
+
+        # closing the window cancels the propagation
+        self.progress_window.protocol("WM_DELETE_WINDOW", self.propagation.cancel)
+
+    def on_propagation_step(self, more):
+        """
+        Function which shows the progress after one batch of the propagation and requests the next one
+
+            more    - bool  ... False if the propagation is finished or cancelled
+        """
+        self.progress_bar["value"] = self.propagation.done()
+        self.progress_label.config(text=str(self.propagation.done()) + " / " + str(len(self.propagation.targets)) + " files")
+
+        if more and not self.propagation.cancelled:
+            self.io.submit(self.propagation.step, callback=self.on_propagation_step, errback=self.on_propagation_error)
+            return
+
+        summary = self.finish_propagation()
+
+        message = "changed: " + str(summary["changed"]) + "\nunchanged: " + str(summary["unchanged"]) + "\nfailed: " + str(summary["failed"])
+        if summary["cancelled"]:
+            message = "Cancelled after " + str(summary["changed"] + summary["unchanged"] + summary["failed"]) + " of " + str(summary["files"]) + " files.\n\n" + message
+        for error in summary["errors"][:5]:
+            message += "\n\n" + error["path"] + ":\n" + error["error"]
+        messagebox.showinfo("Copy metadata", message)
+
+    def finish_propagation(self):
+        """
+        Function which closes the progress window of the propagation
+
+        returns:
+            summary - dict  ... summary of the propagation
+        """
+        summary = self.propagation.summary
+        self.propagation = None
+        instrumentation.end(self.propagation_timer)
+        self.propagation_timer = None
+        self.progress_window.destroy()
+        return summary
+
+    def on_propagation_error(self, error):
+        """
+        Function which stops a propagation whose batch failed (errback of MD_propagation.step,
+        the error itself is shown by on_io_error, the files written so far stay written)
+        """
+        self.finish_propagation()
 
     def create_entry_list(self):
         """
@@ -993,6 +1676,27 @@ class GUI:
         self.save_current_metadata()
 
         if messagebox.askokcancel("Quit", "Do you want to quit?\nProgress will be saved."):
+            # stop a running propagation, the files written so far stay written
+            if not self.propagation is None:
+                self.propagation.cancel()
+            # the same for a compaction, the other files are migrated when they are read
+            if not self.compaction is None:
+                self.compaction.cancel()
+            # and for an export, the records written so far stay in the file
+            if not self.export is None:
+                self.export.cancel()
+
+            if not self.watcher is None:
+                self.watcher.stop()
+
+            # wait until the I/O worker saved everything
+            self.io.drain()
+            # and write the metadata files which are still in the journal (while the workers can still run)
+            if not self.MD_files is None and not self.MD_files.journal is None:
+                self.MD_files.journal.close()
+            # an export whose next batch was not requested anymore is closed here
+            if not self.export is None and not self.export.finished:
+                self.export.close()
             # these both calls fix the issue with linux and not closing properly
             self.master.quit()
             self.master.destroy()
@@ -1004,4 +1708,10 @@ class GUI:
         and handles exit behaviour of the main loop
         """
         self.master.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+        # while profiling, late heartbeats show how long the main loop was blocked
+        if instrumentation.enabled:
+            self.heartbeat_time = time.perf_counter()
+            self.master.after(HEARTBEAT_INTERVAL, self.heartbeat)
+
         self.master.mainloop()
\ No newline at end of file
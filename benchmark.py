@@ -0,0 +1,585 @@
+import os
+import sys
+import json
+import time
+import random
+import string
+import argparse
+import builtins
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from contextlib import contextmanager
+from md_file import MD_file, get_metadata_path, parse_metadata
+from md_file_dict import MD_file_dict
+from md_table import MD_table
+from snapshot import WD_snapshot
+from manifest import Scan_manifest
+from process_description import PD_handler
+from propagate import MD_propagation
+from schema import Schema_compaction
+from recovery import find_from_other_users, recover_from_other_users
+from utils import load_keywords, create_data_file_list, create_MD_file_dict
+
+
+"""
+This file contains benchmarks for the metadata handling which run without a display:
+
+    python benchmark.py
+    python benchmark.py suite --depth 3 --fanout 4 --files 2000 --json results.json
+    python benchmark.py compare old.json new.json
+    python benchmark.py memory --files 20000 --distinct 100
+
+    benchmark_writes_per_save(n_files, keywords)
+    benchmark_parallel_loading(n_files, latency, workers, keywords)
+    create_synthetic_tree(dir, depth, fanout, n_files, n_keywords, value_size, n_processes, seed, n_distinct)
+    benchmark_suite(depth, fanout, n_files, n_keywords, value_size, n_processes, workers, repeat)
+    compare_results(old, new, threshold)
+    benchmark_memory(n_files, n_keywords, value_size, n_distinct)
+
+The suite times the real code paths of a start and of the bulk operations of the GUI
+on a generated working directory and its results can be saved as JSON,
+so the numbers of two commits can be compared on the same machine.
+"""
+
+# version of the JSON written by the suite
+RESULTS_VERSION = 1
+
+class Counting_MD_file(MD_file):
+    """
+    MD_file which counts how often its metadata file is written
+    """
+    writes = 0
+
+    def write(self):
+        """
+        Function to write the metadata to the file and count the write
+        """
+        Counting_MD_file.writes += 1
+        super().write()
+
+
+def create_data_files(dir, n_files):
+    """
+    Function to create empty data files in a directory
+
+        dir     - string/path   ... path to the directory
+        n_files - int           ... number of data files
+    returns:
+        paths   - list          ... containing the paths to the created data files
+    """
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(dir, "data_" + str(i) + ".txt")
+        with open(path, "w") as f:
+            f.write("")
+        paths.append(path)
+    return paths
+
+
+def benchmark_writes_per_save(n_files=100, keywords=None):
+    """
+    Function which counts the metadata file writes needed to save the entries of the GUI
+    once for every file (like [>>>] does) with one assignment per keyword (before)
+    and with one batched update per file (after)
+
+        n_files     - int   ... number of data files
+        keywords    - list  ... list with all keywords as strings
+    returns:
+        results     - dict  ... writes per save before and after
+    """
+    if keywords is None:
+        keywords = load_keywords()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as dir:
+        paths = create_data_files(dir, n_files)
+        md_files = [Counting_MD_file(path, keywords) for path in paths]
+
+        # the information the entries of the GUI would hold
+        data = {key: "information " + str(i) for i, key in enumerate(keywords)}
+
+        # before: one assignment (and one write) per keyword
+        Counting_MD_file.writes = 0
+        for md in md_files:
+            for key in keywords:
+                md[key] = data[key] + " before"
+        results["before"] = Counting_MD_file.writes / n_files
+
+        # after: one update per file
+        Counting_MD_file.writes = 0
+        for md in md_files:
+            md.update({key: info + " after" for key, info in data.items()})
+        results["after"] = Counting_MD_file.writes / n_files
+
+        # saving unchanged metadata does not write at all
+        Counting_MD_file.writes = 0
+        for md in md_files:
+            md.update({key: info + " after" for key, info in data.items()})
+        results["unchanged"] = Counting_MD_file.writes / n_files
+
+    return results
+
+
+@contextmanager
+def slow_open(latency):
+    """
+    Context manager which simulates a high latency file system (e.g. network storage)
+    by waiting before every open
+
+        latency - float ... seconds to wait per open
+    """
+    original_open = builtins.open
+
+    def open_with_latency(*args, **kwargs):
+        time.sleep(latency)
+        return original_open(*args, **kwargs)
+
+    builtins.open = open_with_latency
+    try:
+        yield
+    finally:
+        builtins.open = original_open
+
+
+def benchmark_parallel_loading(n_files=200, latency=0.005, workers=(1, 8), keywords=None):
+    """
+    Function which times the startup phases which read every metadata file
+    (the search for foreign keywords and loading the MD_files) with different numbers of threads
+    on a simulated high latency file system
+
+        n_files     - int   ... number of data files
+        latency     - float ... seconds to wait per open
+        workers     - tuple ... numbers of threads to compare
+        keywords    - list  ... list with all keywords as strings
+    returns:
+        results     - dict  ... seconds per phase and number of threads
+    """
+    if keywords is None:
+        keywords = load_keywords()
+
+    results = {"recovery": {}, "MD_file_dict": {}}
+    with tempfile.TemporaryDirectory() as dir:
+        paths = create_data_files(dir, n_files)
+        # create the metadata files
+        for path in paths:
+            MD_file(path, keywords)
+        snapshot = WD_snapshot(dir)
+
+        with slow_open(latency):
+            for n in workers:
+                start = time.perf_counter()
+                find_from_other_users(dir, keywords, PD_handler(), snapshot, workers=n)
+                results["recovery"][n] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                MD_file_dict(snapshot.data_files, keywords, max_entries=None, workers=n).preload(snapshot.data_files)
+                results["MD_file_dict"][n] = time.perf_counter() - start
+
+    return results
+
+
+def create_synthetic_tree(dir, depth=3, fanout=4, n_files=1000, n_keywords=13, value_size=20, n_processes=5, seed=0, n_distinct=None):
+    """
+    Function which generates a working directory with data files and their metadata files
+
+        dir         - string/path   ... path to the (empty) working directory
+        depth       - int           ... number of directory levels below the working directory
+        fanout      - int           ... number of sub directories per directory
+        n_files     - int           ... number of data files (spread evenly over all directories)
+        n_keywords  - int           ... number of keywords including the process description
+        value_size  - int           ... number of characters of each information
+        n_processes - int           ... number of different process descriptions
+        seed        - int           ... seed of the random information (same tree for the same arguments)
+        n_distinct  - int           ... number of different information per keyword (None for a new one in every file)
+    returns:
+        keywords    - list          ... containing the keywords of the metadata files
+        processes   - PD_handler    ... contains the process descriptions used in the metadata files
+        paths       - list          ... containing the paths to the data files
+    """
+    rng = random.Random(seed)
+
+    keywords = ["process descr"] + ["keyword " + str(i) for i in range(1, max(1, n_keywords))]
+
+    processes = PD_handler()
+    descriptions = [""]
+    for i in range(n_processes):
+        descr = "process " + str(i) + " " + "".join(rng.choice(string.ascii_letters) for _ in range(value_size))
+        processes.add("Process " + str(i), descr)
+        descriptions.append(descr)
+
+    # information which repeats across the files like an author or a location
+    pools = {}
+    if not n_distinct is None:
+        for key in keywords[1:]:
+            pools[key] = ["".join(rng.choice(string.ascii_letters) for _ in range(value_size)) for _ in range(max(1, n_distinct))]
+
+    # all directories level by level
+    directories = [dir]
+    level = [dir]
+    for d in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(fanout):
+                path = os.path.join(parent, "dir_" + str(d) + "_" + str(i))
+                os.makedirs(os.path.join(path, "metadata"), exist_ok=True)
+                next_level.append(path)
+        directories.extend(next_level)
+        level = next_level
+    os.makedirs(os.path.join(dir, "metadata"), exist_ok=True)
+
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(directories[i % len(directories)], "data_" + str(i) + ".txt")
+        with open(path, "w") as f:
+            f.write("")
+
+        # the metadata file is written directly so the generation does not depend on the timed code
+        content = "path to data file: " + path + "\n\n"
+        content += keywords[0] + "::  " + rng.choice(descriptions) + "\n"
+        for key in keywords[1:]:
+            if key in pools:
+                info = rng.choice(pools[key])
+            else:
+                info = "".join(rng.choice(string.ascii_letters) for _ in range(value_size))
+            content += key + "::  " + info + "\n"
+        with open(get_metadata_path(path), "w") as f:
+            f.write(content)
+
+        paths.append(path)
+
+    # the tree looks as if it was written a while ago, otherwise the manifest would treat it as still changing
+    past = time.time() - 60
+    for root, dirs, files in os.walk(dir, topdown=False):
+        for name in files:
+            os.utime(os.path.join(root, name), (past, past))
+        os.utime(root, (past, past))
+
+    return keywords, processes, paths
+
+
+@contextmanager
+def working_in(dir):
+    """
+    Context manager which changes the current working directory
+    (the manifests are saved relative to it and should not end up next to keywords.pkl)
+
+        dir     - string/path   ... path to the directory
+    """
+    cwd = os.getcwd()
+    os.chdir(dir)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+def time_call(function, *args, **kwargs):
+    """
+    Function which times a single call
+
+    returns:
+        seconds - float ... time of the call
+        result  - any   ... return value of the call
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_suite_once(depth, fanout, n_files, n_keywords, value_size, n_processes, workers, sample):
+    """
+    Function which generates one working directory and times every phase once
+
+    returns:
+        results - dict  ... seconds per phase
+        counts  - dict  ... size of the generated working directory
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        dir = os.path.join(tmp, "wd")
+        state = os.path.join(tmp, "state")
+        os.makedirs(dir)
+        os.makedirs(state)
+
+        keywords, processes, paths = create_synthetic_tree(dir, depth, fanout, n_files, n_keywords, value_size, n_processes)
+
+        # startup: listing the working directory without and with a manifest
+        results["create_data_file_list"], data_files = time_call(create_data_file_list, dir)
+
+        with working_in(state):
+            def scan_with_manifest():
+                manifest = Scan_manifest(dir)
+                snapshot = WD_snapshot(dir, manifest)
+                find_from_other_users(dir, keywords, processes, snapshot, manifest, workers)
+                manifest.save(snapshot)
+                return snapshot
+
+            results["scan_manifest_first"], _ = time_call(scan_with_manifest)
+            results["scan_manifest_unchanged"], _ = time_call(scan_with_manifest)
+
+        snapshot = WD_snapshot(dir)
+        # no unknown keywords or process descriptions, so no message box is opened
+        results["recover_from_other_users"], _ = time_call(recover_from_other_users, dir, keywords, processes, snapshot, workers=workers)
+
+        results["create_MD_file_dict"], MD_files = time_call(create_MD_file_dict, data_files, keywords,
+                                                             max_entries=None, workers=workers, preload=True)
+
+        # whole directory analytics: the table is built from the metadata files and grouped by two keywords
+        results["MD_table.from_files"], table = time_call(MD_table.from_files, data_files, keywords, workers=workers)
+        results["MD_table.group_by"], _ = time_call(table.group_by, keywords[0], keywords[-1])
+
+        # single files: mean seconds per call
+        sampled = paths[:sample]
+        mds = [MD_files[path] for path in sampled]
+        start = time.perf_counter()
+        for md in mds:
+            md.read()
+        results["MD_file.read"] = (time.perf_counter() - start) / max(1, len(mds))
+        start = time.perf_counter()
+        for md in mds:
+            md.write()
+        results["MD_file.write"] = (time.perf_counter() - start) / max(1, len(mds))
+
+        # renaming a keyword only creates a new version, the compaction rewrites every metadata file
+        results["update_keyword"], _ = time_call(MD_files.update_keyword, len(keywords) - 1, "renamed keyword")
+        results["compaction"], _ = time_call(Schema_compaction(MD_files).run)
+
+        # [>>>] on the working directory: every file changes, then nothing changes
+        data = {key: "copied information" for key in MD_files.keywords}
+        targets = snapshot.data_files_below(dir)
+        results["propagate"], summary = time_call(MD_propagation(MD_files, data, targets).run)
+        results["propagate_unchanged"], _ = time_call(MD_propagation(MD_files, data, targets).run)
+
+        counts = {"directories": len(snapshot.directories), "data_files": len(data_files),
+                  "metadata_files": len(snapshot.metadata_files), "changed": summary["changed"]}
+
+    return results, counts
+
+
+def get_commit():
+    """
+    Function to get the current commit of the repository (None if git is not available)
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_suite(depth=3, fanout=4, n_files=1000, n_keywords=13, value_size=20, n_processes=5, workers=1, repeat=1, sample=100):
+    """
+    Function which times the code paths of a start and of the bulk operations of the GUI without a display
+    on generated working directories
+
+        depth       - int   ... number of directory levels below the working directory
+        fanout      - int   ... number of sub directories per directory
+        n_files     - int   ... number of data files
+        n_keywords  - int   ... number of keywords including the process description
+        value_size  - int   ... number of characters of each information
+        n_processes - int   ... number of different process descriptions
+        workers     - int   ... number of threads used to read and write
+        repeat      - int   ... number of runs (on a new working directory each), the fastest time is kept
+        sample      - int   ... number of files used to time MD_file.read and MD_file.write
+    returns:
+        results     - dict  ... parameters, environment and seconds per phase (can be saved as JSON)
+    """
+    best = {}
+    for _ in range(max(1, repeat)):
+        times, counts = run_suite_once(depth, fanout, n_files, n_keywords, value_size, n_processes, workers, sample)
+        for phase, seconds in times.items():
+            best[phase] = min(best.get(phase, seconds), seconds)
+
+    return {
+        "version": RESULTS_VERSION,
+        "commit": get_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {"depth": depth, "fanout": fanout, "files": n_files, "keywords": n_keywords, "value_size": value_size,
+                       "processes": n_processes, "workers": workers, "repeat": repeat, "sample": sample},
+        "counts": counts,
+        "seconds": best,
+    }
+
+
+def compare_results(old, new, threshold=0.1):
+    """
+    Function which compares the results of two runs of the suite
+
+        old         - dict  ... results of the reference run
+        new         - dict  ... results of the run which is checked
+        threshold   - float ... relative slowdown which counts as a regression
+    returns:
+        comparison  - dict  ... phase -> (old seconds, new seconds, new / old, regression)
+    """
+    comparison = {}
+    for phase, seconds in new["seconds"].items():
+        if not phase in old["seconds"]:
+            continue
+        ratio = seconds / old["seconds"][phase] if old["seconds"][phase] > 0 else float("inf")
+        comparison[phase] = (old["seconds"][phase], seconds, ratio, ratio > 1 + threshold)
+    return comparison
+
+
+class Dict_layout:
+    """
+    The memory layout of an MD_file before the keywords were shared (for comparison):
+    every file keeps its own keyword list, its metadata path and a dict with the information
+    """
+    def __init__(self, path, keywords, data):
+        self.path = path
+        self.metadata_path = get_metadata_path(path)
+        self.keywords = list(keywords)
+        self.dirty = False
+        self.batch_depth = 0
+        self.listener = None
+        self.journal = None
+        self.schema = None
+        self.stale = False
+        self.data = {key: data.get(key, "") for key in self.keywords}
+
+
+def measure_memory(create, paths):
+    """
+    Function which measures the memory used by one object per path
+
+        create  - callable  ... function(path) which creates the object
+        paths   - list      ... paths to the data files
+    returns:
+        size    - int       ... bytes used by all objects
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [create(path) for path in paths]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+def benchmark_memory(n_files=20000, n_keywords=13, value_size=20, n_distinct=100):
+    """
+    Function which compares the memory used by loaded MD_files with the layout before the keywords were shared
+    and with the dictionary encoded MD_table
+
+        n_files     - int   ... number of data files
+        n_keywords  - int   ... number of keywords including the process description
+        value_size  - int   ... number of characters of each information
+        n_distinct  - int   ... number of different information per keyword (None for a new one in every file)
+    returns:
+        results     - dict  ... bytes per file of the layouts
+    """
+    with tempfile.TemporaryDirectory() as dir:
+        keywords, _, paths = create_synthetic_tree(dir, depth=1, fanout=10, n_files=n_files,
+                                                   n_keywords=n_keywords, value_size=value_size, n_distinct=n_distinct)
+
+        def create_dict_layout(path):
+            _, keys, values = parse_metadata(get_metadata_path(path))
+            return Dict_layout(path, keywords, dict(zip(keys, values)))
+
+        before = measure_memory(create_dict_layout, paths)
+        after = measure_memory(lambda path: MD_file(path, keywords, exists=True), paths)
+
+        # the table holds all files at once, the paths are shared with the snapshot and not counted
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        table = MD_table.from_files(paths, keywords)
+        table_size = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        table.group_by(keywords[0], keywords[-1])
+        group_by = time.perf_counter() - start
+
+    return {"files": n_files, "keywords": n_keywords, "value_size": value_size, "distinct": n_distinct,
+            "bytes_per_file_before": before / n_files, "bytes_per_file_after": after / n_files,
+            "reduction": 1 - after / before, "bytes_per_file_table": table_size / n_files,
+            "group_by_seconds": group_by}
+
+
+def run_old_benchmarks():
+    """
+    Function which runs and prints the benchmarks of single optimizations
+    """
+    results = benchmark_writes_per_save()
+    print("writes per save (" + str(len(load_keywords())) + " keywords):")
+    for name in results:
+        print("\t" + name + ": " + str(results[name]))
+
+    results = benchmark_parallel_loading()
+    print("seconds with 5ms latency per open (200 files):")
+    for phase in results:
+        times = results[phase]
+        print("\t" + phase + ": " + ", ".join(str(n) + " threads " + str(round(times[n], 3)) for n in times)
+              + " (speedup " + str(round(times[min(times)] / times[max(times)], 1)) + "x)")
+
+
+# execute the benchmarks if benchmark.py is run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of md-tool which run without a display.")
+    commands = parser.add_subparsers(dest="command")
+
+    suite = commands.add_parser("suite", help="time the code paths on a generated working directory")
+    suite.add_argument("--depth", type=int, default=3, help="directory levels below the working directory")
+    suite.add_argument("--fanout", type=int, default=4, help="sub directories per directory")
+    suite.add_argument("--files", type=int, default=1000, help="number of data files")
+    suite.add_argument("--keywords", type=int, default=13, help="number of keywords")
+    suite.add_argument("--value-size", type=int, default=20, help="characters per information")
+    suite.add_argument("--processes", type=int, default=5, help="number of process descriptions")
+    suite.add_argument("-w", "--workers", type=int, default=1, help="threads used to read and write")
+    suite.add_argument("--repeat", type=int, default=1, help="runs, the fastest time is kept")
+    suite.add_argument("--json", help="save the results to this file")
+
+    memory = commands.add_parser("memory", help="compare the memory used by loaded MD_files")
+    memory.add_argument("--files", type=int, default=20000, help="number of data files")
+    memory.add_argument("--keywords", type=int, default=13, help="number of keywords")
+    memory.add_argument("--value-size", type=int, default=20, help="characters per information")
+    memory.add_argument("--distinct", type=int, default=100, help="different information per keyword")
+
+    compare = commands.add_parser("compare", help="compare two JSON files of the suite")
+    compare.add_argument("old", help="results of the reference commit")
+    compare.add_argument("new", help="results of the checked commit")
+    compare.add_argument("--threshold", type=float, default=0.1, help="relative slowdown which counts as a regression")
+
+    args = parser.parse_args()
+
+    if args.command == "suite":
+        results = benchmark_suite(args.depth, args.fanout, args.files, args.keywords, args.value_size,
+                                  args.processes, args.workers, args.repeat)
+        print(json.dumps(results, indent=2))
+        if not args.json is None:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+
+    elif args.command == "memory":
+        results = benchmark_memory(args.files, args.keywords, args.value_size, args.distinct)
+        print("memory per loaded file (" + str(results["files"]) + " files, " + str(results["keywords"]) + " keywords):")
+        print("\tbefore: " + str(round(results["bytes_per_file_before"])) + " bytes")
+        print("\tafter: " + str(round(results["bytes_per_file_after"])) + " bytes")
+        print("\treduction: " + str(round(100 * results["reduction"])) + "%")
+        print("\ttable: " + str(round(results["bytes_per_file_table"])) + " bytes ("
+              + str(results["distinct"]) + " different information per keyword, group by two keywords "
+              + str(round(1000 * results["group_by_seconds"], 1)) + "ms)")
+        print("\t200k files: " + str(round(results["bytes_per_file_before"] * 200000 / 2**20)) + " MB -> "
+              + str(round(results["bytes_per_file_after"] * 200000 / 2**20)) + " MB")
+
+    elif args.command == "compare":
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+
+        if old["parameters"] != new["parameters"]:
+            print("warning: the parameters of the runs differ")
+        regressions = 0
+        for phase, (old_seconds, new_seconds, ratio, regression) in compare_results(old, new, args.threshold).items():
+            print(phase + ": " + str(round(old_seconds, 6)) + "s -> " + str(round(new_seconds, 6)) + "s ("
+                  + str(round(ratio, 2)) + "x)" + (" slower" if regression else ""))
+            regressions += regression
+        sys.exit(1 if regressions > 0 else 0)
+
+    else:
+        run_old_benchmarks()
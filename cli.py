@@ -0,0 +1,568 @@
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from md_file import MD_file, get_metadata_path
+from utils import load_keywords, save_keywords, load_processes, load_schema, save_schema, DEFAULT_WORKERS, DEFAULT_BACKEND, DEFAULT_PROCESS_IDS
+from md_file_dict import MD_file_dict
+from md_index import MD_index
+from md_table import MD_table
+from snapshot import WD_snapshot, walk_data_files
+from manifest import Scan_manifest
+from md_sqlite import MD_store, MD_sqlite_file, STORE_NAME
+from journal import Write_journal
+from export import MD_export, FORMATS
+from propagate import MD_propagation
+from schema import Schema_compaction
+from moves import reconcile_moves
+from recovery import find_from_other_users, import_keywords, import_process_descriptions
+import instrumentation
+
+
+"""
+This file contains the headless command line interface of the tool.
+It works without a display and does not import tkinter:
+
+    python cli.py -d <working_dir> scan
+    python cli.py -d <working_dir> init
+    python cli.py -d <working_dir> set <data file>... -v "keyword=information"...
+    python cli.py -d <working_dir> apply <data file> --scope directory|subdirectories|workingdir
+    python cli.py -d <working_dir> rename-keyword <old keyword> <new keyword> [--lazy]
+    python cli.py -d <working_dir> compact
+    python cli.py -d <working_dir> import-foreign-keywords
+    python cli.py -d <working_dir> export [-o <file>] [--format jsonl|csv]
+    python cli.py -d <working_dir> search <query>
+    python cli.py -d <working_dir> stats <keyword>... [--below <directory>] [--top <n>]
+    python cli.py -d <working_dir> sync [--direction both|import|export]
+
+With --profile (or MD_TOOL_PROFILE=1) the file operations are counted and the phases are timed,
+the report is printed to stderr when the command is done (--profile <file> also saves it as json).
+
+With --backend sqlite (or MD_TOOL_BACKEND=sqlite) the metadata is kept in one database per working directory,
+sync converts it from and to the metadata text files.
+
+Every command prints a summary as json (to stderr for export without an output file).
+"""
+
+def map_parallel(function, paths, workers):
+    """
+    Generator which executes a function for every data file on a pool of worker threads
+    and yields the results in the order of the paths
+
+        function    - callable  ... function(path)
+        paths       - list      ... paths to the data files
+        workers     - int       ... number of worker threads
+    yields:
+        result      - tuple     ... (path, return value, error message or None)
+    """
+    def run(path):
+        try:
+            return function(path), None
+        except Exception as e:
+            return None, str(e)
+
+    if workers <= 1:
+        for path in paths:
+            yield (path,) + run(path)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # map keeps the order of the paths
+        for path, (value, error) in zip(paths, pool.map(run, paths)):
+            yield path, value, error
+
+
+def run_parallel(function, paths, workers, store=None, journal=None):
+    """
+    Function which executes a function for every data file on a pool of worker threads
+
+        function    - callable  ... function(path) which returns True if the metadata changed
+        paths       - list      ... paths to the data files
+        workers     - int       ... number of worker threads
+        store       - MD_store  ... database of the working directory, everything is written in one transaction
+        journal     - Write_journal ... journal of the working directory, the metadata files are committed in groups
+    returns:
+        summary     - dict      ... number of changed, unchanged and failed files and the errors
+    """
+    summary = {"files": len(paths), "changed": 0, "unchanged": 0, "failed": 0, "errors": []}
+
+    # a transaction locks the database for this thread, so the files are handled one by one
+    if not store is None:
+        transaction = store.transaction()
+    elif not journal is None:
+        transaction = journal.transaction()
+    else:
+        transaction = nullcontext()
+
+    with transaction:
+        for path, changed, error in map_parallel(function, paths, workers if store is None else 1):
+            if not error is None:
+                summary["failed"] += 1
+                summary["errors"].append({"path": path, "error": error})
+            elif changed:
+                summary["changed"] += 1
+            else:
+                summary["unchanged"] += 1
+
+    # files which could not be written when their group was committed stay in the journal for the next start
+    if not journal is None:
+        for metadata_path in journal.failed:
+            summary["failed"] += 1
+            summary["errors"].append({"path": metadata_path, "error": "could not be written, kept in the journal"})
+
+    return summary
+
+
+def get_store(args, read_only=False):
+    """
+    Function to open the database of the working directory if the sqlite backend is used
+
+        args        - Namespace ... parsed arguments
+        read_only   - bool      ... a missing database is not created (queries read the metadata files instead)
+    returns:
+        store       - MD_store  ... the database or None for the text backend
+    """
+    if args.backend != "sqlite":
+        return None
+    if read_only and not os.path.isfile(os.path.join(args.working_dir, STORE_NAME)):
+        return None
+    return MD_store(args.working_dir)
+
+
+def get_journal(args):
+    """
+    Function to open the write journal of the working directory if the text backend is used,
+    updates interrupted by a crash are written again
+
+        args    - Namespace     ... parsed arguments
+    returns:
+        journal - Write_journal ... the journal or None for the sqlite backend
+    """
+    if args.backend == "sqlite":
+        return None
+    journal = Write_journal(args.working_dir, args.workers)
+    journal.replay()
+    # closed by main after the command
+    args.journal = journal
+    return journal
+
+
+def open_md_file(path, keywords, store=None, journal=None, schema=None):
+    """
+    Function which opens the metadata of a data file with the chosen backend
+
+        path        - string        ... path to the data file
+        keywords    - list          ... list with all keywords as strings
+        store       - MD_store      ... database of the working directory (None for metadata files)
+        journal     - Write_journal ... journal for the metadata files (optional)
+        schema      - Keyword_schema... metadata with older keywords is migrated (optional)
+    returns:
+        md          - MD_file       ... the MD_file of the data file
+    """
+    if store is None:
+        return MD_file(path, keywords, journal=journal, schema=schema)
+    return MD_sqlite_file(path, keywords, store, schema=schema)
+
+
+def get_snapshot(args):
+    """
+    Function to create the snapshot of the working directory (using and updating the scan manifest),
+    the metadata of renamed or moved data files is moved with them
+
+        args        - Namespace     ... parsed arguments
+    returns:
+        snapshot    - WD_snapshot   ... snapshot of the working directory
+        manifest    - Scan_manifest ... manifest of the working directory
+    """
+    with instrumentation.phase("scan"):
+        manifest = Scan_manifest(args.working_dir)
+        snapshot = WD_snapshot(args.working_dir, manifest)
+
+        # without a database there is nothing to move in it
+        store = get_store(args, read_only=True)
+        moves = reconcile_moves(snapshot, manifest, store)
+        if not store is None:
+            store.close()
+
+        if len(moves) > 0:
+            args.moves = len(moves)
+            # only the directories which changed are listed again
+            snapshot = WD_snapshot(args.working_dir, manifest)
+        # the identities of new data files are needed by the next run
+        manifest.save(snapshot)
+    return snapshot, manifest
+
+
+def parse_values(values, keywords, processes):
+    """
+    Function to parse "keyword=information" arguments
+
+        values      - list          ... "keyword=information" strings
+        keywords    - list          ... list with all keywords as strings
+        processes   - PD_handler    ... contains the known processes
+    returns:
+        data        - dict          ... keyword, information pairs
+    """
+    data = {}
+    for value in values:
+        if not "=" in value:
+            raise ValueError("expected keyword=information but got: " + value)
+        key, info = value.split("=", 1)
+        key = key.strip()
+        if not key in keywords:
+            raise ValueError("unknown keyword: " + key)
+
+        # the process description can also be given by its name,
+        # known processes are saved as text or as ID (MD_TOOL_PROCESS_IDS)
+        if key == keywords[0] and not processes.has_name(info) and processes.has_description(info):
+            info = processes[[info]]
+        if key == keywords[0] and processes.has_name(info):
+            info = processes.get_value(info, DEFAULT_PROCESS_IDS == "on")
+        data[key] = info
+    return data
+
+
+def cmd_scan(args, keywords, processes):
+    """
+    Function which counts data files, metadata files and data files without metadata
+    """
+    # the manifest is saved by get_snapshot
+    snapshot, _ = get_snapshot(args)
+
+    metadata_files = set(snapshot.metadata_files)
+    missing = [path for path in snapshot.data_files if not get_metadata_path(path) in metadata_files]
+
+    return {"files": len(snapshot.data_files),
+            "metadata_files": len(snapshot.metadata_files),
+            "directories": len(snapshot.directories),
+            "missing_metadata": len(missing)}
+
+
+def cmd_init(args, keywords, processes):
+    """
+    Function which creates the metadata files of all data files which do not have one yet
+    """
+    snapshot, manifest = get_snapshot(args)
+    metadata_files = set(snapshot.metadata_files)
+    store = get_store(args)
+    journal = get_journal(args)
+
+    def init(path):
+        if (get_metadata_path(path) in metadata_files) if store is None else store.exists(path):
+            return False
+        # creating the MD_file writes the empty metadata
+        open_md_file(path, keywords, store, journal, args.schema)
+        return True
+
+    summary = run_parallel(init, list(snapshot.data_files), args.workers, store, journal)
+    manifest.save()
+    return summary
+
+
+def cmd_set(args, keywords, processes):
+    """
+    Function which sets keywords of the given data files
+    """
+    data = parse_values(args.value, keywords, processes)
+    paths = [os.path.normpath(os.path.abspath(path)) for path in args.paths]
+    store = get_store(args)
+    journal = get_journal(args)
+
+    def set_values(path):
+        if not os.path.isfile(path):
+            raise FileNotFoundError("no such data file: " + path)
+        return open_md_file(path, keywords, store, journal, args.schema).update(data)
+
+    return run_parallel(set_values, paths, args.workers, store, journal)
+
+
+def cmd_apply(args, keywords, processes):
+    """
+    Function which copies the metadata of one data file to other data files,
+    the same as the [>], [>>] and [>>>] buttons of the GUI
+    """
+    source = os.path.normpath(os.path.abspath(args.source))
+    if not os.path.isfile(source):
+        raise FileNotFoundError("no such data file: " + source)
+
+    snapshot, _ = get_snapshot(args)
+
+    if args.scope == "directory":
+        # [>]
+        targets = list(snapshot.data_files_in(os.path.dirname(source)))
+    elif args.scope == "subdirectories":
+        # [>>]
+        targets = snapshot.data_files_below(os.path.dirname(source))
+    else:
+        # [>>>]
+        targets = list(snapshot.data_files)
+
+    store = get_store(args)
+    journal = get_journal(args)
+    source_md = open_md_file(source, keywords, store, journal, args.schema)
+    data = {key: source_md[key] for key in keywords}
+
+    # the same engine as the buttons: unchanged files are skipped, the others are written in parallel batches
+    MD_files = MD_file_dict(targets, keywords, workers=args.workers, store=store, journal=journal, schema=args.schema)
+    with instrumentation.phase("bulk apply"):
+        summary = MD_propagation(MD_files, data, targets).run()
+    del summary["cancelled"]
+    return summary
+
+
+def cmd_rename_keyword(args, keywords, processes):
+    """
+    Function which renames a keyword in keywords.pkl and in all metadata files
+    (with --lazy the metadata files are only migrated when they are used the next time)
+    """
+    if not args.old in keywords:
+        raise ValueError("unknown keyword: " + args.old)
+    if args.new in keywords or args.new.strip() == "" or "\n" in args.new:
+        raise ValueError("invalid or already used keyword: " + args.new)
+
+    # a new version of the keywords is saved at once, files with the old keyword are migrated when they are read
+    i = keywords.index(args.old)
+    args.schema.rename(i, args.new)
+    keywords[i] = args.new
+    # the schema first, so keywords.pkl never holds a keyword the schema does not know
+    save_schema(args.schema)
+    save_keywords(keywords)
+
+    summary = {"keywords_saved": True}
+    if not args.lazy:
+        summary.update(compact(args, keywords))
+    return summary
+
+
+def compact(args, keywords):
+    """
+    Function which saves all metadata files which still use older keywords with the current keywords
+
+        args        - Namespace ... parsed arguments
+        keywords    - list      ... list with all keywords as strings
+    returns:
+        summary     - dict      ... number of migrated, current and failed files
+    """
+    snapshot, _ = get_snapshot(args)
+    store = get_store(args)
+    journal = get_journal(args)
+
+    MD_files = MD_file_dict(snapshot.data_files, keywords, workers=args.workers, store=store, journal=journal, schema=args.schema)
+    summary = Schema_compaction(MD_files).run()
+    del summary["cancelled"]
+
+    # files which could not be written when their group was committed stay in the journal for the next start
+    if not journal is None:
+        for metadata_path in journal.failed:
+            summary["failed"] += 1
+            summary["errors"].append({"path": metadata_path, "error": "could not be written, kept in the journal"})
+    return summary
+
+
+def cmd_compact(args, keywords, processes):
+    """
+    Function which migrates all metadata files which still use older keywords
+    """
+    return compact(args, keywords)
+
+
+def cmd_import_foreign_keywords(args, keywords, processes):
+    """
+    Function which imports keywords and process descriptions of other users
+    found in the working directory (without asking)
+    """
+    snapshot, manifest = get_snapshot(args)
+    with instrumentation.phase("recovery"):
+        not_saved_keys, not_saved_pds = find_from_other_users(args.working_dir, keywords, processes, snapshot, manifest, args.workers, args.schema)
+    manifest.save(snapshot)
+
+    if len(not_saved_keys) > 0:
+        import_keywords(keywords, not_saved_keys)
+    if len(not_saved_pds) > 0 and not args.skip_processes:
+        import_process_descriptions(processes, not_saved_pds)
+
+    return {"keywords": not_saved_keys,
+            "process_descriptions": [] if args.skip_processes else not_saved_pds}
+
+
+def cmd_export(args, keywords, processes):
+    """
+    Function which streams the metadata of every data file as one json line or csv row (see MD_export),
+    the working directory is walked while the records are written
+    """
+    store = get_store(args)
+    export = MD_export(walk_data_files(args.working_dir), sys.stdout if args.output is None else args.output,
+                       keywords, processes, format=args.format, schema=args.schema, store=store, workers=args.workers)
+    summary = export.run()
+    if not store is None:
+        store.close()
+    return summary
+
+
+def cmd_search(args, keywords, processes):
+    """
+    Function which prints all data files matching a query (see MD_index.query for the syntax),
+    nothing is written to the working directory (missing metadata files count as empty)
+    """
+    snapshot, _ = get_snapshot(args)
+    MD_files = MD_file_dict(snapshot.data_files, keywords, workers=args.workers, store=get_store(args, read_only=True), schema=args.schema)
+    index = MD_index()
+    MD_files.attach_index(index)
+
+    paths = sorted(index.query(args.query))
+    return {"files": len(snapshot.data_files), "matches": len(paths), "paths": paths}
+
+
+def cmd_stats(args, keywords, processes):
+    """
+    Function which counts the data files per information of one or more keywords (see MD_table.group_by),
+    nothing is written to the working directory (missing metadata files count as empty)
+    """
+    for key in args.keywords:
+        if not key in keywords:
+            raise ValueError("unknown keyword: " + key)
+
+    snapshot, _ = get_snapshot(args)
+    store = get_store(args, read_only=True)
+    if store is None:
+        table = MD_table.from_files(snapshot.data_files, keywords, args.schema, args.workers)
+    else:
+        table = MD_table.from_MD_files(MD_file_dict(snapshot.data_files, keywords, store=store, schema=args.schema))
+
+    # process descriptions saved as text and as ID are counted together
+    counts = Counter()
+    for info, n in table.group_by(*args.keywords, below=args.below).items():
+        infos = info if len(args.keywords) > 1 else (info,)
+        counts[tuple(processes.resolve(i) if key == keywords[0] else i for key, i in zip(args.keywords, infos))] += n
+
+    groups = []
+    for infos, n in counts.most_common(args.top):
+        groups.append(dict(zip(args.keywords, infos), count=n))
+    return {"files": table.count(below=args.below), "groups": groups}
+
+
+def cmd_sync(args, keywords, processes):
+    """
+    Function which synchronizes the database of the working directory with the metadata text files
+    """
+    snapshot, _ = get_snapshot(args)
+    store = MD_store(args.working_dir)
+    data_files = list(snapshot.data_files)
+
+    summary = {"files": len(data_files), "imported": 0, "exported": 0}
+    if args.direction in ("both", "import"):
+        summary["imported"] = store.import_text(data_files, keywords, only_newer=not args.all, schema=args.schema)
+    if args.direction in ("both", "export"):
+        summary["exported"] = store.export_text(data_files, keywords, only_newer=not args.all, schema=args.schema)
+    store.close()
+    return summary
+
+
+def create_parser():
+    """
+    Function which creates the argument parser with all commands
+    """
+    parser = argparse.ArgumentParser(description="Headless metadata tool")
+    parser.add_argument("-d", "--working-dir", required=True, help="path to the working directory")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="number of worker threads")
+    parser.add_argument("-b", "--backend", choices=["text", "sqlite"], default=DEFAULT_BACKEND, help="where the metadata is kept")
+    parser.add_argument("--profile", nargs="?", const="1", default=instrumentation.PROFILE, metavar="FILE",
+                        help="count the file operations, time the phases and print a report (optionally saved as json)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("scan", help="count data files and missing metadata files").set_defaults(function=cmd_scan)
+    commands.add_parser("init", help="create missing metadata files").set_defaults(function=cmd_init)
+
+    set_parser = commands.add_parser("set", help="set keywords of data files")
+    set_parser.add_argument("paths", nargs="+", help="paths to the data files")
+    set_parser.add_argument("-v", "--value", action="append", required=True, help="keyword=information")
+    set_parser.set_defaults(function=cmd_set)
+
+    apply_parser = commands.add_parser("apply", help="copy the metadata of a data file like [>], [>>] and [>>>]")
+    apply_parser.add_argument("source", help="path to the data file to copy from")
+    apply_parser.add_argument("--scope", choices=["directory", "subdirectories", "workingdir"], default="directory")
+    apply_parser.set_defaults(function=cmd_apply)
+
+    rename_parser = commands.add_parser("rename-keyword", help="rename a keyword in all metadata files")
+    rename_parser.add_argument("old")
+    rename_parser.add_argument("new")
+    rename_parser.add_argument("--lazy", action="store_true", help="only save the new keyword, files are migrated when they are used")
+    rename_parser.set_defaults(function=cmd_rename_keyword)
+
+    commands.add_parser("compact", help="save metadata files with old keywords with the current keywords").set_defaults(function=cmd_compact)
+
+    import_parser = commands.add_parser("import-foreign-keywords", help="import keywords and processes of other users")
+    import_parser.add_argument("--skip-processes", action="store_true", help="do not import process descriptions")
+    import_parser.set_defaults(function=cmd_import_foreign_keywords)
+
+    export_parser = commands.add_parser("export", help="export all metadata as json lines or csv")
+    export_parser.add_argument("-o", "--output", help="output file (default stdout)")
+    export_parser.add_argument("--format", choices=FORMATS, default=None, help="default csv for a .csv output file, else jsonl")
+    export_parser.set_defaults(function=cmd_export)
+
+    search_parser = commands.add_parser("search", help="find data files by their metadata")
+    search_parser.add_argument("query", help='e.g. \'author:smith location:"Lab 2" OR sensor*\'')
+    search_parser.set_defaults(function=cmd_search)
+
+    stats_parser = commands.add_parser("stats", help="count the data files per information of keywords")
+    stats_parser.add_argument("keywords", nargs="+", help="group by these keywords")
+    stats_parser.add_argument("--below", help="only data files below this directory")
+    stats_parser.add_argument("--top", type=int, default=None, help="only the n largest groups")
+    stats_parser.set_defaults(function=cmd_stats)
+
+    sync_parser = commands.add_parser("sync", help="synchronize the sqlite database with the metadata text files")
+    sync_parser.add_argument("--direction", choices=["both", "import", "export"], default="both",
+                             help="import text files into the database, export the database as text files or both (the newer side wins)")
+    sync_parser.add_argument("--all", action="store_true", help="also convert files which did not change")
+    sync_parser.set_defaults(function=cmd_sync)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Function which runs a command and prints the summary
+    """
+    args = create_parser().parse_args(argv)
+    args.working_dir = os.path.normpath(os.path.abspath(args.working_dir))
+
+    if args.profile != "":
+        instrumentation.enable(None if args.profile == "1" else args.profile)
+
+    keywords = load_keywords()
+    processes = load_processes()
+    if keywords == [] or processes is None:
+        print(json.dumps({"command": args.command, "error": "keywords.pkl or processes.pkl not found, start the GUI to recover them"}))
+        return 2
+    # versions of the keywords, metadata files with older keywords are migrated when they are read
+    args.schema = load_schema(keywords)
+
+    start = time.perf_counter()
+    try:
+        summary = args.function(args, keywords, processes)
+    except (ValueError, OSError) as e:
+        summary = {"error": str(e)}
+    finally:
+        # the metadata files are written and synced before the summary is printed
+        if "journal" in args:
+            args.journal.close()
+
+    summary = dict({"command": args.command}, **summary)
+    if "moves" in args:
+        summary["moved"] = args.moves
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+
+    # the exported records could be written to stdout
+    out = sys.stderr if args.command == "export" and args.output is None else sys.stdout
+    print(json.dumps(summary), file=out)
+
+    return 1 if "error" in summary or summary.get("failed", 0) > 0 else 0
+
+
+# execute main if cli.py is run
+if __name__ == "__main__":
+    sys.exit(main())
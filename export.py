@@ -0,0 +1,247 @@
+import csv
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from md_table import read_data
+
+
+"""
+This file contains the streaming export of the metadata of a working directory to CSV or JSON Lines:
+
+    get_fields(keywords)
+    read_record(path, keywords, processes, schema, store)
+    map_ordered(function, items, workers, window)
+    MD_export(data_files, output, keywords, processes, format, schema, store, workers, batch_size)
+
+The data files, the records and the lines are passed on one by one (generators),
+so only a window of records is in memory at any time, no MD_files are created.
+"""
+
+FORMATS = ("jsonl", "csv")
+
+# only the first errors are kept in the summary (the number of failed files is always counted)
+MAX_ERRORS = 100
+
+
+def get_fields(keywords):
+    """
+    Function to get the fields of a record (the columns of the CSV file)
+
+        keywords    - list  ... list with all keywords as strings (the first one is the process description)
+    returns:
+        fields      - list  ... path, process name and all keywords
+    """
+    return ["path", "process name"] + list(keywords)
+
+
+def read_record(path, keywords, processes, schema=None, store=None):
+    """
+    Function which reads the record of a data file
+
+        path        - string            ... path to the data file
+        keywords    - list              ... list with all keywords as strings
+        processes   - PD_handler        ... the process descriptions (for the process name)
+        schema      - Keyword_schema    ... metadata with older keywords is migrated (optional)
+        store       - MD_store          ... read from this database instead of the metadata files (optional)
+    returns:
+        record      - dict              ... field, information pairs
+    """
+    if store is None:
+        data = read_data(path, schema)
+    else:
+        data = store.read(path)
+        if not schema is None:
+            data = schema.migrate(list(data.keys()), list(data.values()))
+
+    # the process description can be saved as text or as ID
+    info = data.get(keywords[0], "")
+    name = processes.get_name(info)
+    record = {"path": path, "process name": "" if name is None else name}
+    for key in keywords:
+        record[key] = data.get(key, "")
+    record[keywords[0]] = processes.resolve(info)
+    return record
+
+
+def map_ordered(function, items, workers=1, window=None):
+    """
+    Generator which executes a function for every item on a pool of worker threads
+    and yields the results in the order of the items, at most window items are read ahead
+
+        function    - callable  ... function(item)
+        items       - iterable  ... the items (e.g. a generator of paths)
+        workers     - int       ... number of worker threads
+        window      - int       ... number of submitted items (default 4 per worker)
+    yields:
+        result      - tuple     ... (item, return value, error message or None)
+    """
+    def run(item):
+        try:
+            return function(item), None
+        except Exception as e:
+            return None, str(e)
+
+    if workers <= 1:
+        for item in items:
+            yield (item,) + run(item)
+        return
+
+    if window is None:
+        window = 4 * workers
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for item in items:
+            pending.append((item, pool.submit(run, item)))
+            if len(pending) >= window:
+                item, future = pending.popleft()
+                yield (item,) + future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield (item,) + future.result()
+
+
+class MD_export:
+    """
+    Class which streams one record per data file to a CSV or JSON Lines file.
+
+    Idea:
+        - the data files can be a generator (see snapshot.walk_data_files), the records are read
+          in parallel but written in order, only a window of them is in memory
+        - step() writes one batch like MD_propagation, so the GUI can run it on the I/O worker
+          and show the progress, cancel() stops it and keeps the records written so far
+        - every record holds the path, the process name, the process description and every keyword
+
+        export = MD_export(walk_data_files(working_dir), "metadata.csv", keywords, processes)
+        summary = export.run()  # = number of exported and failed files
+    """
+    def __init__(self, data_files, output, keywords, processes, format=None, schema=None, store=None, workers=1, batch_size=512):
+        """
+        Initialization of the export, the output is opened by the first step
+
+            data_files  - iterable          ... paths to the data files (a list or a generator)
+            output      - string/path/file  ... path to the output file or an open text file (e.g. sys.stdout)
+            keywords    - list              ... list with all keywords as strings
+            processes   - PD_handler        ... the process descriptions (for the process names)
+            format      - string            ... "csv" or "jsonl" (default: taken from the file extension, else jsonl)
+            schema      - Keyword_schema    ... metadata with older keywords is migrated (optional)
+            store       - MD_store          ... read from this database instead of the metadata files (optional)
+            workers     - int               ... number of threads which read the metadata
+            batch_size  - int               ... number of records written by one step
+        """
+        if format is None:
+            format = "csv" if isinstance(output, str) and output.lower().endswith(".csv") else "jsonl"
+        if not format in FORMATS:
+            raise ValueError("unknown export format: " + str(format))
+
+        self.output = output
+        self.format = format
+        self.keywords = list(keywords)
+        self.fields = get_fields(self.keywords)
+        self.batch_size = max(1, batch_size)
+
+        # the database is not shared between threads
+        if not store is None:
+            workers = 1
+        self.records = map_ordered(lambda path: read_record(path, self.keywords, processes, schema, store), data_files, workers)
+
+        self.file = None
+        self.writer = None
+        self.finished = False
+        self.cancelled = False
+        self.summary = {"files": 0, "exported": 0, "failed": 0, "errors": [], "cancelled": False, "format": format}
+
+    def done(self):
+        """
+        Number of files which were handled so far
+        """
+        return self.summary["files"]
+
+    def cancel(self):
+        """
+        Function which stops the export before the next batch (the records written so far stay in the file)
+        """
+        self.cancelled = True
+        self.summary["cancelled"] = True
+
+    def open(self):
+        """
+        Function which opens the output and writes the header of a CSV file
+        """
+        if isinstance(self.output, str):
+            # newline="" lets the csv module write the line endings
+            self.file = open(self.output, "w", newline="", encoding="utf-8")
+        else:
+            self.file = self.output
+
+        if self.format == "csv":
+            self.writer = csv.DictWriter(self.file, fieldnames=self.fields)
+            self.writer.writeheader()
+
+    def close(self):
+        """
+        Function which stops reading and closes the output (an open file which was passed in is only flushed)
+        """
+        self.finished = True
+        self.records.close()
+        if self.file is None:
+            return
+        if self.file is self.output:
+            self.file.flush()
+        else:
+            self.file.close()
+
+    def step(self):
+        """
+        Function which writes the next batch of records
+
+        returns:
+            more    - bool  ... False if all files were exported or the export was cancelled
+        """
+        if self.finished:
+            return False
+        if self.cancelled:
+            self.close()
+            return False
+
+        if self.file is None:
+            self.open()
+
+        n = 0
+        for path, record, error in self.records:
+            self.summary["files"] += 1
+            if error is None:
+                if self.format == "csv":
+                    self.writer.writerow(record)
+                else:
+                    self.file.write(json.dumps(record) + "\n")
+                self.summary["exported"] += 1
+            else:
+                self.summary["failed"] += 1
+                if len(self.summary["errors"]) < MAX_ERRORS:
+                    self.summary["errors"].append({"path": path, "error": error})
+
+            n += 1
+            if n >= self.batch_size:
+                return True
+
+        # all data files were read
+        self.close()
+        return False
+
+    def run(self, progress=None):
+        """
+        Function which exports all files at once
+
+            progress    - callable  ... function(done) called after every batch (optional)
+        returns:
+            summary     - dict      ... number of exported and failed files and the first errors
+        """
+        try:
+            while self.step():
+                if not progress is None:
+                    progress(self.done())
+        finally:
+            if not self.finished:
+                self.close()
+        return self.summary
@@ -0,0 +1,272 @@
+import os
+import sys
+import json
+import time
+import atexit
+import builtins
+import threading
+from contextlib import contextmanager, nullcontext
+
+
+"""
+This file contains the instrumentation which shows where the time of a slow start or bulk operation goes:
+
+    enable(report_path)
+    phase(name)
+    begin(name) / end(token)
+    record(name, seconds)
+    report()
+    print_report(file)
+
+Enable it with MD_TOOL_PROFILE=1 (report on stderr when the tool exits),
+MD_TOOL_PROFILE=<file>.json (report also saved as json) or cli.py --profile.
+
+When it is enabled the file functions are wrapped and counted:
+    opens, reads, writes, bytes read and written, stat calls and makedirs calls
+Each phase (e.g. scan, recovery, dict build, tree build, selection, bulk apply) is timed
+and gets the counts of the file functions called while it ran.
+
+When it is disabled nothing is wrapped, phase() returns a shared empty context manager
+and begin()/end() return at once.
+"""
+
+# "" is off, "1" prints the report, everything else is the path of the json report
+PROFILE = os.environ.get("MD_TOOL_PROFILE", "")
+
+COUNTERS = ("opens", "reads", "writes", "bytes_read", "bytes_written", "stats", "makedirs")
+
+enabled = False
+
+# the file functions are called from several threads
+_lock = threading.Lock()
+_counts = dict.fromkeys(COUNTERS, 0)
+# phase -> {"calls", "seconds", "max_seconds", counters...}
+_phases = {}
+_report_path = None
+_start = None
+
+_original_open = builtins.open
+_original_stat = os.stat
+_original_makedirs = os.makedirs
+
+_NO_PHASE = nullcontext()
+
+
+def _count(name, n=1):
+    """
+    Function to increase a counter
+    """
+    with _lock:
+        _counts[name] += n
+
+
+class Counted_file:
+    """
+    Wrapper around an open file which counts the reads, the writes and their size
+    """
+    def __init__(self, file):
+        self._file = file
+
+    def read(self, *args):
+        data = self._file.read(*args)
+        _count("reads")
+        _count("bytes_read", len(data))
+        return data
+
+    def readline(self, *args):
+        data = self._file.readline(*args)
+        _count("reads")
+        _count("bytes_read", len(data))
+        return data
+
+    def readlines(self, *args):
+        lines = self._file.readlines(*args)
+        _count("reads")
+        _count("bytes_read", sum(len(line) for line in lines))
+        return lines
+
+    def write(self, data):
+        _count("writes")
+        _count("bytes_written", len(data))
+        return self._file.write(data)
+
+    def __iter__(self):
+        _count("reads")
+        for line in self._file:
+            _count("bytes_read", len(line))
+            yield line
+
+    def __enter__(self):
+        self._file.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        return self._file.__exit__(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def _counted_open(*args, **kwargs):
+    _count("opens")
+    return Counted_file(_original_open(*args, **kwargs))
+
+
+def _counted_stat(*args, **kwargs):
+    # os.path.isfile, isdir and exists call os.stat as well
+    _count("stats")
+    return _original_stat(*args, **kwargs)
+
+
+def _counted_makedirs(*args, **kwargs):
+    _count("makedirs")
+    return _original_makedirs(*args, **kwargs)
+
+
+def enable(report_path=None):
+    """
+    Function which starts counting and prints the report when the tool exits
+
+        report_path - string/path   ... also save the report as json to this file (optional)
+    """
+    global enabled, _report_path, _start
+    if enabled:
+        return
+    enabled = True
+    _report_path = report_path
+    _start = time.perf_counter()
+
+    builtins.open = _counted_open
+    os.stat = _counted_stat
+    os.makedirs = _counted_makedirs
+
+    atexit.register(_exit_report)
+
+
+def enable_from_environment():
+    """
+    Function which enables the instrumentation if MD_TOOL_PROFILE is set
+    """
+    if PROFILE != "":
+        enable(None if PROFILE == "1" else PROFILE)
+
+
+def counts():
+    """
+    Function to get a copy of the counters
+    """
+    with _lock:
+        return dict(_counts)
+
+
+def begin(name):
+    """
+    Function to start timing a phase which ends in another function (e.g. a callback of the Tk main loop)
+
+        name    - string    ... name of the phase
+    returns:
+        token   - tuple     ... pass it to end() (None if the instrumentation is disabled)
+    """
+    if not enabled:
+        return None
+    return name, time.perf_counter(), counts()
+
+
+def end(token):
+    """
+    Function to stop timing a phase started with begin()
+
+        token   - tuple     ... returned by begin()
+    """
+    if token is None:
+        return
+    name, start, before = token
+    seconds = time.perf_counter() - start
+    after = counts()
+    record(name, seconds, {key: after[key] - before[key] for key in COUNTERS})
+
+
+def record(name, seconds, deltas=None):
+    """
+    Function to add a measurement to a phase
+
+        name    - string    ... name of the phase
+        seconds - float     ... duration of the measurement
+        deltas  - dict      ... counts of the file functions during the measurement (optional)
+    """
+    if not enabled:
+        return
+    with _lock:
+        if not name in _phases:
+            _phases[name] = dict({"calls": 0, "seconds": 0.0, "max_seconds": 0.0}, **dict.fromkeys(COUNTERS, 0))
+        entry = _phases[name]
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+        if not deltas is None:
+            for key in COUNTERS:
+                entry[key] += deltas[key]
+
+
+def phase(name):
+    """
+    Context manager which times a phase
+
+        with phase("scan"):
+            snapshot = WD_snapshot(working_dir)
+
+        name    - string    ... name of the phase
+    """
+    if not enabled:
+        return _NO_PHASE
+    return _timed_phase(name)
+
+
+@contextmanager
+def _timed_phase(name):
+    token = begin(name)
+    try:
+        yield
+    finally:
+        end(token)
+
+
+def report():
+    """
+    Function to create the report
+
+    returns:
+        report  - dict  ... total seconds, counters and the phases
+    """
+    with _lock:
+        return {"seconds": 0.0 if _start is None else time.perf_counter() - _start,
+                "counts": dict(_counts),
+                "phases": {name: dict(entry) for name, entry in _phases.items()}}
+
+
+def print_report(file=None):
+    """
+    Function which prints the report as a table
+
+        file    - file  ... where to print (default stderr)
+    """
+    if file is None:
+        file = sys.stderr
+    data = report()
+
+    print("md-tool profile (" + str(round(data["seconds"], 3)) + "s)", file=file)
+    print("\t" + ", ".join(key + " " + str(data["counts"][key]) for key in COUNTERS), file=file)
+    for name, entry in data["phases"].items():
+        print("\t" + name + ": " + str(entry["calls"]) + "x " + str(round(entry["seconds"], 3)) + "s"
+              + " (max " + str(round(entry["max_seconds"], 3)) + "s), "
+              + ", ".join(key + " " + str(entry[key]) for key in COUNTERS if entry[key] > 0), file=file)
+
+
+def _exit_report():
+    """
+    Function which prints (and saves) the report when the tool exits
+    """
+    print_report()
+    if not _report_path is None:
+        with _original_open(_report_path, "w") as f:
+            json.dump(report(), f, indent=2)
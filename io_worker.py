@@ -0,0 +1,153 @@
+import queue
+import threading
+import traceback
+
+
+# milliseconds between two looks of the Tk main loop for finished requests
+POLL_INTERVAL = 20
+
+
+class IO_worker:
+    """
+    Class which runs the file I/O of the GUI on one background thread,
+    so the Tk main loop never waits for the disc.
+
+    Idea:
+        - requests are executed one after another in the order they were submitted,
+          so a save of a file always completes before a later read of the same file
+        - the results are passed back to the Tk main loop (polled with master.after),
+          callbacks always run on the main thread
+        - errors are passed to on_error on the main thread, also the errors of the callbacks,
+          a request which failed calls its errback instead of its callback (to clean up)
+
+        io = IO_worker(master, on_error=show_error)
+        io.submit(function, arg, callback=show) # function(arg) runs on the worker, show(result) on the main loop
+        io.submit(function, arg, callback=show, errback=reset) # reset(error) runs if function(arg) failed
+        io.drain()                              # wait until everything is done (e.g. before quitting)
+    """
+    def __init__(self, master, on_error=None):
+        """
+        Initialization of the worker, this starts the background thread
+
+            master      - tk.Tk     ... the main window (used to schedule the callbacks)
+            on_error    - callable  ... function(error) called on the main thread if a request fails
+        """
+        self.master = master
+        self.on_error = on_error
+
+        # (function, arguments, callback, errback) in the order of submission
+        self.requests = queue.Queue()
+        # (callback, errback, result, error) of finished requests
+        self.results = queue.Queue()
+
+        # the main loop only polls while requests are outstanding
+        self.polling = False
+
+        self.thread = threading.Thread(target=self.run, name="IO_worker", daemon=True)
+        self.thread.start()
+
+    def submit(self, function, *args, callback=None, errback=None):
+        """
+        Function to queue a request (only call this from the main thread)
+
+            function    - callable  ... function(*args) which is executed on the worker thread
+            args        - any       ... arguments of the function
+            callback    - callable  ... function(result) which is called on the main thread (optional)
+            errback     - callable  ... function(error) which is called on the main thread instead of the callback
+                                        if the request failed, before on_error (optional)
+        """
+        self.requests.put((function, args, callback, errback))
+
+        if not self.polling:
+            self.polling = True
+            self.master.after(POLL_INTERVAL, self.poll)
+
+    def run(self):
+        """
+        Function which executes the requests on the worker thread
+        """
+        while True:
+            function, args, callback, errback = self.requests.get()
+            # None stops the worker
+            if function is None:
+                self.requests.task_done()
+                return
+
+            try:
+                result = function(*args)
+                error = None
+            except Exception as e:
+                result = None
+                error = e
+                traceback.print_exc()
+
+            if not callback is None or not error is None:
+                self.results.put((callback, errback, result, error))
+            self.requests.task_done()
+
+    def process_results(self):
+        """
+        Function which runs the callbacks of all finished requests (on the main thread)
+        """
+        while True:
+            try:
+                callback, errback, result, error = self.results.get_nowait()
+            except queue.Empty:
+                return
+
+            # a failing callback must not stop the callbacks of the other requests
+            try:
+                if error is None:
+                    callback(result)
+                elif not errback is None:
+                    errback(error)
+            except Exception as e:
+                traceback.print_exc()
+                error = e
+
+            if not error is None:
+                self.report(error)
+
+    def report(self, error):
+        """
+        Function which passes an error to on_error (on the main thread)
+        """
+        if self.on_error is None:
+            return
+        try:
+            self.on_error(error)
+        except Exception:
+            traceback.print_exc()
+
+    def poll(self):
+        """
+        Function which is called from the Tk main loop while requests are outstanding
+        """
+        try:
+            self.process_results()
+        finally:
+            # the results of all finished requests are already queued if nothing is outstanding
+            if self.requests.unfinished_tasks > 0 or not self.results.empty():
+                self.master.after(POLL_INTERVAL, self.poll)
+            else:
+                self.polling = False
+
+    def busy(self):
+        """
+        Function to check if requests are outstanding
+        """
+        return self.requests.unfinished_tasks > 0
+
+    def drain(self):
+        """
+        Function which waits until all submitted requests are done and runs their callbacks
+        """
+        self.requests.join()
+        self.process_results()
+
+    def stop(self):
+        """
+        Function which finishes all submitted requests and stops the worker thread
+        """
+        self.requests.put((None, (), None, None))
+        self.thread.join()
@@ -0,0 +1,385 @@
+import os
+import zlib
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from md_file import atomic_write
+
+
+# directory next to keywords.pkl and processes.pkl which holds one journal per working directory
+JOURNAL_DIR = "journals"
+
+# number of file updates which are committed together at most
+GROUP_SIZE = 512
+
+# size of the journal after which the applied updates are synced to the disc and the journal is emptied
+CHECKPOINT_BYTES = 4 * 2**20
+
+# seconds a write outside of a transaction waits for further writes before they are committed together
+COMMIT_DELAY = 0.05
+
+
+def encode_group(records):
+    """
+    Function which encodes file updates as one committed group of the journal:
+
+        W <length of the path> <length of the content>\\n<path><content>   (one per file update)
+        C <number of updates> <crc32 of the updates>\\n
+
+        records - list  ... (path, content) pairs
+    returns:
+        group   - bytes ... the encoded group
+    """
+    body = b""
+    for path, content in records:
+        path = path.encode()
+        content = content.encode()
+        body += b"W %d %d\n" % (len(path), len(content)) + path + content
+    return body + b"C %d %08x\n" % (len(records), zlib.crc32(body))
+
+
+def decode_groups(data):
+    """
+    Function which decodes all complete groups of a journal,
+    a group which was not committed completely (e.g. because of a crash) is ignored
+
+        data    - bytes ... content of the journal
+    returns:
+        groups  - list  ... list of (path, content) lists
+    """
+    groups = []
+    records = []
+    start = 0
+    i = 0
+    try:
+        while i < len(data):
+            line_start = i
+            end = data.index(b"\n", i)
+            fields = data[i:end].split(b" ")
+            i = end + 1
+
+            if fields[0] == b"W":
+                path_length, content_length = int(fields[1]), int(fields[2])
+                if i + path_length + content_length > len(data):
+                    break
+                path = data[i:i + path_length].decode()
+                content = data[i + path_length:i + path_length + content_length].decode()
+                i += path_length + content_length
+                records.append((path, content))
+            elif fields[0] == b"C":
+                # the group only counts if it is complete and unchanged
+                if int(fields[1]) != len(records) or int(fields[2], 16) != zlib.crc32(data[start:line_start]):
+                    break
+                groups.append(records)
+                records = []
+                start = i
+            else:
+                break
+    except (ValueError, IndexError, UnicodeDecodeError):
+        # everything after a broken record is ignored
+        pass
+    return groups
+
+
+def fsync_path(path):
+    """
+    Function which syncs a file or a directory to the disc
+    (directories can not be opened on every system, they are skipped there)
+
+        path    - string    ... path to the file or directory
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class Write_journal:
+    """
+    Class which makes writing many metadata files crash-safe without syncing every single file.
+
+    Idea:
+        - the new content of the metadata files is collected and appended to the journal as one group
+        - the journal is synced to the disc once per group (group commit), then the files are written
+          to a temporary file and renamed into place (a file is never half written)
+        - single writes outside of a transaction (e.g. the saves of the GUI) are committed together
+          after COMMIT_DELAY, until then read() returns their content
+        - on the next start committed groups are written again (replay), so updates interrupted by a crash
+          or failed writes are not lost
+        - from time to time the written files are synced to the disc and the journal is emptied (checkpoint)
+
+        journal = Write_journal(working_dir)
+        journal.replay()
+        with journal.transaction():     # all updates inside are committed in groups
+            md = MD_file(path, keywords, journal=journal)
+            md[keyword] = "info"
+    """
+    def __init__(self, working_dir, workers=1):
+        """
+        Initialization of the journal
+
+            working_dir - string/path   ... path to the working directory
+            workers     - int           ... number of threads which write the files of a committed group
+        """
+        self.working_dir = os.path.normpath(working_dir)
+        # one journal per working directory
+        self.path = os.path.join(JOURNAL_DIR, hashlib.sha1(os.path.abspath(self.working_dir).encode()).hexdigest() + ".journal")
+
+        # the journal is shared by all threads
+        self.lock = threading.RLock()
+        # metadata file -> content which is not committed yet
+        self.pending = OrderedDict()
+        # metadata file -> content which could not be written (kept in the journal for the next replay)
+        self.failed = OrderedDict()
+        # depth of nested transactions
+        self.transaction_depth = 0
+        # commits the writes outside of a transaction after COMMIT_DELAY (None if nothing waits)
+        self.timer = None
+        # metadata files written since the last checkpoint (synced by the checkpoint)
+        self.applied = set()
+
+        self.workers = workers
+        self.pool = None
+        # the threads of the pool can not be used any more when the program ends
+        self.exiting = False
+
+        self.file = None
+        # make sure everything is committed when the program ends
+        atexit.register(self.close_at_exit)
+
+    def open(self):
+        """
+        Function which opens the journal file for appending
+        """
+        if self.file is None:
+            os.makedirs(JOURNAL_DIR, exist_ok=True)
+            self.file = open(self.path, "ab")
+
+    def replay(self):
+        """
+        Function which writes the committed updates of the last run again
+        (only needed if it did not end cleanly, otherwise the journal is empty)
+
+        returns:
+            replayed    - int   ... number of metadata files which were written again
+        """
+        with self.lock:
+            try:
+                with open(self.path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                return 0
+
+            # only the last content of each file counts
+            records = OrderedDict()
+            for group in decode_groups(data):
+                for path, content in group:
+                    records[path] = content
+
+            # files which already hold the content do not need to be written again
+            changed = []
+            for path, content in records.items():
+                try:
+                    with open(path, "r") as f:
+                        if f.read() == content:
+                            continue
+                except OSError:
+                    pass
+                changed.append((path, content))
+
+            failed = self.apply_all(changed)
+
+            self.checkpoint()
+            return len(changed) - len(failed)
+
+    def apply(self, path, content):
+        """
+        Function which writes a committed update to the metadata file
+
+            path        - string    ... path to the metadata file
+            content     - string    ... new content of the file
+        returns:
+            success     - bool      ... False if the file could not be written
+        """
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, content)
+        except OSError:
+            return False
+        return True
+
+    def apply_all(self, records):
+        """
+        Function which writes committed updates to the metadata files (in parallel),
+        files which could not be written are kept in the journal
+
+            records - list  ... (path, content) pairs
+        returns:
+            failed  - list  ... metadata files which could not be written
+        """
+        results = self.map(lambda record: self.apply(*record), records)
+
+        failed = []
+        for (path, content), success in zip(records, results):
+            if success:
+                self.failed.pop(path, None)
+                self.applied.add(path)
+            else:
+                self.failed[path] = content
+                failed.append(path)
+        return failed
+
+    def map(self, function, items):
+        """
+        Function which calls a function for every item, on the threads of the pool if there are several workers
+        (one after another when the program ends, the pool can not start new threads then)
+
+            function    - callable  ... function(item)
+            items       - list      ... the items
+        returns:
+            results     - list      ... the results in the order of the items
+        """
+        if self.workers <= 1 or len(items) <= 1 or self.exiting:
+            return [function(item) for item in items]
+
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            return list(self.pool.map(function, items))
+        except RuntimeError:
+            # the pool was already shut down by the interpreter
+            self.exiting = True
+            return [function(item) for item in items]
+
+    def write(self, path, content):
+        """
+        Function to write a metadata file through the journal
+
+            path    - string    ... path to the metadata file
+            content - string    ... new content of the file
+        """
+        with self.lock:
+            # a later update of the same file replaces the earlier one
+            self.pending.pop(path, None)
+            self.pending[path] = content
+            if len(self.pending) >= GROUP_SIZE:
+                self.commit()
+            elif self.transaction_depth == 0 and self.timer is None:
+                # further writes within the delay join the same group
+                self.timer = threading.Timer(COMMIT_DELAY, self.commit)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def read(self, path):
+        """
+        Function to get the content of a metadata file which is not written yet
+
+            path    - string    ... path to the metadata file
+        returns:
+            content - string    ... the content or None if the file is up to date
+        """
+        with self.lock:
+            return self.pending.get(path)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager which commits all writes inside in groups (nested transactions join the outer one)
+        """
+        with self.lock:
+            self.transaction_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.transaction_depth -= 1
+                if self.transaction_depth == 0:
+                    self.commit()
+
+    def commit(self):
+        """
+        Function which appends the pending updates as one group to the journal,
+        syncs the journal once and writes the metadata files
+
+        returns:
+            failed  - list  ... metadata files which could not be written
+        """
+        with self.lock:
+            if not self.timer is None:
+                self.timer.cancel()
+                self.timer = None
+            if len(self.pending) == 0:
+                return []
+
+            records = list(self.pending.items())
+            self.pending.clear()
+
+            self.open()
+            self.file.write(encode_group(records))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+            failed = self.apply_all(records)
+
+            if self.file.tell() > CHECKPOINT_BYTES:
+                self.checkpoint()
+            return failed
+
+    def sync_applied(self):
+        """
+        Function which syncs the metadata files written since the last checkpoint
+        and their directories (the renames) to the disc
+        """
+        directories = set(os.path.dirname(path) for path in self.applied)
+        paths = list(self.applied) + list(directories)
+        self.applied = set()
+
+        self.map(fsync_path, paths)
+
+    def checkpoint(self):
+        """
+        Function which syncs the written metadata files to the disc and empties the journal,
+        updates which failed stay in the journal
+        """
+        with self.lock:
+            self.sync_applied()
+
+            self.open()
+            self.file.truncate(0)
+            if len(self.failed) > 0:
+                self.file.write(encode_group(list(self.failed.items())))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        """
+        Function which commits the pending updates and empties the journal
+        """
+        with self.lock:
+            if self.file is None and len(self.pending) == 0:
+                return
+            self.commit()
+            self.checkpoint()
+            self.file.close()
+            self.file = None
+            if not self.pool is None:
+                self.pool.shutdown()
+                self.pool = None
+
+    def close_at_exit(self):
+        """
+        Function which closes the journal when the program ends without closing it
+        (the metadata files are written one after another then)
+        """
+        with self.lock:
+            self.exiting = True
+            self.close()
@@ -1,18 +1,26 @@
-import os
-from md_file import MD_file
+import time
+# the time until the window is shown and can be used is measured from here
+start = time.perf_counter()
+
 from utils import *
 import tkinter as tk
-import tkinter.ttk as ttk
-from GUI import GUI
-from process_description import PD_handler
 from tkinter import messagebox
-from recovery import *
+import instrumentation
+
+# the GUI, the recovery and the modules which load the working directory are imported
+# when they are needed, so the dialogs and the main window show up quickly
 
 
 def main():
     """
-    Function which starts the main program loop
+    Function which starts the main program loop.
+    One hidden root window is used for all dialogs and becomes the main window,
+    it is shown right after the working directory was picked and the working directory
+    is loaded behind it (see Startup)
     """
+    # MD_TOOL_PROFILE counts the file operations and times the phases
+    instrumentation.enable_from_environment()
+
     root = tk.Tk()
     root.withdraw()
     # load the list filled with keywords
@@ -20,7 +28,9 @@ def main():
 
     if keywords == []:
         if messagebox.askyesno("keywords.pkl not found", "keywords.pkl not found.\nDo you want to try to recover the keywords?"):
-            if recover_keywords():
+            from recovery import recover_keywords
+
+            if recover_keywords(root):
                 messagebox.showinfo("keywords.pkl", "Successfully saved keywords.pkl\nRestart the tool now.")
             else:
                 messagebox.showinfo("keywords.pkl not found", "You did not recover the keywords.")
@@ -28,12 +38,17 @@ def main():
             messagebox.showinfo("keywords.pkl not found", "You did not recover the keywords.")
         exit()
 
+    # load the versions of the keywords (metadata files with older keywords are migrated when they are read)
+    schema = load_schema(keywords)
+
     # load the process descriptions
     processes = load_processes()
     
     if processes is None:
         if messagebox.askyesno("processes.pkl not found", "processes.pkl not found.\nDo you want to try to recover process descriptions?"):
-            if recover_processes():
+            from recovery import recover_processes
+
+            if recover_processes(root):
                 messagebox.showinfo("processes.pkl", "Successfully recovered processes.pkl\nRestart the tool now.")
             else:
                 messagebox.showinfo("processes.pkl not found", "You did not recover the process descriptions.")
@@ -42,34 +57,20 @@ def main():
         exit()
 
     # choose a working directory
-    working_dir = get_working_dir()
+    working_dir = get_working_dir(root)
 
-    if not type(working_dir) is str:
+    if not type(working_dir) is str or working_dir == "":
         exit()
 
-    # search for unkown keywords or processes in the working directory
-    reload_keywords, reload_processes = recover_from_other_users(working_dir, keywords, processes)
-
-    if reload_keywords:
-        keywords = load_keywords()
+    from GUI import GUI
+    from startup import Startup
 
-    if reload_processes:
-        processes = load_processes()
-
-    # create the list with all file paths
-    data_file_list = create_data_file_list(working_dir)
-
-    # create the MD_file_dict
-    MD_files = create_MD_file_dict(data_file_list, keywords)
-    
-    # create the gui object
-    gui_handler = GUI(working_dir, MD_files, keywords, processes)
+    # create the gui object, the window is shown before the working directory is scanned
+    gui_handler = GUI(working_dir, None, keywords, processes, master=root)
+    # scan the working directory, look for other users and load the metadata behind the window
+    Startup(gui_handler, working_dir, keywords, processes, schema, start).start()
     # start the mainloop
     gui_handler.start_mainloop()
-    
-
-    
-
 
 
 # execute main if main.py is run
@@ -0,0 +1,225 @@
+import os
+import pickle
+import time
+import hashlib
+
+
+# the manifest is thrown away if it was written by a different version
+MANIFEST_VERSION = 2
+
+# directory next to keywords.pkl and processes.pkl which holds one manifest per working directory
+# (saving it inside the working directory would change the mtime of the working directory itself)
+MANIFEST_DIR = "manifests"
+
+# directories modified less than this before the scan could still change within the same mtime
+RACY_SECONDS = 2
+
+
+class Scan_manifest:
+    """
+    Class which stores what the last scan of a working directory found,
+    so that the next start only needs to look at what changed since then.
+
+    Idea:
+        - each directory is saved with its mtime and its entries
+          (the mtime of a directory changes if entries are added, removed or renamed)
+        - each metadata file is saved with its size, its mtime and its parsed keyword header
+        - unchanged directories are not listed again, unchanged metadata files are not parsed again
+        - each data file is saved with its device, inode, size and mtime to recognise it after a move
+        - a corrupt manifest or one of a different version leads to a full scan
+
+        manifest = Scan_manifest(working_dir)
+        snapshot = WD_snapshot(working_dir, manifest)
+        manifest.header(metadata_path)  # = (keywords, process description) or None if it changed
+        manifest.save(snapshot)
+    """
+    def __init__(self, working_dir):
+        """
+        Initialization of the manifest, this loads the manifest file if available
+
+            working_dir - string/path   ... path to the working directory
+        """
+        self.working_dir = os.path.normpath(working_dir)
+        # one manifest file per working directory
+        self.path = os.path.join(MANIFEST_DIR, hashlib.sha1(os.path.abspath(self.working_dir).encode()).hexdigest() + ".pkl")
+
+        # directory -> (mtime, entries of the directory)
+        self.directories = {}
+        # metadata file -> (size, mtime, keywords, process description)
+        self.metadata = {}
+        # data file -> (device, inode, size, mtime)
+        self.data_files = {}
+        # disappeared data files whose metadata could not be moved yet (their identity is kept for the next scan)
+        self.unmoved = set()
+
+        # stats taken during this run which are saved together with the new information
+        self.pending_directories = {}
+        self.pending_metadata = {}
+
+        # start of this run to detect modifications which happened just before the scan
+        self.scan_start = time.time_ns()
+
+        self.load()
+
+    def load(self):
+        """
+        Function which loads the manifest file, falls back to an empty manifest (full scan)
+        if the file is missing, corrupt or of a different version
+        """
+        if not os.path.isfile(self.path):
+            return
+
+        try:
+            with open(self.path, "rb") as f:
+                manifest = pickle.load(f)
+
+            if manifest["version"] != MANIFEST_VERSION or manifest["working_dir"] != self.working_dir:
+                return
+
+            directories = manifest["directories"]
+            metadata = manifest["metadata"]
+            data_files = manifest["data_files"]
+        except Exception:
+            # everything which cannot be read leads to a full scan
+            return
+
+        self.directories = directories
+        self.metadata = metadata
+        self.data_files = data_files
+
+    def is_racy(self, mtime):
+        """
+        Function to check if a modification happened too close to the scan to trust the mtime
+
+            mtime   - int   ... modification time in ns
+        """
+        return mtime >= self.scan_start - RACY_SECONDS * 10**9
+
+    def directory(self, dir):
+        """
+        Function to get the saved entries of a directory if it did not change
+
+            dir     - string/path   ... path to the directory
+        returns:
+            entries - tuple         ... saved entries of the directory or None if it changed
+        """
+        try:
+            mtime = os.stat(dir).st_mtime_ns
+        except OSError:
+            return None
+
+        # remember the mtime for set_directory
+        self.pending_directories[dir] = mtime
+
+        if dir in self.directories:
+            saved_mtime, entries = self.directories[dir]
+            if saved_mtime == mtime:
+                return entries
+        return None
+
+    def set_directory(self, dir, entries):
+        """
+        Function to save the entries of a scanned directory
+
+            dir     - string/path   ... path to the directory
+            entries - tuple         ... entries of the directory
+        """
+        mtime = self.pending_directories.pop(dir, None)
+        # None never matches the next time
+        if mtime is None or self.is_racy(mtime):
+            mtime = None
+        self.directories[dir] = (mtime, entries)
+
+    def has_metadata(self, path):
+        """
+        Function to check if a metadata file was found by the last scan
+
+            path    - string/path   ... path to the metadata file
+        """
+        return path in self.metadata
+
+    def header(self, path):
+        """
+        Function to get the saved keyword header of a metadata file if it did not change
+
+            path    - string/path   ... path to the metadata file
+        returns:
+            header  - tuple         ... (keywords, process description) or None if it changed
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        # remember the stat for set_header
+        self.pending_metadata[path] = (st.st_size, st.st_mtime_ns)
+
+        if path in self.metadata:
+            size, mtime, keywords, pd = self.metadata[path]
+            if size == st.st_size and mtime == st.st_mtime_ns:
+                return list(keywords), pd
+        return None
+
+    def set_header(self, path, keywords, pd):
+        """
+        Function to save the parsed keyword header of a metadata file
+
+            path        - string/path   ... path to the metadata file
+            keywords    - list          ... keywords found in the file
+            pd          - string        ... process description found in the file
+        """
+        size, mtime = self.pending_metadata.pop(path, (None, None))
+        if mtime is None or self.is_racy(mtime):
+            mtime = None
+        self.metadata[path] = (size, mtime, tuple(keywords), pd)
+
+    def identity(self, path):
+        """
+        Function to get the saved identity of a data file
+
+            path        - string/path   ... path to the data file
+        returns:
+            identity    - tuple         ... (device, inode, size, mtime) or None if the data file is unknown
+        """
+        return self.data_files.get(path)
+
+    def set_identity(self, path, st):
+        """
+        Function to save the identity of a data file
+
+            path    - string/path   ... path to the data file
+            st      - stat_result   ... result of os.stat of the data file
+        """
+        self.data_files[path] = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def save(self, snapshot=None):
+        """
+        Function to save the manifest to the manifest directory
+
+            snapshot    - WD_snapshot   ... if given everything not found by this snapshot is removed
+        """
+        if not snapshot is None:
+            directories = set(snapshot.directories)
+            metadata_files = set(snapshot.metadata_files)
+            self.directories = {dir: self.directories[dir] for dir in self.directories if dir in directories}
+            self.metadata = {path: self.metadata[path] for path in self.metadata if path in metadata_files}
+            data_files = set(snapshot.data_files)
+            self.data_files = {path: self.data_files[path] for path in self.data_files
+                               if path in data_files or path in self.unmoved}
+
+        manifest = {"version": MANIFEST_VERSION,
+                    "working_dir": self.working_dir,
+                    "directories": self.directories,
+                    "metadata": self.metadata,
+                    "data_files": self.data_files}
+
+        try:
+            if not os.path.isdir(MANIFEST_DIR):
+                os.makedirs(MANIFEST_DIR)
+            # write to a temporary file first so that a crash does not leave a broken manifest
+            with open(self.path + ".tmp", "wb") as f:
+                pickle.dump(manifest, f)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError:
+            # the next start does a full scan
+            pass
@@ -1,4 +1,136 @@
 import os
+import sys
+from contextlib import contextmanager
+from snapshot import TOOL_FILE_PREFIX
+
+
+# first line of every metadata file, followed by the path to the data file
+PATH_PREFIX = "path to data file: "
+# separates the keyword from the information in every other line
+SEPARATOR = "::  "
+
+
+def get_metadata_path(path):
+    """
+    Function to create the path to the metadata file of a data file
+
+        path            - string    ... path to the data file
+    returns:
+        metadata_path   - string    ... path to the metadata file
+    """
+    return os.path.join(os.path.split(path)[0], "metadata", 
+                        os.path.split(path)[1].replace(".", "-") + "-metadata.txt")
+
+
+def atomic_write(path, content):
+    """
+    Function which replaces a file without ever leaving it half written:
+    the content is written to a temporary file next to it which is then renamed into place
+
+        path    - string    ... path to the file
+        content - string    ... new content of the file
+    """
+    # the temporary file starts with the tool prefix, so the scan ignores it if a crash leaves it behind
+    tmp_path = os.path.join(os.path.dirname(path), TOOL_FILE_PREFIX + "-" + os.path.basename(path) + ".tmp")
+    with open(tmp_path, "w") as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+
+def parse_lines(lines, header_only=False, limit=None):
+    """
+    Function which parses the lines of a metadata file in one pass,
+    the lines are consumed one by one so an open file is never read completely into memory
+
+        lines       - iterable  ... lines of the metadata file (e.g. the open file, with or without line endings)
+        header_only - bool      ... only the keywords and the first information (the process description) are kept
+        limit       - int       ... stop after this many keywords (optional, e.g. 1 for only the process description)
+    returns:
+        data_path   - string    ... path to the data file written in the first line (None if it is missing)
+        keywords    - list      ... keywords in the order of the file
+        values      - list      ... information of each keyword (only the first one if header_only)
+    """
+    lines = iter(lines)
+
+    # the first line refers to the data file
+    first = next(lines, "").rstrip("\n")
+    data_path = first[len(PATH_PREFIX):] if first.startswith(PATH_PREFIX) else None
+
+    keywords = []
+    values = []
+    for line in lines:
+        # only the first separator counts, the information can contain it as well
+        key, separator, info = line.partition(SEPARATOR)
+        # skipping the empty second line and lines cut off by a crash
+        # (files written before the writes were made crash-safe)
+        if separator == "":
+            continue
+
+        keywords.append(key)
+        if not header_only or len(values) == 0:
+            values.append(info.rstrip("\n"))
+
+        if not limit is None and len(keywords) >= limit:
+            break
+
+    return data_path, keywords, values
+
+
+def parse_metadata(path, header_only=False, limit=None):
+    """
+    Function which reads and parses a metadata file in one pass (see parse_lines)
+
+        path        - string    ... path to the metadata file
+        header_only - bool      ... only the keywords and the first information (the process description) are kept
+        limit       - int       ... stop reading after this many keywords (optional)
+    returns:
+        data_path   - string    ... path to the data file written in the first line (None if it is missing)
+        keywords    - list      ... keywords in the order of the file
+        values      - list      ... information of each keyword (only the first one if header_only)
+    """
+    with open(path, "r") as f:
+        return parse_lines(f, header_only, limit)
+
+
+class Keyword_layout:
+    """
+    Class which holds a keyword list and the position of each keyword.
+    All MD_files with the same keywords share one layout (see get_layout) and only keep their information in a list.
+
+        layout = get_layout(keywords)
+        layout.positions[keyword]   # = index of the information of this keyword
+    """
+    __slots__ = ("keywords", "positions")
+
+    def __init__(self, keywords):
+        """
+        Initialization of the layout (use get_layout to get the shared one)
+
+            keywords - tuple    ... all metadata keywords
+        """
+        self.keywords = keywords
+        self.positions = {key: i for i, key in enumerate(keywords)}
+
+
+# keyword tuple -> shared layout (there are only a few keyword lists, one per version of the keywords)
+_layouts = {}
+
+
+def get_layout(keywords):
+    """
+    Function to get the shared layout of a keyword list
+
+        keywords - list             ... all metadata keywords
+    returns:
+        layout   - Keyword_layout   ... the same object for the same keywords
+    """
+    keywords = tuple(keywords)
+    layout = _layouts.get(keywords)
+    if layout is None:
+        # setdefault keeps a single layout if two threads create it at the same time
+        layout = _layouts.setdefault(keywords, Keyword_layout(tuple(sys.intern(key) for key in keywords)))
+    return layout
+
 
 class MD_file:
     """
@@ -7,63 +139,132 @@ class MD_file:
     Idea:
         - creating a class to use like a typical dictionary
         - saving and loading data to and from the disc
+        - changes are tracked with a dirty flag and written at most once per batch
+        - many MD_files are kept in memory: the keywords are shared (Keyword_layout),
+          each file only keeps its information in a list in the order of the keywords
+
+        md = MD_file(path, keywords)
+        md[keyword] = "info"                # writes the file once
+        md.update({key_1: "a", key_2: "b"}) # writes the file once
+        with md.batch():                    # writes the file once at the end
+            md[key_1] = "a"
+            md[key_2] = "b"
     """
-    def __init__(self, path, keywords):
+    __slots__ = ("path", "layout", "infos", "dirty", "batch_depth", "listener", "journal", "schema", "stale")
+
+    def __init__(self, path, keywords, exists=False, journal=None, schema=None):
         """
         Initialization of the file handler object
 
             path     - string   ... path to the data file
             keywords - list     ... list of all metadata keywords
+            exists   - bool     ... the metadata file is known to exist (skips the checks on the disc)
+            journal  - Write_journal ... writes go through this journal (optional)
+            schema   - Keyword_schema ... files written with older keywords are migrated when they are read (optional)
         """
         # setting the path of the data file
         self.path = path
-        # creating the path to the metadata
-        self.metadata_path = os.path.join(os.path.split(path)[0], "metadata", 
-                                          os.path.split(path)[1].replace(".", "-") + "-metadata.txt")
 
-        # saving the keywords
-        # each md file needs its own copy
-        self.keywords = list(keywords)
+        # the keywords are shared by all MD_files with the same keywords
+        self.layout = get_layout(keywords)
+
+        # unsaved changes and the depth of nested batches
+        self.dirty = False
+        self.batch_depth = 0
+
+        # function(path, keyword, old, new) which is called for every change (e.g. to update an index)
+        self.listener = None
+
+        # crash-safe group commits of many files
+        self.journal = journal
+
+        # the file on the disc still uses the keywords of an older version (migrated on the next write)
+        self.schema = schema
+        self.stale = False
+
+        # intializing the information of each keyword
+        self.infos = [""] * len(self.layout.keywords)
+
+        # loading data if the metadata file is known to exist
+        if exists:
+            try:
+                self.read()
+                return
+            except FileNotFoundError:
+                # it was deleted in the meantime
+                pass
 
         # checking if the metadata directory is initialized
         if not os.path.isdir(os.path.join(os.path.split(self.path)[0], "metadata")):
-            os.makedirs(os.path.join(os.path.split(self.path)[0], "metadata"))
-        
-        # intializing the data dict
-        self.data = {}
-        for key in self.keywords:
-            self.data[key] = ""
+            # exist_ok because another thread could create it at the same time
+            os.makedirs(os.path.join(os.path.split(self.path)[0], "metadata"), exist_ok=True)
 
-        # checking if the metadata file is initialized
-        if not os.path.isfile(self.metadata_path):
+        # checking if the metadata file is initialized (or waiting in the journal)
+        metadata_path = self.metadata_path
+        if not os.path.isfile(metadata_path) and (journal is None or journal.read(metadata_path) is None):
             # writing the init data dict
             self.write()
 
         # loading data if available
         self.read()
 
+    @property
+    def metadata_path(self):
+        """
+        Path to the metadata file (created when it is needed instead of kept for every file)
+        """
+        return get_metadata_path(self.path)
+
+    @property
+    def keywords(self):
+        """
+        List of all metadata keywords (a copy)
+        """
+        return list(self.layout.keywords)
+
+    @property
+    def data(self):
+        """
+        Dict with the keyword, information pairs (a copy, changes go through md[keyword] = info)
+        """
+        return dict(zip(self.layout.keywords, self.infos))
+
 
     def read(self):
         """
         Function to load metadata if available from the file
         """
-        # opening the file 
-        with open(self.metadata_path, 'r') as tmp:
-            # reading all lines skipping over reference to original file
-            md = tmp.readlines()
-            # check if the second line is empty
-            if md[1] == "\n":
-                md = md[2:]
-            else:
-                md = md[1:]
+        metadata_path = self.metadata_path
+        # the newest content could still wait in the journal
+        content = None if self.journal is None else self.journal.read(metadata_path)
+
+        if content is None:
+            _, keywords, values = parse_metadata(metadata_path)
+        else:
+            _, keywords, values = parse_lines(content.splitlines())
+
+        self.set_data(keywords, values)
+
+    def set_data(self, keywords, values):
+        """
+        Function which takes over the keywords and information read from the disc,
+        information of renamed or removed keywords is migrated to the current keywords
+        (information of unknown keywords is not kept, it would not be written anyway)
 
-        # parsing the actual data
-        for line in md:
-            # getting the key and the data
-            key, info = line.split("::  ")
+            keywords - list     ... keywords in the order they were saved
+            values   - list     ... information of each keyword
+        """
+        plan = {} if self.schema is None else self.schema.plan(keywords)
+        positions = self.layout.positions
+
+        # writing the information to the position of its keyword
+        for key, info in zip(keywords, values):
+            i = positions.get(plan.get(key, key))
+            if not i is None:
+                self.infos[i] = info
 
-            # writing the data into our data dict
-            self.data[key] = info.replace("\n", "")
+        # the next write saves the file with the current keywords
+        self.stale = tuple(keywords) != self.layout.keywords
 
     
     def create_save_string(self):
@@ -73,32 +274,81 @@ class MD_file:
         return:
             save_string - string ... string that contains the data dict
         """
-        # initializing the empty string
-        save_string = ""
-
-        # adding the reference to the data file
-        save_string += "path to data file: " + self.path + "\n" + "\n"
+        # the reference to the data file, an empty line and one line per keyword
+        lines = [PATH_PREFIX + self.path, ""]
+        lines.extend(key + SEPARATOR + info for key, info in zip(self.layout.keywords, self.infos))
+        lines.append("")
 
-        # iterate over the data dict
-        for key in self.keywords:
-            # adding the key, info pair to the save_string
-            save_string += key + "::  " + self.data[key] + "\n"
-        
-        # returning the created string
-        return save_string
+        return "\n".join(lines)
 
 
     def write(self):
         """
         Function to write the metadata to the file
         """
-        # creating the save string composed of the metadata in self.data
+        # creating the save string composed of the metadata in self.infos
         save_string = self.create_save_string()
 
-        # opening the file
-        with open(self.metadata_path, "w+") as file:
-            # writing the save_string
-            file.write(save_string)
+        if self.journal is None:
+            # replacing the file at once, a crash never leaves it half written
+            atomic_write(self.metadata_path, save_string)
+        else:
+            # the journal commits many files together
+            self.journal.write(self.metadata_path, save_string)
+
+        # everything is saved
+        self.dirty = False
+        self.stale = False
+
+    def flush(self):
+        """
+        Function to write the metadata to the file if it was changed
+        """
+        if self.dirty:
+            self.write()
+
+    @contextmanager
+    def batch(self):
+        """
+        Context manager which collects all changes and writes the file once at the end
+
+            with md.batch():
+                md[key_1] = "a"
+                md[key_2] = "b"
+        """
+        self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.batch_depth -= 1
+            # only the outermost batch writes the file
+            if self.batch_depth == 0:
+                self.flush()
+
+    def update(self, data, write=True):
+        """
+        Function to set several keywords with only one write
+
+            data    - dict  ... keyword, information pairs
+            write   - bool  ... False leaves the write to a later flush() (e.g. on another thread)
+        returns:
+            changed - bool  ... if the metadata changed (and was written)
+        """
+        if not write:
+            # an open batch keeps __setitem__ from writing
+            self.batch_depth += 1
+            try:
+                for key, info in data.items():
+                    self[key] = info
+            finally:
+                self.batch_depth -= 1
+            return self.dirty
+
+        with self.batch():
+            for key, info in data.items():
+                self[key] = info
+            changed = self.dirty
+        return changed
 
 
     def set_keywords(self, keywords):
@@ -107,12 +357,14 @@ class MD_file:
         
             keywords - list     ... list of all metadata keywords
         """
-        self.keywords = list(keywords)
+        data = self.data
+        self.layout = get_layout(keywords)
 
-        # add an empty string for new keywords
-        for key in self.keywords:
-            if not key in self.data:
-                self.data[key] = ""
+        # add an empty string for new keywords and drop removed ones
+        self.infos = [data.get(key, "") for key in self.layout.keywords]
+
+        # the file is saved with the new keywords on the next write
+        self.stale = True
 
     def update_keyword(self, i, keyword):
         """
@@ -121,25 +373,54 @@ class MD_file:
             i       - index  ... index of the keyword you want to update
             keyword - string ... new keyword for index i
         """
-        self.data[keyword] = self.data[self.keywords[i]]
-        self.keywords[i] = keyword
+        keywords = list(self.layout.keywords)
+        keywords[i] = keyword
+        # the information stays at its position
+        self.layout = get_layout(keywords)
+
+        # the file is saved with the new keyword on the next write
+        self.stale = True
 
     def __getitem__(self, key):
         """
         Operator overloading to simplify usage of the class
         """
-        return self.data[key]
+        return self.infos[self.layout.positions[key]]
+
+    def __contains__(self, key):
+        """
+        Operator overloading to simplify usage of the class
+        """
+        return key in self.layout.positions
 
     def __setitem__(self, key, value):
         """
         Operator overloading to simplify usage of the class
         """
-        self.data[key] = value.replace("\n", "")
-        # also overwrite the metadata file
-        self.write()
+        value = value.replace("\n", "")
+
+        i = self.layout.positions.get(key)
+        # unknown keywords are not saved (e.g. a keyword which was removed in the meantime)
+        if i is None:
+            return
+
+        # nothing to do if the information did not change
+        old = self.infos[i]
+        if old == value:
+            return
+
+        self.infos[i] = value
+        self.dirty = True
+
+        if not self.listener is None:
+            self.listener(self.path, key, old, value)
+
+        # also overwrite the metadata file if no batch is open
+        if self.batch_depth == 0:
+            self.flush()
 
     def __str__(self):
         """
         Defines a string representation for the class so that its printable
         """ 
-        return str(self.data)
\ No newline at end of file
+        return str(self.data)
@@ -0,0 +1,425 @@
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+import os
+from md_file import MD_file, get_metadata_path, parse_metadata, parse_lines
+from moves import move_metadata
+from md_sqlite import MD_sqlite_file
+from schema import Keyword_schema
+
+
+class MD_file_dict:
+    """
+    Class which acts like the dict of MD_file objects used by the GUI
+    but only loads the metadata of a data file on first access.
+
+    Idea:
+        - the keys (paths to the data files) are known from the start
+        - an MD_file is only created (and its metadata file read) when it is accessed
+        - least recently used MD_files are dropped if the entry or size cap is reached
+
+        MD_files = MD_file_dict(data_files, keywords)
+        MD_files[path][keyword] # = metadata information
+    """
+    def __init__(self, data_files, keywords, max_entries=10000, max_bytes=None, manifest=None, workers=1, store=None, journal=None, schema=None):
+        """
+        Initialization of the lazy dict
+
+            data_files  - list      ... containing all paths to data files
+            keywords    - list      ... list with all keywords as strings
+            max_entries - int       ... maximal number of loaded MD_files (None for no limit)
+            max_bytes   - int       ... maximal estimated size of the loaded metadata in bytes (None for no limit)
+            manifest    - Scan_manifest ... metadata files known to the manifest are not checked on the disc (optional)
+            workers     - int       ... number of threads used to load several MD_files at once
+            store       - MD_store  ... keep the metadata in this database instead of metadata files (optional)
+            journal     - Write_journal ... write the metadata files crash-safe in groups (optional)
+            schema      - Keyword_schema ... versions of the keywords, files with older keywords are migrated when they are read
+                                             (default a new schema starting with keywords)
+        """
+        # dict instead of list for O(1) membership checks, the order of the data files is kept
+        self.paths = dict.fromkeys(data_files)
+        # each dict needs its own copy
+        self.keywords = list(keywords)
+        # keyword changes only create a new version, the files are migrated when they are read
+        self.schema = Keyword_schema(keywords) if schema is None else schema
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.manifest = manifest
+        self.store = store
+        self.journal = journal
+        # the database is read without waiting for the disc and a transaction locks it for one thread
+        self.workers = 1 if not store is None else workers
+
+        # indexes (e.g. MD_index, PD_index) which are kept up to date with all changes
+        self.indexes = []
+
+        # loaded MD_files, the least recently used file is the first one
+        self.loaded = OrderedDict()
+        # estimated size of the loaded metadata
+        self.loaded_bytes = 0
+        self.sizes = {}
+
+    def load(self, path):
+        """
+        Function which creates the MD_file of a data file
+        (this also creates empty metadata files if no file is present)
+
+            path    - string    ... path to the data file
+        returns:
+            md      - MD_file   ... the loaded MD_file
+        """
+        if not self.store is None:
+            md = MD_sqlite_file(path, self.keywords, self.store, schema=self.schema)
+        else:
+            # the manifest knows which metadata files exist
+            exists = not self.manifest is None and self.manifest.has_metadata(get_metadata_path(path))
+            md = MD_file(path, self.keywords, exists=exists, journal=self.journal, schema=self.schema)
+
+        if len(self.indexes) > 0:
+            md.listener = self.notify
+        return md
+
+    def estimate_size(self, md):
+        """
+        Function to estimate the memory used by the metadata of one MD_file
+
+            md      - MD_file   ... the MD_file which should be estimated
+        returns:
+            size    - int       ... estimated size in bytes
+        """
+        # the keywords are shared by all MD_files
+        return len(md.path) + sum(len(info) for info in md.infos)
+
+    def evict(self):
+        """
+        Function which drops the least recently used MD_files until the caps are met
+        """
+        # least recently used first
+        for path in list(self.loaded):
+            if len(self.loaded) <= 1 or \
+               ((self.max_entries is None or len(self.loaded) <= self.max_entries) and
+                (self.max_bytes is None or self.loaded_bytes <= self.max_bytes)):
+                return
+
+            # make sure no changes are lost before the MD_file is dropped
+            try:
+                self.loaded[path].flush()
+            except OSError:
+                # it stays in memory with its changes, the next eviction tries again
+                continue
+            del self.loaded[path]
+            self.loaded_bytes -= self.sizes.pop(path)
+
+    def attach_index(self, index, build=True):
+        """
+        Function to attach an index which is kept up to date with all changes of the MD_files
+
+            index   - MD_index  ... the index (anything with build, add, remove, change, rename_keyword and set_keywords)
+            build   - bool      ... add all data files to the index (this loads every MD_file once)
+        """
+        self.indexes.append(index)
+        for md in self.loaded.values():
+            md.listener = self.notify
+
+        if build:
+            index.build(self)
+
+    def notify(self, path, key, old, new):
+        """
+        Function which passes a change of an MD_file on to all indexes
+        """
+        for index in self.indexes:
+            index.change(path, key, old, new)
+
+    def insert(self, path, md):
+        """
+        Function to add a loaded MD_file as the most recently used one
+        """
+        self.loaded[path] = md
+        self.sizes[path] = self.estimate_size(md)
+        self.loaded_bytes += self.sizes[path]
+        self.evict()
+
+    def preload(self, paths, workers=None):
+        """
+        Function which loads several MD_files at once on a pool of threads.
+        The files are opened in parallel (the waiting for the disc overlaps)
+        but inserted in the order of the paths, so the result is the same as loading them one by one.
+
+            paths   - list  ... paths to the data files
+            workers - int   ... number of threads (default self.workers)
+        """
+        if workers is None:
+            workers = self.workers
+
+        # only load what is not in memory yet
+        missing = [path for path in paths if not path in self.loaded and path in self.paths]
+        if len(missing) == 0:
+            return
+
+        if workers <= 1 or len(missing) == 1:
+            for path in missing:
+                self[path]
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for path, md in zip(missing, pool.map(self.load, missing)):
+                self.insert(path, md)
+
+    def chunks(self, paths=None):
+        """
+        Generator over chunks of paths which fit into memory together
+
+            paths   - list  ... paths to the data files (default all data files)
+        """
+        size = 256 if self.max_entries is None else max(1, min(256, self.max_entries))
+        paths = list(self.paths if paths is None else paths)
+        for i in range(0, len(paths), size):
+            yield paths[i:i+size]
+
+    def transaction(self):
+        """
+        Function to get a context manager which commits all writes inside at once
+        (metadata files are only committed in groups with a journal, otherwise they are written one by one)
+        """
+        if not self.store is None:
+            return self.store.transaction()
+        if not self.journal is None:
+            return self.journal.transaction()
+        return nullcontext()
+
+    def is_loaded(self, path):
+        """
+        Function to check if the MD_file of a data file is currently in memory
+        """
+        return path in self.loaded
+
+    def read_data(self, path):
+        """
+        Function to read the metadata of a data file without creating an MD_file or a metadata file (see peek)
+
+            path    - string    ... path to the data file
+        returns:
+            data    - dict      ... keyword, information pairs (empty information if there is no metadata)
+        """
+        md = self.loaded.get(path)
+        if not md is None:
+            return md.data
+
+        stored = {} if self.store is None else self.store.read(path)
+        if len(stored) > 0:
+            keywords, values = list(stored.keys()), list(stored.values())
+        else:
+            # the newest content could still wait in the journal
+            metadata_path = get_metadata_path(path)
+            content = None if self.journal is None else self.journal.read(metadata_path)
+            try:
+                if content is None:
+                    _, keywords, values = parse_metadata(metadata_path)
+                else:
+                    _, keywords, values = parse_lines(content.splitlines())
+            except (OSError, UnicodeDecodeError):
+                keywords, values = [], []
+
+        data = self.schema.migrate(keywords, values)
+        return {key: data.get(key, "") for key in self.keywords}
+
+    def read_items(self, paths=None):
+        """
+        Generator over (path, data) pairs, the metadata is read chunk by chunk on self.workers threads
+        without creating MD_files or metadata files (see read_data)
+
+            paths   - list  ... only these data files (default all data files)
+        """
+        if self.workers <= 1:
+            for path in (self.paths if paths is None else paths):
+                yield path, self.read_data(path)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for chunk in self.chunks(paths):
+                yield from zip(chunk, pool.map(self.read_data, chunk))
+
+    def add(self, path):
+        """
+        Function to add a new data file to the dict (the metadata is loaded on first access)
+
+            path    - string    ... path to the data file
+        """
+        self.paths[path] = None
+
+        if len(self.indexes) > 0:
+            data = self.read_data(path)
+            for index in self.indexes:
+                index.add(path, data)
+
+    def remove(self, path):
+        """
+        Function to remove a data file from the dict
+
+            path    - string    ... path to the data file
+        """
+        if len(self.indexes) > 0 and path in self.paths:
+            data = self.read_data(path)
+            for index in self.indexes:
+                index.remove(path, data)
+
+        self.paths.pop(path, None)
+        if path in self.loaded:
+            self.loaded.pop(path)
+            self.loaded_bytes -= self.sizes.pop(path)
+
+    def rename(self, old, new):
+        """
+        Function to follow a data file which was renamed or moved while the tool runs:
+        its metadata is moved along (see moves.move_metadata) and the indexes are updated
+
+            old     - string    ... old path to the data file
+            new     - string    ... new path to the data file
+        returns:
+            moved   - bool      ... False if the metadata could not be moved (nothing is changed then)
+        """
+        data = self.read_data(old)
+
+        # unsaved changes are written to the old place first, so they are moved as well
+        md = self.loaded.get(old)
+        if not md is None:
+            md.flush()
+        if not self.journal is None:
+            self.journal.commit()
+
+        if not self.store is None:
+            self.store.rename(old, new)
+        elif os.path.isfile(get_metadata_path(old)):
+            try:
+                if not move_metadata(old, new):
+                    return False
+            except OSError:
+                return False
+
+        for index in self.indexes:
+            index.remove(old, data)
+        self.paths.pop(old, None)
+        if old in self.loaded:
+            self.loaded.pop(old)
+            self.loaded_bytes -= self.sizes.pop(old)
+
+        self.add(new)
+        return True
+
+    def set_keywords(self, keywords):
+        """
+        Function to update the keywords of all data files, only a new version of the schema is created:
+        the files are migrated when they are read and saved with the new keywords on their next write
+        (or by a Schema_compaction)
+
+            keywords - list     ... list of all metadata keywords
+        """
+        self.keywords = list(keywords)
+        self.schema.set_keywords(self.keywords)
+
+        # only the MD_files in memory are updated
+        for md in self.loaded.values():
+            md.set_keywords(self.keywords)
+
+        for index in self.indexes:
+            index.set_keywords(self.keywords)
+
+    def update_keyword(self, i, keyword):
+        """
+        Function to update a single keyword (index i) of all data files, only a new version of the schema is created
+        (see set_keywords)
+
+            i       - index  ... index of the keyword you want to update
+            keyword - string ... new keyword for index i
+        """
+        self.schema.rename(i, keyword)
+
+        # only the MD_files in memory are updated
+        for md in self.loaded.values():
+            md.update_keyword(i, keyword)
+
+        for index in self.indexes:
+            index.rename_keyword(self.keywords[i], keyword)
+
+        self.keywords[i] = keyword
+
+    def peek(self, path):
+        """
+        Function to get the MD_file of a data file without making it the most recently used one
+        (files which are not in memory are read but not kept)
+
+            path    - string    ... path to the data file
+        returns:
+            md      - MD_file   ... the MD_file of the data file
+        """
+        if path in self.loaded:
+            return self.loaded[path]
+        if not path in self.paths:
+            raise KeyError(path)
+        return self.load(path)
+
+    def items(self, paths=None):
+        """
+        Generator over (path, MD_file) pairs, the MD_files are loaded chunk by chunk
+
+            paths   - list  ... only these data files (default all data files)
+        """
+        for chunk in self.chunks(paths):
+            self.preload(chunk)
+            for path in chunk:
+                yield path, self[path]
+
+    def values(self):
+        """
+        Generator over the MD_files, they are loaded chunk by chunk
+        """
+        for _, md in self.items():
+            yield md
+
+    def keys(self):
+        """
+        Function to get the paths of all data files
+        """
+        return self.paths.keys()
+
+    def __getitem__(self, path):
+        """
+        Operator overloading to simplify usage of the class
+        """
+        if path in self.loaded:
+            # mark as most recently used
+            self.loaded.move_to_end(path)
+            return self.loaded[path]
+
+        if not path in self.paths:
+            raise KeyError(path)
+
+        md = self.load(path)
+        self.insert(path, md)
+        return md
+
+    def __contains__(self, path):
+        """
+        Operator overloading to simplify usage of the class
+        """
+        return path in self.paths
+
+    def __iter__(self):
+        """
+        Iterates over the paths of the data files without loading them
+        """
+        return iter(self.paths)
+
+    def __len__(self):
+        """
+        Number of data files (loaded or not)
+        """
+        return len(self.paths)
+
+    def __str__(self):
+        """
+        Defines a string representation for the class so that its printable
+        """
+        return "MD_file_dict(" + str(len(self.loaded)) + "/" + str(len(self.paths)) + " loaded)"
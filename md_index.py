@@ -0,0 +1,360 @@
+import os
+import re
+from bisect import bisect_left
+from md_file import get_metadata_path
+
+
+# a token is a run of letters and digits, everything else separates tokens
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# one term of a query: [keyword:]value, keywords and values with spaces are quoted
+TERM_PATTERN = re.compile(r'(?:(?P<key>"[^"]*"|[^\s:"]+):)?(?P<value>"[^"]*"|\S+)')
+
+
+def tokenize(info):
+    """
+    Function which splits metadata information into normalized tokens
+
+        info    - string    ... metadata information
+    returns:
+        tokens  - set       ... lower case tokens
+    """
+    return set(TOKEN_PATTERN.findall(info.lower()))
+
+
+class MD_index:
+    """
+    Class which holds an inverted index over the metadata information
+    to find data files without opening them one by one.
+
+    Idea:
+        - keyword -> token -> data files (for word and prefix searches)
+        - keyword -> information -> data files (for exact searches)
+        - MD_file changes are passed to change() so the index stays up to date
+
+        index = MD_index()
+        index.build(MD_files)
+        index.search("smith")                       # = files with the token smith in any keyword
+        index.search("smi", keyword="author", prefix=True)
+        index.exact("location", "Lab 2")
+        index.query('author:smith location:"Lab 2" OR sensor*')
+    """
+    def __init__(self):
+        """
+        Initialization of the empty index
+        """
+        # keyword -> token -> set of data files
+        self.tokens = {}
+        # keyword -> information -> set of data files
+        self.values = {}
+        # keyword -> sorted tokens for prefix searches (None if it needs to be sorted again)
+        self.sorted_tokens = {}
+
+    def build(self, MD_files):
+        """
+        Function which adds every data file of an MD_file_dict to the index
+        (the metadata is read without creating metadata files)
+
+            MD_files    - MD_file_dict  ... lazy dict with one MD_file for each data file
+        """
+        for path, data in MD_files.read_items():
+            self.add(path, data)
+
+    def add(self, path, data):
+        """
+        Function to add the metadata of one data file
+
+            path    - string    ... path to the data file
+            data    - dict      ... keyword, information pairs
+        """
+        for key, info in data.items():
+            self.change(path, key, "", info)
+
+    def remove(self, path, data):
+        """
+        Function to remove the metadata of one data file
+
+            path    - string    ... path to the data file
+            data    - dict      ... keyword, information pairs
+        """
+        for key, info in data.items():
+            self.change(path, key, info, "")
+
+    def change(self, path, key, old, new):
+        """
+        Function which updates the index if the information of one keyword changed
+        (this is the listener of the MD_files)
+
+            path    - string    ... path to the data file
+            key     - string    ... keyword
+            old     - string    ... old information
+            new     - string    ... new information
+        """
+        if old == new:
+            return
+
+        old_tokens = tokenize(old)
+        new_tokens = tokenize(new)
+
+        tokens = self.tokens.setdefault(key, {})
+        for token in old_tokens - new_tokens:
+            files = tokens.get(token)
+            if not files is None:
+                files.discard(path)
+                if len(files) == 0:
+                    del tokens[token]
+                    self.sorted_tokens[key] = None
+        for token in new_tokens - old_tokens:
+            if not token in tokens:
+                tokens[token] = set()
+                self.sorted_tokens[key] = None
+            tokens[token].add(path)
+
+        values = self.values.setdefault(key, {})
+        if old != "" and old in values:
+            values[old].discard(path)
+            if len(values[old]) == 0:
+                del values[old]
+        if new != "":
+            values.setdefault(new, set()).add(path)
+
+    def rename_keyword(self, old, new):
+        """
+        Function to rename a keyword in the index
+
+            old     - string    ... old keyword
+            new     - string    ... new keyword
+        """
+        for d in (self.tokens, self.values, self.sorted_tokens):
+            if old in d:
+                d[new] = d.pop(old)
+
+    def set_keywords(self, keywords):
+        """
+        Function which removes keywords which are not used anymore
+
+            keywords    - list  ... list of all metadata keywords
+        """
+        for d in (self.tokens, self.values, self.sorted_tokens):
+            for key in list(d):
+                if not key in keywords:
+                    del d[key]
+
+    def get_sorted_tokens(self, key):
+        """
+        Function to get the sorted tokens of a keyword (sorted again only after changes)
+        """
+        if self.sorted_tokens.get(key) is None:
+            self.sorted_tokens[key] = sorted(self.tokens.get(key, {}))
+        return self.sorted_tokens[key]
+
+    def search(self, token, keyword=None, prefix=False):
+        """
+        Function to find all data files which contain a token
+
+            token   - string    ... the token (normalized to lower case)
+            keyword - string    ... only search this keyword (None for all keywords)
+            prefix  - bool      ... also find tokens starting with token
+        returns:
+            files   - set       ... paths to the data files
+        """
+        token = token.lower()
+        keys = list(self.tokens) if keyword is None else [keyword]
+
+        files = set()
+        for key in keys:
+            tokens = self.tokens.get(key, {})
+            if not prefix:
+                files |= tokens.get(token, set())
+            else:
+                # all tokens with the prefix are next to each other in the sorted list
+                sorted_tokens = self.get_sorted_tokens(key)
+                i = bisect_left(sorted_tokens, token)
+                while i < len(sorted_tokens) and sorted_tokens[i].startswith(token):
+                    files |= tokens[sorted_tokens[i]]
+                    i += 1
+        return files
+
+    def exact(self, keyword, info):
+        """
+        Function to find all data files where a keyword holds exactly the given information
+
+            keyword - string    ... the keyword (None for all keywords)
+            info    - string    ... the information
+        returns:
+            files   - set       ... paths to the data files
+        """
+        keys = list(self.values) if keyword is None else [keyword]
+
+        files = set()
+        for key in keys:
+            files |= self.values.get(key, {}).get(info, set())
+        return files
+
+    def query(self, query):
+        """
+        Function which answers a query string:
+            - terms separated by spaces have to match all (AND)
+            - OR between terms lets either side match
+            - keyword:term restricts a term to one keyword ("type of data":csv for keywords with spaces)
+            - term* matches all tokens which start with term
+            - "some information" matches the whole information exactly
+
+            query   - string    ... the query
+        returns:
+            files   - set       ... paths to the data files
+        """
+        files = set()
+        # every OR group is a list of terms which all have to match
+        for group in re.split(r"\s+OR\s+", query.strip()):
+            group_files = None
+            for match in TERM_PATTERN.finditer(group):
+                key = match.group("key")
+                value = match.group("value")
+                if not key is None:
+                    key = key.strip('"')
+
+                if len(value) > 1 and value.startswith('"') and value.endswith('"'):
+                    term_files = self.exact(key, value[1:-1])
+                else:
+                    term_files = set()
+                    # a term can consist of several tokens (e.g. a date), all have to match
+                    tokens = TOKEN_PATTERN.findall(value.lower())
+                    for i, token in enumerate(tokens):
+                        # only the last token of term* is a prefix
+                        prefix = value.endswith("*") and i == len(tokens) - 1
+                        token_files = self.search(token, key, prefix)
+                        term_files = token_files if i == 0 else term_files & token_files
+
+                group_files = term_files if group_files is None else group_files & term_files
+
+            if not group_files is None:
+                files |= group_files
+        return files
+
+    def __len__(self):
+        """
+        Number of distinct tokens in the index
+        """
+        return sum(len(tokens) for tokens in self.tokens.values())
+
+
+class PD_index:
+    """
+    Class which maps each process description to the data files which use it,
+    so renaming or deleting a process only visits these files.
+
+    Idea:
+        - only the first keyword (the process description) is indexed
+        - it can be filled from the scan manifest without opening the metadata files
+        - MD_file changes are passed to change() so the index stays up to date
+
+        pd_index = PD_index(keywords[0])
+        pd_index.build_from_manifest(data_files, manifest)
+        pd_index.files(description)  # = data files using the description
+    """
+    def __init__(self, keyword):
+        """
+        Initialization of the empty index
+
+            keyword - string    ... the process description keyword (keywords[0])
+        """
+        self.keyword = keyword
+        # process description -> set of data files
+        self.descriptions = {}
+
+    def build(self, MD_files):
+        """
+        Function which adds every data file of an MD_file_dict to the index
+        (reads every metadata file without creating missing ones)
+
+            MD_files    - MD_file_dict  ... lazy dict with one MD_file for each data file
+        """
+        for path, data in MD_files.read_items():
+            self.add(path, data)
+
+    def build_from_manifest(self, data_files, manifest):
+        """
+        Function which fills the index with the headers saved in the scan manifest
+
+            data_files  - list          ... containing all paths to data files
+            manifest    - Scan_manifest ... manifest which holds the header of every metadata file
+        returns:
+            complete    - bool          ... False if a metadata file is missing in the manifest
+        """
+        for path in data_files:
+            metadata_path = get_metadata_path(path)
+            if manifest.has_metadata(metadata_path):
+                pd = manifest.metadata[metadata_path][3]
+            elif os.path.isfile(metadata_path):
+                # the file was not looked at by the last scan
+                return False
+            else:
+                # the metadata file is created empty
+                pd = ""
+            self.change(path, self.keyword, None, pd)
+        return True
+
+    def add(self, path, data):
+        """
+        Function to add the metadata of one data file
+
+            path    - string    ... path to the data file
+            data    - dict      ... keyword, information pairs
+        """
+        self.change(path, self.keyword, None, data.get(self.keyword, ""))
+
+    def remove(self, path, data):
+        """
+        Function to remove the metadata of one data file
+
+            path    - string    ... path to the data file
+            data    - dict      ... keyword, information pairs
+        """
+        self.change(path, self.keyword, data.get(self.keyword, ""), None)
+
+    def change(self, path, key, old, new):
+        """
+        Function which updates the index if the process description changed
+        (this is the listener of the MD_files)
+
+            path    - string    ... path to the data file
+            key     - string    ... keyword
+            old     - string    ... old information (None if the file was not indexed)
+            new     - string    ... new information (None if the file is removed)
+        """
+        if key != self.keyword or old == new:
+            return
+
+        if not old is None and old in self.descriptions:
+            self.descriptions[old].discard(path)
+            if len(self.descriptions[old]) == 0:
+                del self.descriptions[old]
+        if not new is None:
+            self.descriptions.setdefault(new, set()).add(path)
+
+    def rename_keyword(self, old, new):
+        """
+        Function to rename a keyword in the index
+
+            old     - string    ... old keyword
+            new     - string    ... new keyword
+        """
+        if old == self.keyword:
+            self.keyword = new
+
+    def set_keywords(self, keywords):
+        """
+        Function for the keyword updates of the MD_file_dict (the process description always stays)
+        """
+        pass
+
+    def files(self, description):
+        """
+        Function to get the data files which use a process description
+
+            description - string    ... the process description
+        returns:
+            files       - list      ... paths to the data files (a copy which can be changed)
+        """
+        return list(self.descriptions.get(description, ()))
@@ -0,0 +1,318 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from md_file import MD_file, get_metadata_path, get_layout
+from snapshot import TOOL_FILE_PREFIX
+
+
+# name of the database inside the working directory
+# (files of the tool are ignored when the working directory is scanned)
+STORE_NAME = TOOL_FILE_PREFIX + "_metadata.sqlite"
+
+
+class MD_store:
+    """
+    Class which stores the metadata of a whole working directory in one SQLite database
+    instead of one metadata file per data file.
+
+    Idea:
+        - one database per working directory (WAL mode, so reading does not block writing)
+        - writes inside transaction() are committed together
+        - (keyword, information) is indexed for fast lookups
+        - import_text/export_text/sync convert from and to the metadata text files
+
+        store = MD_store(working_dir)
+        with store.transaction():
+            store.write(path, keywords, data)
+        store.read(path)            # = keyword, information dict
+        store.find(keyword, info)   # = data files
+    """
+    def __init__(self, working_dir, path=None):
+        """
+        Initialization of the store, this creates the database if needed
+
+            working_dir - string/path   ... path to the working directory
+            path        - string/path   ... path to the database (default inside the working directory)
+        """
+        self.working_dir = os.path.normpath(working_dir)
+        self.path = os.path.join(self.working_dir, STORE_NAME) if path is None else path
+
+        # the connection is shared by all threads, the lock serializes the access
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path        TEXT PRIMARY KEY,
+                updated     REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS metadata (
+                path        TEXT NOT NULL,
+                position    INTEGER NOT NULL,
+                keyword     TEXT NOT NULL,
+                info        TEXT NOT NULL,
+                PRIMARY KEY (path, keyword)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS metadata_info ON metadata (keyword, info);
+        """)
+
+        # depth of nested transactions
+        self.transaction_depth = 0
+
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager which commits all writes inside at once (nested transactions join the outer one)
+        """
+        with self.lock:
+            if self.transaction_depth == 0:
+                self.connection.execute("BEGIN")
+            self.transaction_depth += 1
+            try:
+                yield self
+            except Exception:
+                self.transaction_depth -= 1
+                if self.transaction_depth == 0:
+                    self.connection.execute("ROLLBACK")
+                raise
+            else:
+                self.transaction_depth -= 1
+                if self.transaction_depth == 0:
+                    self.connection.execute("COMMIT")
+
+    def exists(self, path):
+        """
+        Function to check if the metadata of a data file is stored
+
+            path    - string    ... path to the data file
+        """
+        with self.lock:
+            return not self.connection.execute("SELECT 1 FROM files WHERE path = ?", (path,)).fetchone() is None
+
+    def updated(self, path):
+        """
+        Function to get the time of the last write of a data file (None if it is not stored)
+
+            path    - string    ... path to the data file
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT updated FROM files WHERE path = ?", (path,)).fetchone()
+        return None if row is None else row[0]
+
+    def read(self, path):
+        """
+        Function to read the metadata of a data file
+
+            path    - string    ... path to the data file
+        returns:
+            data    - dict      ... keyword, information pairs in the saved order
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT keyword, info FROM metadata WHERE path = ? ORDER BY position", (path,)).fetchall()
+        return dict(rows)
+
+    def write(self, path, keywords, data, updated=None):
+        """
+        Function to write the metadata of a data file (replaces everything stored for it)
+
+            path        - string    ... path to the data file
+            keywords    - list      ... the keywords in their order
+            data        - dict      ... keyword, information pairs
+            updated     - float     ... time of the change (default now)
+        """
+        if updated is None:
+            updated = time.time()
+        with self.transaction():
+            self.connection.execute("INSERT OR REPLACE INTO files (path, updated) VALUES (?, ?)", (path, updated))
+            self.connection.execute("DELETE FROM metadata WHERE path = ?", (path,))
+            self.connection.executemany("INSERT INTO metadata (path, position, keyword, info) VALUES (?, ?, ?, ?)",
+                                        [(path, i, key, data.get(key, "")) for i, key in enumerate(keywords)])
+
+    def remove(self, path):
+        """
+        Function to remove the metadata of a data file
+
+            path    - string    ... path to the data file
+        """
+        with self.transaction():
+            self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+            self.connection.execute("DELETE FROM metadata WHERE path = ?", (path,))
+
+    def rename(self, old, new):
+        """
+        Function to move the metadata of a data file which was renamed or moved
+
+            old     - string    ... old path to the data file
+            new     - string    ... new path to the data file
+        returns:
+            moved   - bool      ... False if nothing was stored for the old path
+        """
+        with self.transaction():
+            if not self.exists(old):
+                return False
+            # the metadata of the old path wins
+            self.connection.execute("DELETE FROM files WHERE path = ?", (new,))
+            self.connection.execute("DELETE FROM metadata WHERE path = ?", (new,))
+            self.connection.execute("UPDATE files SET path = ? WHERE path = ?", (new, old))
+            self.connection.execute("UPDATE metadata SET path = ? WHERE path = ?", (new, old))
+        return True
+
+    def find(self, keyword, info):
+        """
+        Function to find all data files where a keyword holds exactly the given information (indexed)
+
+            keyword - string    ... the keyword
+            info    - string    ... the information
+        returns:
+            files   - list      ... paths to the data files
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT path FROM metadata WHERE keyword = ? AND info = ?", (keyword, info)).fetchall()
+        return [row[0] for row in rows]
+
+    def import_text(self, data_files, keywords, only_newer=True, schema=None):
+        """
+        Function which copies metadata text files into the database (in one transaction)
+
+            data_files  - list  ... paths to the data files
+            keywords    - list  ... list with all keywords as strings
+            only_newer  - bool  ... only import text files changed after the last write to the database
+            schema      - Keyword_schema ... text files with older keywords are migrated (optional)
+        returns:
+            imported    - int   ... number of imported files
+        """
+        imported = 0
+        with self.transaction():
+            for path in data_files:
+                metadata_path = get_metadata_path(path)
+                try:
+                    mtime = os.stat(metadata_path).st_mtime
+                except OSError:
+                    continue
+
+                updated = self.updated(path)
+                if only_newer and not updated is None and updated >= mtime:
+                    continue
+
+                # reading an existing text file does not write anything
+                md = MD_file(path, keywords, exists=True, schema=schema)
+                self.write(path, md.keywords, md.data, updated=mtime)
+                imported += 1
+        return imported
+
+    def export_text(self, data_files, keywords, only_newer=True, schema=None):
+        """
+        Function which writes the metadata of the database as metadata text files
+
+            data_files  - list  ... paths to the data files
+            keywords    - list  ... list with all keywords as strings
+            only_newer  - bool  ... only export files written to the database after the text file was changed
+            schema      - Keyword_schema ... metadata stored with older keywords is migrated (optional)
+        returns:
+            exported    - int   ... number of exported files
+        """
+        exported = 0
+        for path in data_files:
+            updated = self.updated(path)
+            if updated is None:
+                continue
+
+            metadata_path = get_metadata_path(path)
+            if only_newer and os.path.isfile(metadata_path) and os.stat(metadata_path).st_mtime >= updated:
+                continue
+
+            md = MD_file(path, keywords, schema=schema)
+            data = self.read(path)
+            md.update(data if schema is None else schema.migrate(list(data), list(data.values())))
+            md.write()
+            exported += 1
+
+            # the written text file is not newer than the database (it is not imported again)
+            with self.transaction():
+                self.connection.execute("UPDATE files SET updated = ? WHERE path = ?", (os.stat(metadata_path).st_mtime, path))
+        return exported
+
+    def sync(self, data_files, keywords, schema=None):
+        """
+        Function which synchronizes the database and the metadata text files in both directions,
+        the newer side wins
+
+            data_files  - list  ... paths to the data files
+            keywords    - list  ... list with all keywords as strings
+            schema      - Keyword_schema ... metadata with older keywords is migrated (optional)
+        returns:
+            counts      - tuple ... (imported, exported)
+        """
+        return self.import_text(data_files, keywords, schema=schema), self.export_text(data_files, keywords, schema=schema)
+
+    def close(self):
+        """
+        Function to close the database
+        """
+        with self.lock:
+            self.connection.close()
+
+
+class MD_sqlite_file(MD_file):
+    """
+    MD_file which reads and writes its metadata from an MD_store instead of a metadata text file.
+    It is used exactly like an MD_file:
+
+        md = MD_sqlite_file(path, keywords, store)
+        md[keyword] = "info"
+    """
+    __slots__ = ("store",)
+
+    def __init__(self, path, keywords, store, schema=None):
+        """
+        Initialization of the file handler object
+
+            path     - string   ... path to the data file
+            keywords - list     ... list of all metadata keywords
+            store    - MD_store ... the database of the working directory
+            schema   - Keyword_schema ... metadata stored with older keywords is migrated when it is read (optional)
+        """
+        self.path = path
+        self.store = store
+        self.schema = schema
+        self.stale = False
+
+        # the keywords are shared by all MD_files with the same keywords
+        self.layout = get_layout(keywords)
+
+        # unsaved changes and the depth of nested batches
+        self.dirty = False
+        self.batch_depth = 0
+        self.listener = None
+        self.journal = None
+
+        # intializing the information of each keyword
+        self.infos = [""] * len(self.layout.keywords)
+
+        # writing the init data dict if the file is not stored yet
+        if not store.exists(path):
+            # an existing metadata file is taken over
+            if os.path.isfile(self.metadata_path):
+                text_data = MD_file(path, self.layout.keywords, exists=True, schema=schema).data
+                self.infos = [text_data.get(key, "") for key in self.layout.keywords]
+            self.write()
+
+        self.read()
+
+    def read(self):
+        """
+        Function to load the metadata from the database
+        """
+        data = self.store.read(self.path)
+        self.set_data(list(data), list(data.values()))
+
+    def write(self):
+        """
+        Function to write the metadata to the database
+        """
+        self.store.write(self.path, self.layout.keywords, self.data)
+        self.dirty = False
+        self.stale = False
@@ -0,0 +1,330 @@
+import os
+import sys
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from md_file import get_metadata_path, parse_metadata
+
+
+# typecodes of the code vectors from small to large with the number of codes they can hold,
+# a column is widened when its dictionary outgrows its typecode
+TYPECODES = (("B", 2**8), ("H", 2**16), ("I", 2**32))
+
+
+class MD_column:
+    """
+    Class which holds the information of one keyword for every row of an MD_table, dictionary encoded:
+    every distinct information is saved once and each row only holds its code
+
+        column.values[column.codes[row]]    # = information of the row
+    """
+    __slots__ = ("values", "codes_of", "codes", "width")
+
+    def __init__(self):
+        """
+        Initialization of an empty column
+        """
+        # code -> information, code 0 marks rows whose data file was removed
+        self.values = [None]
+        # information -> code
+        self.codes_of = {}
+        # code of each row
+        self.width = 0
+        self.codes = array(TYPECODES[0][0])
+
+    def encode(self, info):
+        """
+        Function to get the code of an information (new information gets a new code)
+
+            info    - string    ... the information
+        returns:
+            code    - int       ... the code of the information
+        """
+        code = self.codes_of.get(info)
+        if code is None:
+            code = len(self.values)
+            self.values.append(info)
+            self.codes_of[info] = code
+
+            # the codes do not fit into the typecode anymore
+            if code >= TYPECODES[self.width][1]:
+                self.width += 1
+                self.codes = array(TYPECODES[self.width][0], self.codes)
+        return code
+
+    def append(self, info):
+        """
+        Function to add a row
+
+            info    - string    ... information of the new row
+        """
+        # encode first, it can replace the array with a wider one
+        code = self.encode(info)
+        self.codes.append(code)
+
+    def memory_size(self):
+        """
+        Function to estimate the memory used by the column in bytes
+        """
+        return (self.codes.itemsize * len(self.codes) + sys.getsizeof(self.values) + sys.getsizeof(self.codes_of)
+                + sum(sys.getsizeof(info) for info in self.values[1:]))
+
+
+def read_data(path, schema=None):
+    """
+    Function which reads the metadata of a data file for the table (empty if it has no metadata file)
+
+        path    - string            ... path to the data file
+        schema  - Keyword_schema    ... metadata with older keywords is migrated (optional)
+    returns:
+        data    - dict              ... keyword, information pairs
+    """
+    try:
+        _, keywords, values = parse_metadata(get_metadata_path(path))
+    except (OSError, UnicodeDecodeError):
+        return {}
+    if schema is None:
+        return dict(zip(keywords, values))
+    return schema.migrate(keywords, values)
+
+
+class MD_table:
+    """
+    Class which holds the metadata of a whole working directory as a table:
+    one row per data file and one dictionary encoded column per keyword.
+
+    Idea:
+        - information like author, location or units repeats across thousands of files,
+          each distinct information is saved once per column, the rows only hold small codes in arrays
+        - counting and grouping runs over the arrays of codes instead of over MD_files
+        - it can be attached to an MD_file_dict like the other indexes and is then kept up to date
+
+        table = MD_table.from_files(data_files, keywords)
+        table.count("author", "smith")          # = number of data files with this author
+        table.group_by("author", "location")    # = Counter of (author, location) -> number of data files
+    """
+    def __init__(self, keywords):
+        """
+        Initialization of an empty table
+
+            keywords    - list  ... list with all keywords as strings
+        """
+        self.keywords = list(keywords)
+        self.columns = {key: MD_column() for key in self.keywords}
+
+        # row -> path to the data file (None if it was removed)
+        self.paths = []
+        # path to the data file -> row
+        self.rows = {}
+
+    @classmethod
+    def from_files(cls, data_files, keywords, schema=None, workers=1):
+        """
+        Function which creates the table straight from the metadata files
+
+            data_files  - list              ... paths to the data files
+            keywords    - list              ... list with all keywords as strings
+            schema      - Keyword_schema    ... metadata with older keywords is migrated (optional)
+            workers     - int               ... number of threads which read the metadata files
+        returns:
+            table       - MD_table          ... the table with one row per data file
+        """
+        table = cls(keywords)
+        data_files = list(data_files)
+
+        # the files are read in parallel but added in the order of the data files
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for path, data in zip(data_files, pool.map(lambda path: read_data(path, schema), data_files)):
+                table.add(path, data)
+        return table
+
+    @classmethod
+    def from_MD_files(cls, MD_files):
+        """
+        Function which creates the table from the metadata of the MD_files (read chunk by chunk, nothing is created)
+
+            MD_files    - MD_file_dict  ... lazy dict with one MD_file for each data file
+        returns:
+            table       - MD_table      ... the table with one row per data file
+        """
+        table = cls(MD_files.keywords)
+        table.build(MD_files)
+        return table
+
+    def build(self, MD_files):
+        """
+        Function which adds all data files of an MD_file_dict (used by MD_file_dict.attach_index)
+        """
+        for path, data in MD_files.read_items():
+            self.add(path, data)
+
+    def add(self, path, data):
+        """
+        Function to add the row of a data file
+
+            path    - string    ... path to the data file
+            data    - dict      ... keyword, information pairs
+        """
+        if path in self.rows:
+            for key, column in self.columns.items():
+                column.codes[self.rows[path]] = column.encode(data.get(key, ""))
+            return
+
+        self.rows[path] = len(self.paths)
+        self.paths.append(path)
+        for key, column in self.columns.items():
+            column.append(data.get(key, ""))
+
+    def remove(self, path, data):
+        """
+        Function to remove the row of a data file (the row stays with code 0)
+
+            path    - string    ... path to the data file
+            data    - dict      ... keyword, information pairs (not needed)
+        """
+        row = self.rows.pop(path, None)
+        if row is None:
+            return
+        self.paths[row] = None
+        for column in self.columns.values():
+            column.codes[row] = 0
+
+    def change(self, path, key, old, new):
+        """
+        Function to change one information of a data file
+
+            path    - string    ... path to the data file
+            key     - string    ... the keyword
+            old     - string    ... old information (not needed)
+            new     - string    ... new information
+        """
+        row = self.rows.get(path)
+        column = self.columns.get(key)
+        if row is None or column is None:
+            return
+        column.codes[row] = column.encode(new)
+
+    def rename_keyword(self, old, new):
+        """
+        Function to rename a keyword
+
+            old     - string    ... old keyword
+            new     - string    ... new keyword
+        """
+        if old in self.columns:
+            self.columns[new] = self.columns.pop(old)
+            self.keywords[self.keywords.index(old)] = new
+
+    def set_keywords(self, keywords):
+        """
+        Function which removes the columns of removed keywords and adds empty columns for new keywords
+
+            keywords    - list  ... list of all metadata keywords
+        """
+        columns = {}
+        for key in keywords:
+            if key in self.columns:
+                columns[key] = self.columns[key]
+                continue
+
+            column = MD_column()
+            empty = column.encode("")
+            for path in self.paths:
+                column.codes.append(0 if path is None else empty)
+            columns[key] = column
+
+        self.keywords = list(keywords)
+        self.columns = columns
+
+    def select(self, below=None):
+        """
+        Function to get the rows of the data files below a directory
+
+            below   - string/path   ... path to the directory (None for all data files)
+        returns:
+            rows    - list          ... rows of the data files (None for all rows)
+        """
+        if below is None:
+            return None
+        prefix = os.path.join(os.path.normpath(os.path.abspath(below)), "")
+        return [row for row, path in enumerate(self.paths) if not path is None and path.startswith(prefix)]
+
+    def count(self, keyword=None, info=None, below=None):
+        """
+        Function to count data files
+
+            keyword - string        ... the keyword (None counts all data files)
+            info    - string        ... only data files with this information
+            below   - string/path   ... only data files below this directory (optional)
+        returns:
+            count   - int           ... number of data files
+        """
+        rows = self.select(below)
+        if keyword is None:
+            return len(self.rows) if rows is None else len(rows)
+
+        column = self.columns[keyword]
+        code = column.codes_of.get(info)
+        if code is None:
+            return 0
+        if rows is None:
+            return column.codes.count(code)
+        codes = column.codes
+        return sum(1 for row in rows if codes[row] == code)
+
+    def group_by(self, *keywords, below=None):
+        """
+        Function to count the data files per information (or per combination of information)
+
+            keywords    - string        ... one or more keywords
+            below       - string/path   ... only data files below this directory (optional)
+        returns:
+            counts      - Counter       ... information (a tuple for several keywords) -> number of data files
+        """
+        columns = [self.columns[key] for key in keywords]
+        rows = self.select(below)
+
+        if rows is None:
+            vectors = [column.codes for column in columns]
+        else:
+            vectors = [[column.codes[row] for row in rows] for column in columns]
+
+        # counting the codes runs in C, only the distinct codes are decoded
+        if len(columns) == 1:
+            codes = Counter(vectors[0])
+            codes.pop(0, None)
+            return Counter({columns[0].values[code]: n for code, n in codes.items()})
+
+        codes = Counter(zip(*vectors))
+        # removed rows have code 0 in every column
+        codes.pop((0,) * len(columns), None)
+        return Counter({tuple(column.values[code] for column, code in zip(columns, combination)): n
+                        for combination, n in codes.items()})
+
+    def paths_where(self, keyword, info):
+        """
+        Function to get the data files with an information
+
+            keyword - string    ... the keyword
+            info    - string    ... the information
+        returns:
+            paths   - list      ... paths to the data files
+        """
+        column = self.columns[keyword]
+        code = column.codes_of.get(info)
+        if code is None:
+            return []
+        return [self.paths[row] for row, c in enumerate(column.codes) if c == code]
+
+    def memory_size(self):
+        """
+        Function to estimate the memory used by the table in bytes (without the paths, they are shared with the snapshot)
+        """
+        return (sum(column.memory_size() for column in self.columns.values())
+                + sys.getsizeof(self.paths) + sys.getsizeof(self.rows))
+
+    def __len__(self):
+        """
+        Number of data files in the table
+        """
+        return len(self.rows)
@@ -0,0 +1,157 @@
+import os
+from md_file import get_metadata_path, atomic_write
+
+
+"""
+This file contains the tracking of renamed and moved data files,
+so that their metadata follows them:
+
+    find_moves(snapshot, manifest)
+    match_moves(missing, new_files, identities)
+    move_metadata(old, new)
+    reconcile_moves(snapshot, manifest, store)
+
+The manifest saves the device, inode, size and mtime of every data file when it is first seen.
+Only data files which are new since the last scan are looked at (one stat each)
+and matched against the data files which disappeared since then:
+    1. same device and inode (renamed or moved on the same file system, also if it was changed in place since)
+    2. same size and mtime (moved to another file system)
+A match which fits more than one disappeared data file (e.g. hard links) is not a move.
+"""
+
+def find_moves(snapshot, manifest):
+    """
+    Function which finds the data files which were renamed or moved since the last scan
+
+        snapshot    - WD_snapshot   ... snapshot of the working directory
+        manifest    - Scan_manifest ... manifest which holds the identities of the last scan
+    returns:
+        moves       - list          ... (old path, new path) pairs
+    """
+    known = manifest.data_files
+    # the first scan only saves the identities
+    first_scan = len(known) == 0
+
+    current = set(snapshot.data_files)
+    new_files = set(path for path in snapshot.data_files if not path in known)
+    missing = [path for path in known if not path in current]
+
+    # only the new data files are looked at, the identities of the others are known
+    new_stats = []
+    for path in snapshot.data_files:
+        if not path in new_files:
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        manifest.set_identity(path, st)
+        new_stats.append((path, st))
+
+    if first_scan:
+        return []
+    return match_moves(missing, new_stats, known)
+
+
+def match_moves(missing, new_files, identities):
+    """
+    Function which matches new data files against disappeared data files (see the rules above)
+
+        missing     - list  ... paths to the disappeared data files
+        new_files   - list  ... (path, stat_result) pairs of the new data files
+        identities  - dict  ... data file -> (device, inode, size, mtime) saved before they disappeared
+    returns:
+        moves       - list  ... (old path, new path) pairs
+    """
+    # (device, inode) -> disappeared data files (more than one for hard links)
+    by_inode = {}
+    # (size, mtime) -> disappeared data files
+    by_stat = {}
+    for path in missing:
+        if not path in identities:
+            continue
+        dev, ino, size, mtime = identities[path]
+        by_inode.setdefault((dev, ino), []).append(path)
+        by_stat.setdefault((size, mtime), []).append(path)
+
+    moves = []
+    # every disappeared data file is matched at most once
+    matched = set()
+    for path, st in new_files:
+        candidates = [old for old in by_inode.get((st.st_dev, st.st_ino), []) if not old in matched]
+        if len(candidates) == 0:
+            candidates = [old for old in by_stat.get((st.st_size, st.st_mtime_ns), []) if not old in matched]
+
+        # an ambiguous match is not a move
+        if len(candidates) == 1:
+            moves.append((candidates[0], path))
+            matched.add(candidates[0])
+
+    return moves
+
+
+def move_metadata(old, new):
+    """
+    Function which moves the metadata file of a renamed or moved data file
+    and updates the path to the data file inside
+
+        old     - string    ... old path to the data file
+        new     - string    ... new path to the data file
+    returns:
+        moved   - bool      ... False if there was no metadata file or the new data file already has one
+    """
+    old_metadata_path = get_metadata_path(old)
+    new_metadata_path = get_metadata_path(new)
+
+    if not os.path.isfile(old_metadata_path) or os.path.exists(new_metadata_path):
+        return False
+
+    with open(old_metadata_path, "r") as f:
+        content = f.read()
+
+    # the first line refers to the data file
+    lines = content.split("\n", 1)
+    if lines[0].startswith("path to data file: "):
+        content = "path to data file: " + new + "\n" + (lines[1] if len(lines) > 1 else "")
+
+    os.makedirs(os.path.dirname(new_metadata_path), exist_ok=True)
+    # the new file is complete before the old one is removed
+    atomic_write(new_metadata_path, content)
+    os.remove(old_metadata_path)
+    return True
+
+
+def reconcile_moves(snapshot, manifest, store=None):
+    """
+    Function which moves the metadata of all data files which were renamed or moved since the last scan
+
+        snapshot    - WD_snapshot   ... snapshot of the working directory
+        manifest    - Scan_manifest ... manifest which holds the identities of the last scan
+        store       - MD_store      ... database of the working directory (optional)
+    returns:
+        moves       - list          ... (old path, new path) pairs of the moved data files
+    """
+    moves = []
+    for old, new in find_moves(snapshot, manifest):
+        # a data file without metadata has nothing to move
+        if not os.path.isfile(get_metadata_path(old)) and (store is None or not store.exists(old)):
+            manifest.data_files.pop(old, None)
+            continue
+
+        try:
+            moved = move_metadata(old, new)
+        except OSError:
+            moved = False
+        # the metadata of the database is moved as well (there may be no metadata file)
+        if not store is None:
+            moved = store.rename(old, new) or moved
+
+        if moved:
+            manifest.data_files.pop(old, None)
+            moves.append((old, new))
+        else:
+            # the old identity is kept and the new data file stays new, the next scan tries again
+            manifest.unmoved.add(old)
+            manifest.data_files.pop(new, None)
+
+    return moves
@@ -1,4 +1,34 @@
 import os
+import hashlib
+
+
+# process IDs start with this, so they are never mistaken for a description saved as text
+PROCESS_ID_PREFIX = "pd:"
+
+
+def get_process_id(descr, n=0):
+    """
+    Function to get the ID of a process description, it only depends on the text of the description
+
+        descr   - string    ... description of the process
+        n       - int       ... number of the ID if the first ones already belong to other processes
+                                (see PD_handler.add_id)
+    returns:
+        id      - string    ... PROCESS_ID_PREFIX and 16 hex digits of the sha1 of the description ("" for no description)
+    """
+    if descr == "":
+        return ""
+    if n > 0:
+        descr = descr + "\n" + str(n)
+    return PROCESS_ID_PREFIX + hashlib.sha1(descr.encode("utf-8")).hexdigest()[:16]
+
+
+def is_process_id(info):
+    """
+    Function to check if the information of the process description keyword is an ID instead of the text
+    """
+    return info.startswith(PROCESS_ID_PREFIX)
+
 
 class PD_handler:
     """
@@ -10,14 +40,30 @@ class PD_handler:
 
         processes["Name"] # = "description"
         processes[["description"]] # = name
+        processes[[get_process_id("description")]] # = name
+
+    The metadata files can save the short ID of a description instead of its text (see get_value).
+    An ID stays valid when the description is edited later (it keeps pointing to the process),
+    so files with IDs do not have to be rewritten. Files with the text still work as before.
+    An ID never changes its process: a new process with the text of an older description gets the next free ID.
     """
     def __init__(self):
         self.names = {}
         self.descriptions = {}
+        # ID of every description this process ever had -> name
+        self.ids = {}
 
         self.names["No Description"] = ""
         self.descriptions[""] = "No Description"
 
+    def __setstate__(self, state):
+        """
+        Restores a pickled handler, handlers saved before the IDs get them from their descriptions
+        """
+        self.__dict__.update(state)
+        if not "ids" in state:
+            self.ids = {get_process_id(descr): name for descr, name in self.descriptions.items() if descr != ""}
+
     def add(self, name, descr):
         """
         Function to add a description
@@ -27,6 +73,35 @@ class PD_handler:
         """
         self.names[name] = descr
         self.descriptions[descr] = name
+        self.add_id(descr, name)
+
+    def add_id(self, descr, name):
+        """
+        Function to register the ID of a description (IDs of other processes are never taken over)
+
+            descr   - string    ... description of the process
+            name    - string    ... name of the process
+        returns:
+            id      - string    ... the ID of the description for this process
+        """
+        if descr == "":
+            return ""
+
+        n = 0
+        process_id = get_process_id(descr)
+        # files of another process (or of a deleted one) could still save this ID
+        while self.ids.setdefault(process_id, name) != name:
+            n += 1
+            process_id = get_process_id(descr, n)
+        return process_id
+
+    def rename_ids(self, old_name, name):
+        """
+        Function which lets the IDs of a process point to its new name
+        """
+        for process_id, n in self.ids.items():
+            if n == old_name:
+                self.ids[process_id] = name
 
     def remove(self, name, descr):
         """
@@ -37,6 +112,63 @@ class PD_handler:
         """
         self.names.pop(name)
         self.descriptions.pop(descr)
+        # files which save an ID of the deleted process have no description now
+        self.rename_ids(name, self.descriptions.get("", "No Description"))
+
+    def has_name(self, name):
+        """
+        Function to check if a process name is known (a set lookup instead of a list scan)
+        """
+        return name in self.names
+
+    def has_description(self, descr):
+        """
+        Function to check if a process description is known
+        """
+        return descr in self.descriptions
+
+    def is_known(self, info):
+        """
+        Function to check if the information of the process description keyword is a known description or ID
+        """
+        return info in self.descriptions or info in self.ids
+
+    def get_name(self, info):
+        """
+        Function to get the name of a process from the information of the process description keyword
+
+            info    - string    ... description or ID
+        returns:
+            name    - string    ... name of the process (None if it is not known)
+        """
+        name = self.descriptions.get(info)
+        if name is None:
+            name = self.ids.get(info)
+        return name
+
+    def resolve(self, info):
+        """
+        Function to get the text of the description from the information of the process description keyword
+
+            info    - string    ... description or ID
+        returns:
+            descr   - string    ... the current description (unknown IDs are returned as they are)
+        """
+        if info in self.ids:
+            return self.names[self.ids[info]]
+        return info
+
+    def get_value(self, name, ids=False):
+        """
+        Function to get what is saved in the metadata files for a process
+
+            name    - string    ... name of the process
+            ids     - bool      ... save the ID of the description instead of its text
+        returns:
+            info    - string    ... the ID or the description
+        """
+        descr = self.names[name]
+        return self.add_id(descr, name) if ids else descr
 
     def get_process_names(self):
         """
@@ -55,6 +187,9 @@ class PD_handler:
         Operator overloading to simplify usage of the class
         """
         if type(key) is list:
+            # an ID is resolved to the name of its process
+            if not key[0] in self.descriptions and key[0] in self.ids:
+                return self.ids[key[0]]
             return self.descriptions[key[0]]
         else:
             return self.names[key]
@@ -67,21 +202,26 @@ class PD_handler:
         if type(key) is list:
             if key[0] in self.descriptions:
                 # update name if it is a known description
-                self.names[value] = self.names.pop(self.descriptions[key[0]])
+                old_name = self.descriptions[key[0]]
+                self.names[value] = self.names.pop(old_name)
                 self.descriptions[key[0]] = value
+                self.rename_ids(old_name, value)
             else:
                 # add description and name to the dicts
                 self.descriptions[key[0]] = value
                 self.names[value] = key[0]
+                self.add_id(key[0], value)
         else:
             if key in self.names:
                 # update description if it is a known name
+                # (the ID of the old description keeps pointing to the process)
                 self.descriptions[value] = self.descriptions.pop(self.names[key])
                 self.names[key] = value
             else:
                 # add description and name to the dicts
                 self.names[key] = value
                 self.descriptions[value] = key
+            self.add_id(value, key)
 
     def __str__(self):
         """
@@ -0,0 +1,182 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MD_propagation:
+    """
+    Class which copies metadata to many data files, used by the [>], [>>] and [>>>] buttons
+    and by the apply command of cli.py.
+
+    Idea:
+        - the targets come from the snapshot in memory, nothing is walked again
+        - the files are handled in batches: the MD_files of a batch are loaded in parallel,
+          files which already hold the metadata are skipped and the others are written in parallel
+        - each batch is one transaction (one group commit with a journal)
+        - step() handles a single batch, so the GUI can run it from the Tk event loop
+          with a progress bar and stop it with cancel()
+
+        propagation = MD_propagation(MD_files, data, targets)
+        summary = propagation.run()     # = number of changed, unchanged and failed files
+    """
+    def __init__(self, MD_files, data, targets, workers=None, batch_size=128):
+        """
+        Initialization of the propagation
+
+            MD_files    - MD_file_dict  ... lazy dict with one MD_file for each data file
+            data        - dict          ... keyword, information pairs which are copied
+            targets     - list          ... paths to the data files which get the metadata
+            workers     - int           ... number of threads used to write (default MD_files.workers)
+            batch_size  - int           ... number of files handled by one step
+        """
+        self.MD_files = MD_files
+        self.data = dict(data)
+        # unknown files can not be written
+        self.targets = [path for path in targets if path in MD_files]
+        self.workers = MD_files.workers if workers is None else workers
+
+        # a batch never holds more files than the MD_file_dict keeps in memory
+        if not MD_files.max_entries is None:
+            batch_size = min(batch_size, MD_files.max_entries)
+        self.batch_size = max(1, batch_size)
+
+        # position of the next batch in the targets
+        self.position = 0
+        self.cancelled = False
+        self.pool = None
+
+        self.summary = {"files": len(self.targets), "changed": 0, "unchanged": 0, "failed": 0, "errors": [], "cancelled": False}
+
+    def done(self):
+        """
+        Number of files which were handled so far
+        """
+        return self.position
+
+    def finished(self):
+        """
+        Function to check if all files were handled or the propagation was cancelled
+        """
+        return self.cancelled or self.position >= len(self.targets)
+
+    def cancel(self):
+        """
+        Function which stops the propagation before the next batch (files already written stay written)
+        """
+        self.cancelled = True
+        self.summary["cancelled"] = True
+
+    def fail(self, path, error):
+        """
+        Function to count a file which could not be handled
+        """
+        self.summary["failed"] += 1
+        self.summary["errors"].append({"path": path, "error": str(error)})
+
+    def load(self, batch):
+        """
+        Function which loads the MD_files of a batch (in parallel)
+
+            batch   - list  ... paths to the data files
+        returns:
+            loaded  - list  ... (path, MD_file) pairs of the files which could be loaded
+        """
+        try:
+            self.MD_files.preload(batch)
+        except Exception:
+            # load one by one to find the files which fail
+            pass
+
+        loaded = []
+        for path in batch:
+            try:
+                loaded.append((path, self.MD_files[path]))
+            except Exception as e:
+                self.fail(path, e)
+        return loaded
+
+    def write(self, mds):
+        """
+        Function which writes changed MD_files (in parallel)
+
+            mds     - list  ... (path, MD_file) pairs
+        returns:
+            errors  - list  ... (path, error) pairs of the files which could not be written
+        """
+        def flush(md):
+            try:
+                md.flush()
+                return None
+            except Exception as e:
+                return e
+
+        if self.workers <= 1 or len(mds) <= 1:
+            errors = [flush(md) for _, md in mds]
+        else:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.workers)
+            errors = list(self.pool.map(flush, [md for _, md in mds]))
+
+        return [(path, error) for (path, _), error in zip(mds, errors) if not error is None]
+
+    def step(self):
+        """
+        Function which handles the next batch
+
+        returns:
+            more    - bool  ... False if all files were handled or the propagation was cancelled
+        """
+        if self.finished():
+            self.close()
+            return False
+
+        batch = self.targets[self.position:self.position + self.batch_size]
+
+        journal = self.MD_files.journal
+        with self.MD_files.transaction():
+            changed = []
+            for path, md in self.load(batch):
+                # the values are set here (this also updates the indexes), only the writes run in parallel
+                if md.update(self.data, write=False):
+                    changed.append((path, md))
+                else:
+                    self.summary["unchanged"] += 1
+
+            errors = self.write(changed)
+
+        # files which could not be written when the batch was committed stay in the journal
+        if not journal is None and len(journal.failed) > 0:
+            errors += [(path, "could not be written, kept in the journal") for path, md in changed
+                       if md.metadata_path in journal.failed and not path in dict(errors)]
+
+        for path, error in errors:
+            self.fail(path, error)
+        self.summary["changed"] += len(changed) - len(errors)
+
+        self.position += len(batch)
+        if self.finished():
+            self.close()
+            return False
+        return True
+
+    def run(self, progress=None):
+        """
+        Function which handles all files at once
+
+            progress    - callable  ... function(done, total) called after every batch (optional)
+        returns:
+            summary     - dict      ... number of changed, unchanged and failed files and the errors
+        """
+        try:
+            while self.step():
+                if not progress is None:
+                    progress(self.done(), len(self.targets))
+        finally:
+            self.close()
+        return self.summary
+
+    def close(self):
+        """
+        Function which stops the worker threads
+        """
+        if not self.pool is None:
+            self.pool.shutdown()
+            self.pool = None
@@ -1,9 +1,15 @@
-import tkinter as tk 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from utils import *
-from tkinter import messagebox
-from tkinter import filedialog
-from process_description import PD_handler
+from process_description import PD_handler, is_process_id
+from snapshot import WD_snapshot
+from md_file import parse_metadata
+
+# at most this many process descriptions are listed in a message box
+MAX_LISTED = 20
+
+# tkinter is only imported inside the functions which show dialogs
+# so that the extraction and import functions also work without a display
 
 def extract_keywords(path, skip_pd=False):
     """
@@ -13,22 +19,11 @@ def extract_keywords(path, skip_pd=False):
     returns:
         keys    - list      ... a list containing the keywords foun in the file
     """
-    with open(path, "r") as f:
-        lines = f.readlines()
-    if not skip_pd:
-        # if process description should not be skipped
-        if lines[1] == "\n":
-            lines = lines[2:]
-        else:
-            lines = lines[1:]
-    else:
-        if lines[1] == "\n":
-            lines = lines[3:]
-        else:
-            lines = lines[2:]
+    _, keys, _ = parse_metadata(path, header_only=True)
 
-
-    keys = [line.split(":")[0] for line in lines]
+    # the process description is always the first keyword
+    if skip_pd:
+        keys = keys[1:]
     return keys
 
 def extract_process_description(path):
@@ -39,33 +34,48 @@ def extract_process_description(path):
     returns:
         pd      - string    ... contains the extracted process description
     """
-    with open(path, "r") as f:
-        lines = f.readlines()
+    # only the first keyword is read
+    _, _, values = parse_metadata(path, header_only=True, limit=1)
 
-    lines = [line.replace("\n", "") for line in lines]
+    pd = values[0] if len(values) > 0 else ""
+    return pd
 
-    if lines[1] == "":
-        pd = lines[2].split("::  ")[1]
-    else:
-        pd = lines[1].split("::  ")[1]
 
-    return pd
+def list_for_message(items):
+    """
+    Function to list found keywords or process descriptions in a message box (only the first MAX_LISTED)
+
+        items   - list      ... the keywords or process descriptions
+    returns:
+        text    - string    ... one item per line
+    """
+    text = "\n".join(str(item) for item in items[:MAX_LISTED])
+    if len(items) > MAX_LISTED:
+        text += "\n... and " + str(len(items) - MAX_LISTED) + " more"
+    return text
 
 
-def recover_keywords():
+def recover_keywords(master=None):
     """
     The purpose of this Function is to recover keywords from a given metadata file
     or initialize new empty keywords
+
+        master  - tk.Tk     ... the root window of the tool (a hidden one is created if not given)
     """
-    root = tk.Tk()
-    root.withdraw()
+    import tkinter as tk
+    from tkinter import messagebox
+    from tkinter import filedialog
+
+    if master is None:
+        master = tk.Tk()
+        master.withdraw()
 
     if os.path.isfile("keywords.pkl"):
         print("You do not want to go there yet!")
         exit()
 
     if messagebox.askyesno("Recovering Keywords", "Yes: to try and recover from Metadata from metadata file\nNo:  to create a new empty keyword file"):
-        keys = extract_keywords(filedialog.askopenfilename())
+        keys = extract_keywords(filedialog.askopenfilename(parent=master))
         
         if messagebox.askyesno("Found Keys", "Found the following keys:\n"+str(keys)+"\nDo you want to save them?"):
             save_keywords(keys)
@@ -77,44 +87,34 @@ def recover_keywords():
     return False
 
 
-def recover_processes():
+def recover_processes(master=None):
     """
     The purpose of this Function is to recover processes from a given working directory
     or initialize new empty processes
+
+        master  - tk.Tk     ... the root window of the tool (a hidden one is created if not given)
     """
-    root = tk.Tk()
-    root.withdraw()
+    import tkinter as tk
+    from tkinter import messagebox
+    from tkinter import filedialog
+
+    if master is None:
+        master = tk.Tk()
+        master.withdraw()
 
     if os.path.isfile("processes.pkl"):
         print("You do not want to go there yet!")
         exit()
 
     if messagebox.askyesno("Recovering Process Description", "Yes: to try and recover them from a data directory\nNo:  to create an empty processes.pkl"):
-        dir = filedialog.askdirectory()
-        # initialize metadata file list
-        metadata_file_list = []
-
-        # create directory walk
-        w = os.walk(dir)
-        # filling the list with all file paths
-        for root, _, files in w:
-            # iterate over all files
-            for f in files:
-                # create the path
-                path = os.path.join(root, f)
-
-                # check if metadata is in the filename or directory above
-                if  "metadata" in f or "metadata" in os.path.split(root)[1]:
-                    metadata_file_list.append(os.path.normpath(path))
-
-        descriptions = []
+        dir = filedialog.askdirectory(parent=master)
+        # get all metadata files in the directory
+        metadata_file_list = WD_snapshot(dir).metadata_files
 
-        # loop over the metadata files and search non empty descriptions
-        for md in metadata_file_list:
-            pd = extract_process_description(md)
-
-            if pd != "":
-                descriptions.append(pd)
+        # every description only once (in the order they were found), empty descriptions are no processes
+        # and the text of an ID can not be recovered
+        _, pds = group_headers(metadata_file_list, workers=DEFAULT_WORKERS)
+        descriptions = [pd for pd in pds if pd != "" and not is_process_id(pd)]
 
         # create empty process handler
         processes = PD_handler()
@@ -126,7 +126,7 @@ def recover_processes():
             else:
                 return False
 
-        if messagebox.askyesno("Recovering Process Descriptions", "Found the following descriptions:\n" + str(descriptions) + "\nDo you want to save them?"):
+        if messagebox.askyesno("Recovering Process Descriptions", "Found the following " + str(len(descriptions)) + " descriptions:\n" + list_for_message(descriptions) + "\nDo you want to save them?"):
             for i,descr in enumerate(descriptions):
                 processes["descr_"+str(i+1)] = descr
 
@@ -140,7 +140,160 @@ def recover_processes():
     return False
 
 
-def recover_from_other_users(path, keywords, processes):
+def read_header(md_file, manifest=None):
+    """
+    Function to get the keywords and the process description of a metadata file
+
+        md_file     - string        ... path to the metadata file
+        manifest    - Scan_manifest ... manifest of the last scan, unchanged metadata files are not parsed again (optional)
+    returns:
+        header      - tuple         ... (keywords, process description)
+    """
+    # use the saved header if the file did not change since the last start
+    header = None
+    if not manifest is None:
+        header = manifest.header(md_file)
+    if header is None:
+        # keywords and process description with a single read of the file
+        _, keys, values = parse_metadata(md_file, header_only=True)
+        header = keys, values[0] if len(values) > 0 else ""
+        if not manifest is None:
+            manifest.set_header(md_file, *header)
+    return header
+
+
+def group_headers(metadata_files, manifest=None, workers=1):
+    """
+    Function which reads the header of every metadata file and groups the files by their keywords,
+    a working directory only has a few distinct keyword lists so everything which depends on the keywords
+    is only checked once per group
+
+        metadata_files  - list          ... paths to the metadata files
+        manifest        - Scan_manifest ... manifest of the last scan, unchanged metadata files are not parsed again (optional)
+        workers         - int           ... number of threads which read the metadata files
+    returns:
+        groups          - dict          ... keyword tuple -> metadata files with these keywords
+        pds             - dict          ... process description -> number of metadata files (in the order they were found)
+    """
+    groups = {}
+    pds = {}
+    # the files are read in parallel but grouped in the order of the files
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for md_file, (k, p) in zip(metadata_files, pool.map(lambda md_file: read_header(md_file, manifest), metadata_files)):
+            # the keyword tuple is hashed once per file, equal headers end up in the same group
+            groups.setdefault(tuple(k), []).append(md_file)
+            pds[p] = pds.get(p, 0) + 1
+    return groups, pds
+
+
+def get_data_path(md_file):
+    """
+    Function to calculate the path to the data file of a metadata file (the inverse of get_metadata_path)
+
+        md_file - string    ... path to the metadata file
+    returns:
+        path    - string    ... path to the data file
+    """
+    name = os.path.split(md_file)[1].replace("-metadata.txt", "")
+    return os.path.join(os.path.split(os.path.split(md_file)[0])[0], "-".join(name.split("-")[:-1]) + "." + name.split("-")[-1])
+
+
+def rename_process_keyword(md_file, keys, keyword):
+    """
+    Function which renames the process description keyword of a metadata file
+
+        md_file - string    ... path to the metadata file
+        keys    - list      ... keywords of the metadata file
+        keyword - string    ... new name of the process description keyword
+    """
+    # create md file and overwrite the name
+    tmp = MD_file(get_data_path(md_file), keys, exists=True)
+    tmp.update_keyword(0, keyword)
+    tmp.write()
+
+
+def find_from_other_users(path, keywords, processes, snapshot=None, manifest=None, workers=1, schema=None):
+    """
+    Function which searches the working directory for keywords and process descriptions
+    of other users or instances of this tool which use their own keywords.pkl and processes.pkl.
+    Metadata files with a differently named process description keyword are renamed on the way.
+
+        path        - string        ... path to the working directory
+        keywords    - list          ... containing the known keywords
+        processes   - PD_handler    ... contains the known processes
+        snapshot    - WD_snapshot   ... already created snapshot of the working directory (optional)
+        manifest    - Scan_manifest ... manifest of the last scan, unchanged metadata files are not parsed again (optional)
+        workers     - int           ... number of threads which read the metadata files
+        schema      - Keyword_schema... old keywords of the schema are not unknown, their files are migrated later (optional)
+    returns
+        not_saved_keys  - list      ... keywords not in keywords.pkl
+        not_saved_pds   - list      ... process descriptions not in processes.pkl
+    """
+    # walk the working directory only if no snapshot is given
+    if snapshot is None:
+        snapshot = WD_snapshot(path)
+
+    groups, pds = group_headers(snapshot.metadata_files, manifest, workers)
+
+    keys = set()
+    renames = []
+    # one representative keyword list per group
+    for k, md_files in groups.items():
+
+        # check process description is differently named
+        # (not if it was renamed by this tool, the file is migrated when it is read):
+        if len(k) > 0 and k[0] != keywords[0] and (schema is None or schema.plan(k).get(k[0]) != keywords[0]):
+            renames.extend((md_file, list(k)) for md_file in md_files)
+
+        keys.update(k[1:])
+
+    # the files of all groups which need the new process description keyword are fixed in one batch
+    if len(renames) > 0:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            list(pool.map(lambda rename: rename_process_keyword(rename[0], rename[1], keywords[0]), renames))
+
+    # get the elements not already found in processes.pkl and keywords.pkl (or renamed and removed by this tool)
+    known_keys = set(keywords) if schema is None else set(keywords) | schema.known_keywords()
+    not_saved_keys = list(keys - known_keys)
+    # IDs of unknown processes are skipped, only the instance which saved them knows their text
+    not_saved_pds = [pd for pd in pds if not processes.is_known(pd) and not is_process_id(pd)]
+
+    return not_saved_keys, not_saved_pds
+
+
+def import_keywords(keywords, not_saved_keys):
+    """
+    Function which adds unknown keywords to the keywords and saves them to keywords.pkl
+
+        keywords        - list      ... containing the known keywords
+        not_saved_keys  - list      ... keywords which should be added
+    """
+    keywords.extend(not_saved_keys)
+    save_keywords(keywords)
+
+
+def import_process_descriptions(processes, not_saved_pds):
+    """
+    Function which adds unknown process descriptions with placeholder names
+    and saves them to processes.pkl
+
+        processes       - PD_handler    ... contains the known processes
+        not_saved_pds   - list          ... process descriptions which should be added
+    """
+    for i,pd in enumerate(not_saved_pds):
+        name = "descr_"+str(i)
+        j=1
+        while processes.has_name(name):
+            name = name.split("(")[0]
+            name = name+"("+str(j)+")"
+            j+=1
+
+        processes[[pd]] = name
+
+    save_processes(processes)
+
+
+def recover_from_other_users(path, keywords, processes, snapshot=None, manifest=None, workers=1, schema=None):
     """
     Function which tries to recover process descriptions and keywords from other 
     users or instances of this tool which use their own keywords.pkl and processes.pkl.
@@ -148,59 +301,36 @@ def recover_from_other_users(path, keywords, processes):
         path        - string        ... path to the working directory
         keywords    - list          ... containing the known keywords
         processes   - PD_handler    ... contains the known processes
+        snapshot    - WD_snapshot   ... already created snapshot of the working directory (optional)
+        manifest    - Scan_manifest ... manifest of the last scan, unchanged metadata files are not parsed again (optional)
+        workers     - int           ... number of threads which read the metadata files
+        schema      - Keyword_schema... old keywords of the schema are not unknown (optional)
     returns
         bools       - tuple         ... should keywords.pkl and processes.pkl be reloaded
     """
-    # initialize metadata file list
-    metadata_file_list = []
-
-    # create directory walk
-    w = os.walk(path)
-    # filling the list with all file paths
-    for root, _, files in w:
-        # iterate over all files
-        for f in files:
-            # create the path
-            path = os.path.join(root, f)
-
-            # check if metadata is in the filename or directory above
-            if  "metadata" in f or "metadata" in os.path.split(root)[1]:
-                metadata_file_list.append(os.path.normpath(path))
-
-    keys = []
-    pds = []
-    # iterate over the found md_files and save the found keys/pds
-    for md_file in metadata_file_list:
-        k = extract_keywords(md_file, skip_pd=False)
-        # check process description is differently named:
-        if k[0] != keywords[0]:
-            # calculate path to the data file
-            path = os.path.join(os.path.split(os.path.split(md_file)[0])[0], 
-                                "-".join(os.path.split(md_file)[1].replace("-metadata.txt", "").split("-")[:-1])+"."+os.path.split(md_file)[1].replace("-metadata.txt", "").split("-")[-1])
-            # create md file and overwrite the name
-            tmp = MD_file(path, k)
-            tmp.read()
-            tmp.update_keyword(0, keywords[0])
-            tmp.write()
-
-        k = k[1:]
-        dif = list(set(k)-set(keys))
-        keys.extend(dif)
-
-        p = extract_process_description(md_file)
-        if not p in pds:
-            pds.append(p)
-
-    # get the elements not already found in processes.pkl and keywords.pkl
-    not_saved_keys = list(set(keys) - set(keywords))
-    not_saved_pds = list(set(pds) - set(processes.get_process_descriptions()))
+    not_saved_keys, not_saved_pds = find_from_other_users(path, keywords, processes, snapshot, manifest, workers, schema)
+    return ask_to_import(keywords, processes, not_saved_keys, not_saved_pds)
+
+
+def ask_to_import(keywords, processes, not_saved_keys, not_saved_pds):
+    """
+    Function which asks the user if the keywords and process descriptions found by find_from_other_users
+    should be imported (runs on the main thread, the search itself can run in the background)
+
+        keywords        - list          ... containing the known keywords
+        processes       - PD_handler    ... contains the known processes
+        not_saved_keys  - list          ... keywords not in keywords.pkl
+        not_saved_pds   - list          ... process descriptions not in processes.pkl
+    returns
+        bools           - tuple         ... should keywords.pkl and processes.pkl be reloaded
+    """
+    from tkinter import messagebox
 
     if len(not_saved_keys) > 0:
         # if keys were found show them to the user and ask if he wants to save them
         if messagebox.askyesno("Found unknown Keywords!", "The following unkown keywords were found in the working directory:\n" + str(not_saved_keys)
             + "\nDo you want to update your keywords.pkl?\n\nWarning: not updating will delete metadata in these unkown keywords."):
-            keywords.extend(not_saved_keys)
-            save_keywords(keywords)
+            import_keywords(keywords, not_saved_keys)
             # true as in reload keywords
             reload_keywords = True
         else:
@@ -210,20 +340,9 @@ def recover_from_other_users(path, keywords, processes):
         reload_keywords = False
 
     if len(not_saved_pds) > 0:
-        if messagebox.askyesno("Found unknown Process Descriptions!", "The following unkown process descriptions were found in the working directory:\n" + str(not_saved_pds)
+        if messagebox.askyesno("Found unknown Process Descriptions!", "The following unkown process descriptions were found in the working directory:\n" + list_for_message(not_saved_pds)
             + "\nDo you want to update your processes.pkl?\n\nWarning: not updating will delete these process descriptions (metadata could be lost). Saving them will save them with placeholder names."):
-            for i,pd in enumerate(not_saved_pds):
-                name = "descr_"+str(i)
-                p_names = processes.get_process_names()
-                j=1
-                while name in p_names:
-                    name = name.split("(")[0]
-                    name = name+"("+str(j)+")"
-                    j+=1
-
-                processes[[pd]] = name
-
-            save_processes(processes)
+            import_process_descriptions(processes, not_saved_pds)
 
             # return true as in reload processes
             reload_processes = True
@@ -234,4 +353,3 @@ def recover_from_other_users(path, keywords, processes):
         reload_processes = False
 
     return reload_keywords, reload_processes
-    
\ No newline at end of file
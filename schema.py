@@ -0,0 +1,267 @@
+class Keyword_schema:
+    """
+    Class which keeps every version of the keyword list and how each version became the next one,
+    so that adding, removing and renaming keywords does not rewrite every metadata file at once.
+
+    Idea:
+        - version 0 is the keyword list the schema was created with
+        - every add/remove (set_keywords) and every rename (rename) creates a new version
+        - a metadata file lists its keywords in order, this tells which version wrote it
+        - plan() maps the keywords of a file to the current keywords (renamed ones are moved, removed ones dropped),
+          the MD_files use it whenever they read and the next write (or a compaction) saves the migrated file
+
+        schema = Keyword_schema(keywords)
+        schema.rename(1, "new name")
+        schema.plan(keywords)   # = {old name: "new name"}
+    """
+    def __init__(self, keywords):
+        """
+        Initialization of the schema
+
+            keywords    - list  ... list of all metadata keywords (version 0)
+        """
+        # keyword tuple of each version
+        self.versions = [tuple(keywords)]
+        # renames (old -> new) which created each version, empty for adding and removing
+        self.renames = [{}]
+
+        # keywords of a file -> plan (the same few keyword lists are found again and again)
+        self.plans = {}
+
+    @property
+    def version(self):
+        """
+        Number of the current version
+        """
+        return len(self.versions) - 1
+
+    @property
+    def keywords(self):
+        """
+        Keywords of the current version
+        """
+        return list(self.versions[-1])
+
+    def set_keywords(self, keywords):
+        """
+        Function which adds a version with added or removed keywords
+
+            keywords    - list  ... list of all metadata keywords
+        """
+        if tuple(keywords) == self.versions[-1]:
+            return
+        self.versions.append(tuple(keywords))
+        self.renames.append({})
+        self.plans = {}
+
+    def rename(self, i, keyword):
+        """
+        Function which adds a version with one renamed keyword
+
+            i       - index     ... index of the keyword which is renamed
+            keyword - string    ... new name of the keyword
+        """
+        keywords = list(self.versions[-1])
+        old = keywords[i]
+        keywords[i] = keyword
+
+        self.versions.append(tuple(keywords))
+        self.renames.append({old: keyword})
+        self.plans = {}
+
+    def known_keywords(self):
+        """
+        Function to get every keyword of every version (old keywords are not unknown to the tool)
+
+        returns:
+            keywords    - set   ... all keywords which were ever used
+        """
+        return set(key for keywords in self.versions for key in keywords)
+
+    def follow(self, key, version):
+        """
+        Function which follows a keyword from a version to the current version
+
+            key     - string    ... keyword in that version
+            version - int       ... number of the version
+        returns:
+            key     - string    ... the current name of the keyword (None if it was removed)
+        """
+        for v in range(version + 1, len(self.versions)):
+            key = self.renames[v].get(key, key)
+            if not key in self.versions[v]:
+                return None
+        return key
+
+    def plan(self, keywords):
+        """
+        Function to get how the keywords of a file are migrated to the current version
+
+            keywords    - list  ... keywords of the file in their order
+        returns:
+            plan        - dict  ... keyword of the file -> current keyword (None if it was removed),
+                                    only the keywords which change are in it
+        """
+        keywords = tuple(keywords)
+        if keywords == self.versions[-1]:
+            return {}
+
+        plan = self.plans.get(keywords)
+        if not plan is None:
+            return plan
+
+        # a file written by the tool has exactly the keywords of one version (the latest one if a list repeats)
+        version = None
+        for v in range(len(self.versions) - 1, -1, -1):
+            if self.versions[v] == keywords:
+                version = v
+                break
+
+        current = self.versions[-1]
+        plan = {}
+        for key in keywords:
+            start = version
+            if start is None:
+                # a file of another user or a cut off file: current keywords stay as they are,
+                # old keywords are followed from the last version which had them
+                if key in current:
+                    continue
+                start = next((v for v in range(len(self.versions) - 1, -1, -1) if key in self.versions[v]), None)
+                if start is None:
+                    # unknown keyword (see recovery.find_from_other_users)
+                    continue
+
+            new = self.follow(key, start)
+            # two keywords of a file never end up in the same keyword
+            if new != key and not (version is None and new in keywords):
+                plan[key] = new
+
+        self.plans[keywords] = plan
+        return plan
+
+    def migrate(self, keywords, values):
+        """
+        Function which migrates information read with the keywords of an older version
+
+            keywords    - list  ... keywords of the file in their order
+            values      - list  ... information of each keyword
+        returns:
+            data        - dict  ... current keyword, information pairs (unknown keywords are kept as they are)
+        """
+        plan = self.plan(keywords)
+        data = {}
+        for key, info in zip(keywords, values):
+            key = plan.get(key, key)
+            if not key is None:
+                data[key] = info
+        return data
+
+    def __getstate__(self):
+        """
+        The cached plans are not pickled
+        """
+        return {"versions": self.versions, "renames": self.renames}
+
+    def __setstate__(self, state):
+        """
+        Restores a pickled schema
+        """
+        self.versions = state["versions"]
+        self.renames = state["renames"]
+        self.plans = {}
+
+
+class Schema_compaction:
+    """
+    Class which writes every metadata file which still uses the keywords of an older version,
+    so that old versions do not have to be migrated on every read.
+
+    Idea:
+        - the same batches as MD_propagation, step() handles one batch, so the GUI can run it
+          on the I/O worker between the requests of the user
+        - loaded MD_files are used as they are, the others are read without replacing the loaded ones
+
+        compaction = Schema_compaction(MD_files)
+        summary = compaction.run()  # = number of migrated and current files
+    """
+    def __init__(self, MD_files, batch_size=128):
+        """
+        Initialization of the compaction
+
+            MD_files    - MD_file_dict  ... lazy dict with one MD_file for each data file
+            batch_size  - int           ... number of files handled by one step
+        """
+        self.MD_files = MD_files
+        # the data files are listed by the first step (on the thread which uses the MD_files)
+        self.targets = None
+        self.batch_size = max(1, batch_size)
+
+        self.position = 0
+        self.cancelled = False
+        self.summary = {"files": 0, "migrated": 0, "current": 0, "failed": 0, "errors": [], "cancelled": False}
+
+    def done(self):
+        """
+        Number of files which were handled so far
+        """
+        return self.position
+
+    def finished(self):
+        """
+        Function to check if all files were handled or the compaction was cancelled
+        """
+        return self.cancelled or (not self.targets is None and self.position >= len(self.targets))
+
+    def cancel(self):
+        """
+        Function which stops the compaction before the next batch (files already migrated stay migrated)
+        """
+        self.cancelled = True
+        self.summary["cancelled"] = True
+
+    def step(self):
+        """
+        Function which handles the next batch
+
+        returns:
+            more    - bool  ... False if all files were handled or the compaction was cancelled
+        """
+        if self.finished():
+            return False
+
+        if self.targets is None:
+            self.targets = list(self.MD_files)
+            self.summary["files"] = len(self.targets)
+
+        batch = self.targets[self.position:self.position + self.batch_size]
+        with self.MD_files.transaction():
+            for path in batch:
+                # the data file could be gone in the meantime
+                if not path in self.MD_files:
+                    continue
+                try:
+                    md = self.MD_files.peek(path)
+                    if md.stale:
+                        md.write()
+                        self.summary["migrated"] += 1
+                    else:
+                        self.summary["current"] += 1
+                except Exception as e:
+                    self.summary["failed"] += 1
+                    self.summary["errors"].append({"path": path, "error": str(e)})
+
+        self.position += len(batch)
+        return not self.finished()
+
+    def run(self, progress=None):
+        """
+        Function which handles all files at once
+
+            progress    - callable  ... function(done, total) called after every batch (optional)
+        returns:
+            summary     - dict      ... number of migrated, current and failed files and the errors
+        """
+        while self.step():
+            if not progress is None:
+                progress(self.done(), self.summary["files"])
+        return self.summary
@@ -0,0 +1,214 @@
+import os
+from types import MappingProxyType
+
+
+# files of the tool inside the working directory (e.g. the metadata database) start with this
+# and are neither data files nor shown in the file browser
+TOOL_FILE_PREFIX = ".md_tool"
+
+
+class WD_snapshot:
+    """
+    Class which holds an immutable snapshot of the working directory.
+    It is created with a single os.scandir traversal and shared by everything
+    which needs to know the files in the working directory.
+
+    Idea:
+        - scandir already knows if an entry is a directory (no extra stat calls)
+        - data files, metadata files and the directory hierarchy are collected in one pass
+        - with a Scan_manifest only directories which changed since the last start are listed
+
+        snapshot = WD_snapshot(working_dir)
+        snapshot.data_files             # = all data files
+        snapshot.metadata_files         # = all metadata files
+        snapshot.children(dir)          # = (name, is_dir) pairs shown in the file browser
+        snapshot.data_files_in(dir)     # = data files in dir
+        snapshot.data_files_below(dir)  # = data files in dir and all its subdirectories
+        snapshot.rescan(dirs)           # = new snapshot where only dirs are listed again
+    """
+    def __init__(self, working_dir, manifest=None, previous=None, changed=()):
+        """
+        Initialization of the snapshot, this walks the working directory
+
+            working_dir - string/path       ... path to the working directory
+            manifest    - Scan_manifest     ... manifest of the last scan, unchanged directories are not listed again (optional)
+            previous    - WD_snapshot       ... older snapshot, its directories are not listed again (optional)
+            changed     - set               ... directories of the older snapshot which have to be listed again
+        """
+        self.working_dir = os.path.normpath(working_dir)
+
+        data_files = []
+        metadata_files = []
+        # directory -> (name, is_dir) of every entry except metadata directories
+        children = {}
+        # directory -> subdirectories
+        subdirs = {}
+        # directory -> data files directly inside
+        dir_data_files = {}
+        # directory -> everything scan_directory found
+        dir_entries = {}
+
+        # walk top down like os.walk does
+        stack = [self.working_dir]
+        while stack:
+            root = stack.pop()
+
+            # unchanged directories are taken from the older snapshot or the manifest
+            entries = None
+            if not previous is None and not root in changed:
+                entries = previous._entries.get(root)
+            if entries is None and not manifest is None and not root in changed:
+                entries = manifest.directory(root)
+            if entries is None:
+                entries = WD_snapshot.scan_directory(root)
+                if entries is None:
+                    # unreadable directories are skipped like os.walk does
+                    continue
+                if not manifest is None:
+                    manifest.set_directory(root, entries)
+
+            dir_children, dir_subdirs, descend, files, dir_metadata_files = entries
+
+            data_files.extend(files)
+            metadata_files.extend(dir_metadata_files)
+            children[root] = dir_children
+            subdirs[root] = dir_subdirs
+            dir_data_files[root] = files
+            dir_entries[root] = entries
+
+            stack.extend(reversed(descend))
+
+        self.data_files = tuple(data_files)
+        self.metadata_files = tuple(metadata_files)
+        self.directories = tuple(children.keys())
+        self._children = MappingProxyType(children)
+        self._subdirs = MappingProxyType(subdirs)
+        self._dir_data_files = MappingProxyType(dir_data_files)
+        self._entries = MappingProxyType(dir_entries)
+
+    def rescan(self, dirs, manifest=None):
+        """
+        Function which creates a new snapshot where only the given directories
+        (and directories which are new below them) are listed again
+
+            dirs        - iterable      ... paths to the changed directories
+            manifest    - Scan_manifest ... manifest which is updated with the new entries (optional)
+        returns:
+            snapshot    - WD_snapshot   ... the new snapshot
+        """
+        return WD_snapshot(self.working_dir, manifest, previous=self, changed=set(os.path.normpath(dir) for dir in dirs))
+
+    @staticmethod
+    def scan_directory(root):
+        """
+        Function which lists a single directory
+
+            root    - string/path   ... path to the directory
+        returns:
+            entries - tuple         ... (children, subdirectories, subdirectories to descend into,
+                                         data files, metadata files) or None if it is not readable
+        """
+        try:
+            with os.scandir(root) as it:
+                entries = list(it)
+        except OSError:
+            return None
+
+        # check if this is a metadata directory
+        metadata_dir = "metadata" in os.path.split(root)[1]
+
+        children = []
+        subdirs = []
+        descend = []
+        files = []
+        metadata_files = []
+        for entry in entries:
+            if entry.name.startswith(TOOL_FILE_PREFIX):
+                continue
+
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            # metadata directories are not shown in the file browser
+            if not entry.name == "metadata":
+                children.append((entry.name, is_dir))
+
+            path = os.path.join(root, entry.name)
+            if is_dir:
+                subdirs.append(path)
+                # symbolic links to directories are not followed (same as os.walk)
+                if not entry.is_symlink():
+                    descend.append(path)
+            # check if metadata is in the filename or directory above
+            elif "metadata" in entry.name or metadata_dir:
+                metadata_files.append(path)
+            else:
+                files.append(path)
+
+        return tuple(children), tuple(subdirs), tuple(descend), tuple(files), tuple(metadata_files)
+
+    def children(self, dir):
+        """
+        Function to get the entries of a directory which are shown in the file browser
+
+            dir         - string/path   ... path to the directory
+        returns:
+            children    - tuple         ... (name, is_dir) pairs in the order of the file system
+        """
+        return self._children.get(os.path.normpath(dir), ())
+
+    def data_files_in(self, dir):
+        """
+        Function to get all data files in a directory
+
+            dir         - string/path   ... path to the directory
+        returns:
+            data_files  - tuple         ... paths to the data files
+        """
+        return self._dir_data_files.get(os.path.normpath(dir), ())
+
+    def data_files_below(self, dir):
+        """
+        Function to get all data files in a directory and all its subdirectories
+
+            dir         - string/path   ... path to the directory
+        returns:
+            data_files  - list          ... paths to the data files
+        """
+        data_files = []
+        stack = [os.path.normpath(dir)]
+        while stack:
+            root = stack.pop()
+            data_files.extend(self._dir_data_files.get(root, ()))
+            stack.extend(reversed(self._subdirs.get(root, ())))
+        return data_files
+
+    def __str__(self):
+        """
+        Defines a string representation for the class so that its printable
+        """
+        return "WD_snapshot(" + self.working_dir + ": " + str(len(self.data_files)) + " data files, " \
+               + str(len(self.metadata_files)) + " metadata files, " + str(len(self.directories)) + " directories)"
+
+
+def walk_data_files(working_dir):
+    """
+    Generator which walks the working directory like WD_snapshot does but yields the data files one by one,
+    only the directories which are not listed yet are kept (for exports of very large trees)
+
+        working_dir - string/path   ... path to the working directory
+    yields:
+        path        - string        ... path to a data file
+    """
+    stack = [os.path.normpath(working_dir)]
+    while stack:
+        root = stack.pop()
+        entries = WD_snapshot.scan_directory(root)
+        if entries is None:
+            continue
+
+        _, _, descend, files, _ = entries
+        yield from files
+        stack.extend(reversed(descend))
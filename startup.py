@@ -0,0 +1,237 @@
+import time
+from utils import *
+from snapshot import WD_snapshot
+import instrumentation
+
+
+# number of MD_files which are loaded by one step in the background
+PRELOAD_CHUNK = 256
+
+
+class Startup:
+    """
+    Class which loads the working directory behind the already shown main window.
+
+    Idea:
+        - the main window is shown right after the working directory was picked
+        - the steps run on the I/O worker of the GUI one after another,
+          the dialogs of the recovery run on the main thread between them
+        - the tree is filled as soon as the working directory was scanned (the user can browse),
+          the MD_files are created afterwards, requests of the user wait for them on the I/O worker
+        - the first MD_files are loaded in chunks between the requests of the user (MD_TOOL_PRELOAD)
+        - the time until the window is shown, until the tree can be used and until the metadata
+          is ready is recorded (MD_TOOL_PROFILE)
+
+        startup = Startup(gui, working_dir, keywords, processes, schema, start)
+        startup.start()
+        gui.start_mainloop()
+    """
+    def __init__(self, gui, working_dir, keywords, processes, schema, start=None):
+        """
+        Initialization of the startup
+
+            gui         - GUI               ... the shown main window (without MD_files)
+            working_dir - string            ... path to the working directory
+            keywords    - list              ... list containing all metadata keywords
+            processes   - PD_handler        ... object which handels the process descriptions
+            schema      - Keyword_schema    ... versions of the keywords
+            start       - float             ... time.perf_counter() when the tool was started (default now)
+        """
+        self.gui = gui
+        self.working_dir = working_dir
+        self.keywords = keywords
+        self.processes = processes
+        self.schema = schema
+        self.start_time = time.perf_counter() if start is None else start
+
+        # created by the steps on the I/O worker
+        self.journal = None
+        self.store = None
+        self.manifest = None
+        self.snapshot = None
+        self.moves = []
+        self.MD_files = None
+
+        # data files which are loaded in the background and how many of them are loaded
+        self.preload_paths = []
+        self.preloaded = 0
+
+    def record(self, name):
+        """
+        Function which records the seconds since the start of the tool
+        """
+        instrumentation.record(name, time.perf_counter() - self.start_time)
+
+    def start(self):
+        """
+        Function which shows the window and requests the first step
+        """
+        self.gui.master.update_idletasks()
+        self.record("startup: window shown")
+
+        self.gui.show_status("scanning the working directory")
+        self.gui.io.submit(self.scan, callback=self.on_scanned, errback=self.on_error)
+
+    def scan(self):
+        """
+        Function which replays the journal, scans the working directory and searches
+        for keywords and processes of other users (runs on the I/O worker,
+        if it fails the error is shown and the tool stays empty, see on_error)
+
+        returns:
+            found   - tuple ... unknown keywords and process descriptions
+        """
+        from journal import Write_journal
+        from manifest import Scan_manifest
+        from moves import reconcile_moves
+        from recovery import find_from_other_users
+
+        # write again what a crash of the last run interrupted
+        self.journal = Write_journal(self.working_dir, DEFAULT_WORKERS)
+        with instrumentation.phase("journal replay"):
+            self.journal.replay()
+
+        with instrumentation.phase("scan"):
+            # load what the last start found in this working directory
+            self.manifest = Scan_manifest(self.working_dir)
+
+            # walk the working directory once, everything below uses this snapshot
+            self.snapshot = WD_snapshot(self.working_dir, self.manifest)
+
+            # the metadata follows data files which were renamed or moved since the last start
+            if DEFAULT_BACKEND == "sqlite":
+                from md_sqlite import MD_store
+
+                # the metadata is kept in one database (only used on the I/O worker)
+                self.store = MD_store(self.working_dir)
+            self.moves = reconcile_moves(self.snapshot, self.manifest, self.store)
+            if len(self.moves) > 0:
+                # only the directories which changed are listed again
+                self.snapshot = WD_snapshot(self.working_dir, self.manifest)
+
+        # search for unkown keywords or processes in the working directory
+        with instrumentation.phase("recovery"):
+            found = find_from_other_users(self.working_dir, self.keywords, self.processes, self.snapshot,
+                                          self.manifest, DEFAULT_WORKERS, self.schema)
+
+        # save the manifest for the next start
+        self.manifest.save(self.snapshot)
+        return found
+
+    def on_scanned(self, found):
+        """
+        Function which asks to import unknown keywords and processes, fills the tree
+        and requests the creation of the MD_files (callback of scan)
+
+            found   - tuple ... unknown keywords and process descriptions
+        """
+        from recovery import ask_to_import
+
+        reload_keywords, reload_processes = ask_to_import(self.keywords, self.processes, *found)
+
+        if reload_keywords:
+            self.keywords = load_keywords()
+            self.schema.set_keywords(self.keywords)
+            self.gui.keywords = self.keywords
+
+        if reload_processes:
+            self.processes = load_processes()
+            self.gui.processes = self.processes
+
+        # the user can browse the working directory from now on
+        with instrumentation.phase("tree build"):
+            self.gui.show_snapshot(self.snapshot)
+        self.record("startup: first interaction")
+
+        self.gui.show_status("loading metadata")
+        self.gui.io.submit(self.build, callback=self.on_built, errback=self.on_error)
+
+    def build(self):
+        """
+        Function which creates the MD_files and the process index (runs on the I/O worker)
+
+        returns:
+            process_index   - PD_index  ... index of the process descriptions (None if the GUI builds it later)
+        """
+        from md_index import PD_index
+
+        data_file_list = create_data_file_list(self.working_dir, self.snapshot)
+
+        with instrumentation.phase("dict build"):
+            store = self.store
+            if not store is None:
+                # metadata files changed by others are taken over
+                store.import_text(data_file_list, self.keywords, schema=self.schema)
+
+            MD_files = create_MD_file_dict(data_file_list, self.keywords, manifest=self.manifest, workers=DEFAULT_WORKERS,
+                                           store=store, journal=self.journal, schema=self.schema)
+
+            # index the process descriptions with the headers read by the recovery
+            process_index = PD_index(self.keywords[0])
+            if store is None and process_index.build_from_manifest(data_file_list, self.manifest):
+                MD_files.attach_index(process_index, build=False)
+            else:
+                # the GUI builds it when it is needed
+                process_index = None
+
+        # requests of the user which were submitted in the meantime run right after this one
+        self.gui.MD_files = MD_files
+        self.MD_files = MD_files
+
+        if DEFAULT_PRELOAD == "on":
+            n = len(data_file_list) if MD_files.max_entries is None else min(len(data_file_list), MD_files.max_entries)
+            self.preload_paths = data_file_list[:n]
+        return process_index
+
+    def on_built(self, process_index):
+        """
+        Function which hands the MD_files to the GUI and starts loading the first MD_files (callback of build)
+
+            process_index   - PD_index  ... index of the process descriptions (None if the GUI builds it later)
+        """
+        watcher = None
+        if DEFAULT_WATCH != "off":
+            from watcher import WD_watcher
+
+            # new and removed data files are shown without a restart
+            watcher = WD_watcher(self.snapshot.directories, mode=DEFAULT_WATCH)
+            watcher.start()
+
+        self.gui.attach(self.MD_files, process_index, watcher)
+        self.record("startup: metadata ready")
+
+        self.on_preload_step(True)
+
+    def preload_step(self):
+        """
+        Function which loads the next chunk of MD_files (runs on the I/O worker)
+
+        returns:
+            more    - bool  ... False if all chunks were loaded
+        """
+        chunk = self.preload_paths[self.preloaded:self.preloaded + PRELOAD_CHUNK]
+        self.MD_files.preload(chunk)
+        self.preloaded += len(chunk)
+        return self.preloaded < len(self.preload_paths)
+
+    def on_preload_step(self, more):
+        """
+        Function which shows the progress of the loading and requests the next chunk
+
+            more    - bool  ... False if all chunks were loaded
+        """
+        if more and self.preloaded < len(self.preload_paths):
+            self.gui.show_status("loading metadata", self.preloaded, len(self.preload_paths))
+            self.gui.io.submit(self.preload_step, callback=self.on_preload_step, errback=self.on_error)
+            return
+
+        self.gui.hide_status()
+        if len(self.preload_paths) > 0:
+            self.record("startup: metadata loaded")
+
+    def on_error(self, error):
+        """
+        Function which hides the status line if a step failed (errback of the steps,
+        the error itself is shown by the GUI)
+        """
+        self.gui.hide_status()
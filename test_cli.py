@@ -0,0 +1,83 @@
+import os
+import json
+import cli
+from journal import Write_journal
+from md_file import MD_file
+from process_description import PD_handler
+from utils import save_keywords, save_processes, load_keywords, load_schema
+
+
+KEYWORDS = ["process", "sample", "author"]
+
+
+def setup_tool(tmp_path, monkeypatch, names):
+    """
+    Creates keywords.pkl, processes.pkl and the data files of a working directory
+    """
+    monkeypatch.chdir(tmp_path)
+    save_keywords(list(KEYWORDS))
+    processes = PD_handler()
+    processes.add("Etching", "etch for 5 min")
+    save_processes(processes)
+
+    paths = []
+    for name in names:
+        path = tmp_path / "wd" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("data")
+        paths.append(str(path))
+    return str(tmp_path / "wd"), paths
+
+
+def run(capsys, *argv):
+    code = cli.main(list(argv))
+    out, err = capsys.readouterr()
+    return code, json.loads((out or err).strip().splitlines()[-1])
+
+
+def test_set_then_search_and_export_with_several_workers(tmp_path, monkeypatch, capsys):
+    wd, (a, b, c) = setup_tool(tmp_path, monkeypatch, ["a.dat", "sub/b.dat", "sub/c.dat"])
+
+    code, summary = run(capsys, "-d", wd, "-w", "4", "set", a, b, "-v", "process=Etching", "-v", "author=smith")
+    assert code == 0 and summary["failed"] == 0
+    # the metadata files are written when main returns and nothing is left in the journal
+    assert MD_file(b, KEYWORDS, exists=True)["author"] == "smith"
+    assert os.path.getsize(Write_journal(wd).path) == 0
+
+    code, summary = run(capsys, "-d", wd, "-w", "4", "search", "author:smith")
+    assert code == 0 and summary["files"] == 3 and summary["paths"] == sorted([a, b])
+
+    output = str(tmp_path / "metadata.jsonl")
+    code, summary = run(capsys, "-d", wd, "-w", "4", "export", "-o", output)
+    assert code == 0 and summary["exported"] == 3
+    with open(output) as f:
+        records = {record["path"]: record for record in map(json.loads, f)}
+    assert records[a]["process name"] == "Etching" and records[a]["process"] == "etch for 5 min"
+    assert records[c]["author"] == ""
+
+
+def test_scan_counts_missing_metadata(tmp_path, monkeypatch, capsys):
+    wd, (a, b) = setup_tool(tmp_path, monkeypatch, ["a.dat", "sub/b.dat"])
+    MD_file(a, KEYWORDS)
+
+    code, summary = run(capsys, "-d", wd, "scan")
+    assert code == 0
+    assert (summary["files"], summary["metadata_files"], summary["missing_metadata"]) == (2, 1, 1)
+
+
+def test_rename_keyword_saves_keywords_and_schema(tmp_path, monkeypatch, capsys):
+    wd, (a,) = setup_tool(tmp_path, monkeypatch, ["a.dat"])
+    MD_file(a, KEYWORDS).update({"author": "smith"})
+
+    code, summary = run(capsys, "-d", wd, "rename-keyword", "author", "owner", "--lazy")
+    assert code == 0 and summary["keywords_saved"]
+    keywords = load_keywords()
+    assert keywords == ["process", "sample", "owner"]
+    # the old file is migrated when it is read
+    assert MD_file(a, keywords, exists=True, schema=load_schema(keywords))["owner"] == "smith"
+
+
+def test_unknown_keyword_is_an_error(tmp_path, monkeypatch, capsys):
+    wd, (a,) = setup_tool(tmp_path, monkeypatch, ["a.dat"])
+    code, summary = run(capsys, "-d", wd, "set", a, "-v", "unknown=x")
+    assert code == 1 and summary["error"] == "unknown keyword: unknown"
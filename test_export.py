@@ -0,0 +1,77 @@
+import io
+import csv
+import json
+from md_file import MD_file
+from export import MD_export, map_ordered, get_fields
+from process_description import PD_handler
+from snapshot import walk_data_files
+
+
+KEYWORDS = ["process", "sample"]
+
+
+def create_tree(tmp_path):
+    processes = PD_handler()
+    processes.add("Etching", "etch for 5 min")
+    paths = []
+    for i, name in enumerate(["a.dat", "sub/b.dat", "sub/c.dat"]):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text("data")
+        paths.append(str(path))
+    # the process description is saved as text, as ID and not at all
+    MD_file(paths[0], KEYWORDS).update({"process": "etch for 5 min", "sample": "S1"})
+    MD_file(paths[1], KEYWORDS).update({"process": processes.get_value("Etching", True), "sample": "S2, \"quoted\""})
+    MD_file(paths[2], KEYWORDS).update({"sample": "S3"})
+    return paths, processes
+
+
+def test_csv_export_of_a_small_tree(tmp_path):
+    paths, processes = create_tree(tmp_path)
+    output = str(tmp_path / "metadata.csv")
+    summary = MD_export(walk_data_files(str(tmp_path)), output, KEYWORDS, processes, workers=4, batch_size=2).run()
+
+    assert summary["format"] == "csv" and summary["exported"] == 3 and summary["failed"] == 0
+    with open(output, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0].keys()) == get_fields(KEYWORDS)
+    assert [row["path"] for row in rows] == list(walk_data_files(str(tmp_path)))
+    by_path = {row["path"]: row for row in rows}
+    # the ID is exported as the text of the description
+    assert by_path[paths[1]]["process"] == "etch for 5 min" and by_path[paths[1]]["process name"] == "Etching"
+    assert by_path[paths[1]]["sample"] == "S2, \"quoted\""
+    assert by_path[paths[2]]["process name"] == "No Description"
+
+
+def test_jsonl_export_to_an_open_file(tmp_path):
+    paths, processes = create_tree(tmp_path)
+    output = io.StringIO()
+    summary = MD_export(paths, output, KEYWORDS, processes).run()
+
+    assert summary["format"] == "jsonl" and summary["exported"] == 3
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert records[0] == {"path": paths[0], "process name": "Etching", "process": "etch for 5 min", "sample": "S1"}
+    assert [record["path"] for record in records] == paths
+
+
+def test_cancel_keeps_the_records_written_so_far(tmp_path):
+    paths, processes = create_tree(tmp_path)
+    output = io.StringIO()
+    export = MD_export(paths, output, KEYWORDS, processes, batch_size=1)
+
+    assert export.step()
+    export.cancel()
+    assert not export.step()
+    assert export.summary["cancelled"] and export.done() == 1
+    assert len(output.getvalue().splitlines()) == 1
+
+
+def test_map_ordered_keeps_the_order_and_reports_errors():
+    def square(i):
+        if i == 3:
+            raise ValueError("three")
+        return i * i
+
+    results = list(map_ordered(square, iter(range(20)), workers=4, window=3))
+    assert [item for item, _, _ in results] == list(range(20))
+    assert results[2] == (2, 4, None) and results[3] == (3, None, "three")
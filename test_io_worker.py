@@ -0,0 +1,90 @@
+import threading
+from io_worker import IO_worker
+
+
+class Fake_master:
+    """
+    Stand-in for the Tk main window, after() only remembers the scheduled calls
+    """
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, function):
+        self.scheduled.append(function)
+
+    def run_until_idle(self, worker):
+        # like the Tk main loop, but without waiting between the polls
+        while len(self.scheduled) > 0:
+            worker.requests.join()
+            self.scheduled.pop(0)()
+
+
+def test_requests_run_in_order_on_one_thread():
+    master = Fake_master()
+    worker = IO_worker(master)
+    threads = []
+    results = []
+    for i in range(50):
+        worker.submit(lambda i=i: (threads.append(threading.current_thread()), i)[1], callback=results.append)
+    master.run_until_idle(worker)
+    worker.stop()
+
+    assert results == list(range(50))
+    assert len(set(threads)) == 1 and threads[0] is not threading.current_thread()
+    # the main loop stops polling once everything is done
+    assert not worker.polling and master.scheduled == []
+
+
+def test_failed_request_calls_errback_and_on_error():
+    master = Fake_master()
+    errors = []
+    worker = IO_worker(master, on_error=lambda e: errors.append(("on_error", str(e))))
+    results = []
+
+    def fail():
+        raise OSError("disc full")
+
+    worker.submit(fail, callback=results.append, errback=lambda e: errors.append(("errback", str(e))))
+    worker.submit(lambda: "after", callback=results.append)
+    master.run_until_idle(worker)
+    worker.stop()
+
+    # the errback runs instead of the callback and before on_error, later requests still run
+    assert errors == [("errback", "disc full"), ("on_error", "disc full")]
+    assert results == ["after"]
+
+
+def test_failing_callback_is_reported_and_does_not_stop_polling():
+    master = Fake_master()
+    errors = []
+    worker = IO_worker(master, on_error=errors.append)
+    results = []
+
+    def broken(result):
+        raise ValueError("broken callback")
+
+    worker.submit(lambda: 1, callback=broken)
+    worker.submit(lambda: 2, callback=results.append)
+    master.run_until_idle(worker)
+    worker.stop()
+
+    assert [str(e) for e in errors] == ["broken callback"]
+    assert results == [2]
+
+
+def test_drain_waits_for_requests_and_runs_callbacks():
+    master = Fake_master()
+    worker = IO_worker(master)
+    release = threading.Event()
+    results = []
+
+    worker.submit(release.wait, callback=lambda _: results.append("slow"))
+    worker.submit(lambda: "fast", callback=results.append)
+    assert worker.busy()
+
+    release.set()
+    # no poll of the main loop is needed
+    worker.drain()
+    assert results == ["slow", "fast"]
+    assert not worker.busy()
+    worker.stop()
@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import subprocess
+import journal
+from journal import Write_journal, encode_group, decode_groups
+
+
+def test_decode_groups_returns_committed_groups():
+    data = encode_group([("a", "1"), ("b", "2")]) + encode_group([("a", "3")])
+    assert decode_groups(data) == [[("a", "1"), ("b", "2")], [("a", "3")]]
+
+
+def test_decode_groups_ignores_torn_last_group():
+    first = encode_group([("a", "1")])
+    second = encode_group([("a", "2"), ("b", "3")])
+    # every cut inside the second group keeps only the first one
+    for cut in range(len(second)):
+        assert decode_groups(first + second[:cut]) == [[("a", "1")]]
+
+
+def test_decode_groups_ignores_corrupt_group():
+    first = encode_group([("a", "1")])
+    second = bytearray(encode_group([("a", "2")]))
+    # change the content without changing its length
+    second[second.index(b"2")] = ord("x")
+    assert decode_groups(first + bytes(second)) == [[("a", "1")]]
+
+
+def test_decode_groups_keeps_separators_and_newlines():
+    content = "path to data file: x\n\nkey::  a::  b\n"
+    assert decode_groups(encode_group([("p", content)])) == [[("p", content)]]
+
+
+def write_journal(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_replay_writes_last_committed_content(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    target = str(tmp_path / "wd" / "metadata" / "a-metadata.txt")
+    other = str(tmp_path / "wd" / "metadata" / "b-metadata.txt")
+
+    j = Write_journal(str(tmp_path / "wd"))
+    # the torn group of the crash is not written
+    write_journal(j.path, encode_group([(target, "old")]) + encode_group([(target, "new")])
+                  + encode_group([(other, "torn")])[:-3])
+
+    assert j.replay() == 1
+    with open(target) as f:
+        assert f.read() == "new"
+    assert not os.path.exists(other)
+    # the journal is empty after the checkpoint
+    assert os.path.getsize(j.path) == 0
+    j.close()
+
+
+def test_replay_skips_files_which_are_up_to_date(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    target = tmp_path / "a.txt"
+    target.write_text("same")
+
+    j = Write_journal(str(tmp_path))
+    write_journal(j.path, encode_group([(str(target), "same")]))
+    assert j.replay() == 0
+    j.close()
+
+
+def test_writes_outside_of_a_transaction_are_committed_together(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    commits = []
+    j = Write_journal(str(tmp_path))
+    commit = j.commit
+    monkeypatch.setattr(j, "commit", lambda: commits.append(len(j.pending)) or commit())
+
+    a, b = str(tmp_path / "a.txt"), str(tmp_path / "b.txt")
+    j.write(a, "1")
+    j.write(b, "2")
+    # the content is readable before it is committed
+    assert j.read(a) == "1"
+
+    time.sleep(journal.COMMIT_DELAY * 10)
+    assert commits == [2]
+    assert j.read(a) is None
+    with open(b) as f:
+        assert f.read() == "2"
+    j.close()
+
+
+def test_close_commits_pending_writes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    j = Write_journal(str(tmp_path))
+    a = str(tmp_path / "a.txt")
+    j.write(a, "1")
+    j.close()
+    with open(a) as f:
+        assert f.read() == "1"
+
+
+EXIT_SCRIPT = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from journal import Write_journal
+
+j = Write_journal(sys.argv[2], workers=8)
+with j.transaction():
+    for i in range(20):
+        j.write(sys.argv[2] + "/metadata/%d-metadata.txt" % i, "first")
+# the program ends before these writes are committed and without closing the journal
+for i in range(20):
+    j.write(sys.argv[2] + "/metadata/%d-metadata.txt" % i, "second")
+"""
+
+
+def test_program_end_commits_pending_writes_with_several_workers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wd = str(tmp_path / "wd")
+    script = tmp_path / "script.py"
+    script.write_text(EXIT_SCRIPT)
+
+    result = subprocess.run([sys.executable, str(script), os.path.dirname(os.path.abspath(journal.__file__)), wd],
+                            cwd=str(tmp_path), capture_output=True, text=True)
+    assert result.returncode == 0
+    assert result.stderr == ""
+
+    for i in range(20):
+        with open(os.path.join(wd, "metadata", "%d-metadata.txt" % i)) as f:
+            assert f.read() == "second"
+    # nothing is left for the next replay
+    assert os.path.getsize(Write_journal(wd).path) == 0
@@ -0,0 +1,104 @@
+import os
+import time
+import pickle
+from snapshot import WD_snapshot
+from manifest import Scan_manifest
+
+
+def create(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("data")
+
+
+def age(path, seconds=60):
+    """
+    Sets the mtime of a file or directory to the past, so it is not racy
+    """
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def count_scans(monkeypatch):
+    scanned = []
+    scan_directory = WD_snapshot.scan_directory
+
+    def counting(root):
+        scanned.append(root)
+        return scan_directory(root)
+
+    monkeypatch.setattr(WD_snapshot, "scan_directory", staticmethod(counting))
+    return scanned
+
+
+def first_scan(wd):
+    manifest = Scan_manifest(wd)
+    snapshot = WD_snapshot(wd, manifest)
+    manifest.save(snapshot)
+    return snapshot
+
+
+def test_unchanged_directories_are_served_from_the_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wd = str(tmp_path / "wd")
+    create(os.path.join(wd, "a.dat"))
+    create(os.path.join(wd, "sub", "b.dat"))
+    age(os.path.join(wd, "sub"))
+    age(wd)
+    snapshot = first_scan(wd)
+
+    scanned = count_scans(monkeypatch)
+    assert WD_snapshot(wd, Scan_manifest(wd)).data_files == snapshot.data_files
+    assert scanned == []
+
+
+def test_changed_directories_are_scanned_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wd = str(tmp_path / "wd")
+    create(os.path.join(wd, "a.dat"))
+    create(os.path.join(wd, "sub", "b.dat"))
+    age(os.path.join(wd, "sub"), 120)
+    age(wd, 120)
+    first_scan(wd)
+
+    create(os.path.join(wd, "sub", "c.dat"))
+    age(os.path.join(wd, "sub"))
+    scanned = count_scans(monkeypatch)
+    snapshot = WD_snapshot(wd, Scan_manifest(wd))
+
+    assert scanned == [os.path.join(wd, "sub")]
+    assert os.path.join(wd, "sub", "c.dat") in snapshot.data_files
+
+
+def test_directories_with_a_racy_mtime_are_scanned_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wd = str(tmp_path / "wd")
+    create(os.path.join(wd, "a.dat"))
+    create(os.path.join(wd, "sub", "b.dat"))
+    age(wd)
+    # sub was modified just before the scan, a change within the same mtime would be missed
+    first_scan(wd)
+
+    scanned = count_scans(monkeypatch)
+    WD_snapshot(wd, Scan_manifest(wd))
+    assert scanned == [os.path.join(wd, "sub")]
+
+
+def test_manifest_of_another_version_leads_to_a_full_scan(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wd = str(tmp_path / "wd")
+    create(os.path.join(wd, "a.dat"))
+    age(wd)
+    first_scan(wd)
+
+    manifest = Scan_manifest(wd)
+    with open(manifest.path, "rb") as f:
+        saved = pickle.load(f)
+    saved["version"] = -1
+    with open(manifest.path, "wb") as f:
+        pickle.dump(saved, f)
+    assert Scan_manifest(wd).directories == {}
+
+    with open(manifest.path, "wb") as f:
+        f.write(b"broken")
+    assert Scan_manifest(wd).directories == {}
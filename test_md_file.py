@@ -0,0 +1,76 @@
+import os
+from md_file import MD_file, parse_lines, parse_metadata, get_metadata_path, PATH_PREFIX, SEPARATOR
+
+
+def test_parse_lines_reads_path_keywords_and_values():
+    lines = [PATH_PREFIX + "/data/a.dat\n", "\n", "process::  heat\n", "author::  me\n"]
+    assert parse_lines(lines) == ("/data/a.dat", ["process", "author"], ["heat", "me"])
+
+
+def test_parse_lines_keeps_separators_inside_values():
+    lines = [PATH_PREFIX + "x", "", "note::  a::  b", "url::  http://x::  y"]
+    _, keywords, values = parse_lines(lines)
+    assert keywords == ["note", "url"]
+    assert values == ["a::  b", "http://x::  y"]
+
+
+def test_parse_lines_without_line_endings_and_empty_values():
+    _, keywords, values = parse_lines([PATH_PREFIX + "x", "", "a::  ", "b::  1"])
+    assert keywords == ["a", "b"]
+    assert values == ["", "1"]
+
+
+def test_parse_lines_skips_cut_off_lines_and_missing_path():
+    data_path, keywords, values = parse_lines(["something else", "", "a::  1", "cut off line", "b::  2"])
+    assert data_path is None
+    assert keywords == ["a", "b"]
+    assert values == ["1", "2"]
+
+
+def test_parse_lines_header_only_and_limit():
+    lines = [PATH_PREFIX + "x", "", "a::  1", "b::  2", "c::  3"]
+    assert parse_lines(lines, header_only=True) == ("x", ["a", "b", "c"], ["1"])
+    assert parse_lines(lines, limit=2) == ("x", ["a", "b"], ["1", "2"])
+
+
+def test_parse_lines_of_empty_file():
+    assert parse_lines([]) == (None, [], [])
+
+
+def test_md_file_round_trip(tmp_path):
+    path = str(tmp_path / "a.dat")
+    md = MD_file(path, ["process", "note"])
+    md.update({"process": "heat", "note": "x" + SEPARATOR + "y"})
+
+    data_path, keywords, values = parse_metadata(get_metadata_path(path))
+    assert data_path == path
+    assert keywords == ["process", "note"]
+    assert values == ["heat", "x" + SEPARATOR + "y"]
+    assert MD_file(path, ["process", "note"], exists=True).data == {"process": "heat", "note": "x" + SEPARATOR + "y"}
+
+
+def test_md_file_writes_once_per_batch(tmp_path):
+    path = str(tmp_path / "a.dat")
+    md = MD_file(path, ["a", "b"])
+    metadata_path = get_metadata_path(path)
+    os.remove(metadata_path)
+
+    with md.batch():
+        md["a"] = "1"
+        md["b"] = "2"
+        # nothing is written inside the batch
+        assert not os.path.exists(metadata_path)
+    assert parse_metadata(metadata_path)[2] == ["1", "2"]
+
+
+def test_unchanged_update_does_not_write(tmp_path):
+    path = str(tmp_path / "a.dat")
+    md = MD_file(path, ["a", "b"])
+    md.update({"a": "1"})
+    metadata_path = get_metadata_path(path)
+    os.remove(metadata_path)
+
+    assert not md.update({"a": "1"})
+    assert not os.path.exists(metadata_path)
+    assert md.update({"a": "2", "b": "3"})
+    assert parse_metadata(metadata_path)[2] == ["2", "3"]
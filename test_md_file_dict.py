@@ -0,0 +1,102 @@
+import os
+from md_file import get_metadata_path
+from md_file_dict import MD_file_dict
+from md_index import MD_index
+
+
+def create_files(tmp_path, n):
+    paths = []
+    for i in range(n):
+        path = str(tmp_path / ("f%d.dat" % i))
+        with open(path, "w") as f:
+            f.write("data")
+        paths.append(path)
+    return paths
+
+
+def test_md_files_are_loaded_on_first_access(tmp_path):
+    paths = create_files(tmp_path, 3)
+    MD_files = MD_file_dict(paths, ["a"])
+    assert len(MD_files) == 3
+    assert not any(MD_files.is_loaded(path) for path in paths)
+
+    MD_files[paths[1]]["a"] = "1"
+    assert MD_files.is_loaded(paths[1])
+    assert not os.path.exists(get_metadata_path(paths[0]))
+
+
+def test_least_recently_used_md_files_are_dropped(tmp_path):
+    paths = create_files(tmp_path, 4)
+    MD_files = MD_file_dict(paths, ["a"], max_entries=2)
+    MD_files[paths[0]]
+    MD_files[paths[1]]
+    # paths[0] becomes the most recently used one
+    MD_files[paths[0]]
+    MD_files[paths[2]]
+    assert [MD_files.is_loaded(path) for path in paths] == [True, False, True, False]
+
+
+def test_size_cap_drops_md_files(tmp_path):
+    paths = create_files(tmp_path, 3)
+    for path in paths:
+        MD_file_dict([path], ["a"])[path]["a"] = "x" * 100
+    MD_files = MD_file_dict(paths, ["a"], max_entries=None, max_bytes=250)
+    for path in paths:
+        MD_files[path]
+    assert MD_files.loaded_bytes <= 250
+    assert MD_files.is_loaded(paths[2])
+
+
+def test_eviction_keeps_unsaved_changes(tmp_path):
+    paths = create_files(tmp_path, 3)
+    MD_files = MD_file_dict(paths, ["a"], max_entries=1)
+    MD_files[paths[0]].update({"a": "1"}, write=False)
+
+    # the least recently used file is written before it is dropped
+    MD_files[paths[1]]
+    assert not MD_files.is_loaded(paths[0])
+    assert MD_files.read_data(paths[0]) == {"a": "1"}
+
+
+def test_eviction_keeps_md_files_which_can_not_be_written(tmp_path):
+    paths = create_files(tmp_path, 3)
+    MD_files = MD_file_dict(paths, ["a"], max_entries=1)
+    MD_files[paths[0]].update({"a": "1"}, write=False)
+
+    # a directory in place of the metadata file makes the write fail
+    metadata_path = get_metadata_path(paths[0])
+    os.remove(metadata_path)
+    os.mkdir(metadata_path)
+    MD_files[paths[1]]
+    assert MD_files.is_loaded(paths[0])
+
+    os.rmdir(metadata_path)
+    MD_files[paths[2]]
+    assert not MD_files.is_loaded(paths[0])
+    assert MD_files.read_data(paths[0]) == {"a": "1"}
+
+
+def test_read_items_does_not_create_metadata_files(tmp_path):
+    paths = create_files(tmp_path, 3)
+    MD_files = MD_file_dict(paths, ["a", "b"], workers=2)
+    MD_files[paths[0]]["a"] = "1"
+
+    assert dict(MD_files.read_items()) == {paths[0]: {"a": "1", "b": ""}, paths[1]: {"a": "", "b": ""},
+                                           paths[2]: {"a": "", "b": ""}}
+    assert not os.path.exists(get_metadata_path(paths[1]))
+
+
+def test_rename_moves_metadata_and_updates_indexes(tmp_path):
+    old, other = create_files(tmp_path, 2)
+    MD_files = MD_file_dict([old, other], ["a"])
+    MD_files[old]["a"] = "alice"
+    index = MD_index()
+    MD_files.attach_index(index)
+
+    new = str(tmp_path / "renamed.dat")
+    os.rename(old, new)
+    assert MD_files.rename(old, new)
+    assert not old in MD_files and new in MD_files
+    assert index.query("alice") == {new}
+    assert MD_files.read_data(new) == {"a": "alice"}
+    assert not os.path.exists(get_metadata_path(old))
@@ -0,0 +1,43 @@
+from md_index import MD_index, tokenize
+
+
+def create_index():
+    index = MD_index()
+    index.add("a", {"author": "John Smith", "location": "Lab 2", "sensor": "thermo-1"})
+    index.add("b", {"author": "Jane Smithson", "location": "Lab 3", "sensor": "pressure"})
+    index.add("c", {"author": "Smith", "location": "Lab 2", "sensor": ""})
+    return index
+
+
+def test_tokenize():
+    assert tokenize("John SMITH, lab-2") == {"john", "smith", "lab", "2"}
+
+
+def test_query_words_and_prefixes():
+    index = create_index()
+    assert index.query("smith") == {"a", "c"}
+    assert index.query("smith*") == {"a", "b", "c"}
+    assert index.query("author:jane") == {"b"}
+    assert index.query("location:jane") == set()
+
+
+def test_query_and_or_and_exact():
+    index = create_index()
+    assert index.query("smith lab") == {"a", "c"}
+    assert index.query('location:"Lab 2"') == {"a", "c"}
+    assert index.query('location:"Lab 2" thermo') == {"a"}
+    assert index.query("pressure OR author:john") == {"a", "b"}
+
+
+def test_index_follows_changes():
+    index = create_index()
+    index.change("a", "author", "John Smith", "Alice")
+    assert index.query("smith") == {"c"}
+    assert index.query("alice") == {"a"}
+
+    index.remove("c", {"author": "Smith", "location": "Lab 2", "sensor": ""})
+    assert index.query("smith*") == {"b"}
+
+    index.rename_keyword("author", "name")
+    assert index.query("name:alice") == {"a"}
+    assert index.query("author:alice") == set()
@@ -0,0 +1,82 @@
+import os
+from md_file import MD_file, get_metadata_path
+from md_sqlite import MD_store, MD_sqlite_file, STORE_NAME
+from snapshot import WD_snapshot
+
+
+def create_files(tmp_path, n):
+    paths = []
+    for i in range(n):
+        path = str(tmp_path / ("f%d.dat" % i))
+        with open(path, "w") as f:
+            f.write("data")
+        paths.append(path)
+    return paths
+
+
+def test_sqlite_file_reads_and_writes_through_the_store(tmp_path):
+    path, = create_files(tmp_path, 1)
+    store = MD_store(str(tmp_path))
+    md = MD_sqlite_file(path, ["a", "b"], store)
+    md["a"] = "alice"
+    md.update({"b": "bob"})
+
+    assert store.read(path) == {"a": "alice", "b": "bob"}
+    assert MD_sqlite_file(path, ["a", "b"], store).data == {"a": "alice", "b": "bob"}
+    assert store.find("a", "alice") == [path]
+    # no metadata text file is written and the database is no data file
+    assert not os.path.exists(get_metadata_path(path))
+    assert WD_snapshot(str(tmp_path)).data_files == (path,)
+    assert os.path.isfile(str(tmp_path / STORE_NAME))
+    store.close()
+
+
+def test_existing_metadata_file_is_taken_over(tmp_path):
+    path, = create_files(tmp_path, 1)
+    MD_file(path, ["a", "b"]).update({"a": "from text"})
+    store = MD_store(str(tmp_path))
+
+    assert MD_sqlite_file(path, ["a", "b"], store)["a"] == "from text"
+    assert store.exists(path)
+    store.close()
+
+
+def test_rename_moves_the_stored_metadata(tmp_path):
+    old, new = create_files(tmp_path, 2)
+    store = MD_store(str(tmp_path))
+    MD_sqlite_file(old, ["a"], store)["a"] = "old"
+    MD_sqlite_file(new, ["a"], store)["a"] = "new"
+
+    assert store.rename(old, new)
+    # the metadata of the old path wins
+    assert store.read(new) == {"a": "old"}
+    assert not store.exists(old)
+    assert not store.rename(old, new)
+    store.close()
+
+
+def test_failed_transaction_writes_nothing(tmp_path):
+    path, = create_files(tmp_path, 1)
+    store = MD_store(str(tmp_path))
+    try:
+        with store.transaction():
+            store.write(path, ["a"], {"a": "x"})
+            raise ValueError("stop")
+    except ValueError:
+        pass
+    assert not store.exists(path)
+    store.close()
+
+
+def test_sync_imports_and_exports_the_newer_side(tmp_path):
+    text, stored = create_files(tmp_path, 2)
+    MD_file(text, ["a"]).update({"a": "text"})
+    store = MD_store(str(tmp_path))
+    store.write(stored, ["a"], {"a": "stored"})
+
+    assert store.sync([text, stored], ["a"]) == (1, 1)
+    assert store.read(text) == {"a": "text"}
+    assert MD_file(stored, ["a"], exists=True)["a"] == "stored"
+    # nothing changed since
+    assert store.sync([text, stored], ["a"]) == (0, 0)
+    store.close()
@@ -0,0 +1,65 @@
+import os
+from collections import Counter
+from md_file import MD_file, get_metadata_path
+from md_table import MD_table, MD_column
+
+
+def create_table(root="/wd"):
+    table = MD_table(["author", "location"])
+    table.add(os.path.join(root, "a.dat"), {"author": "smith", "location": "lab 1"})
+    table.add(os.path.join(root, "sub", "b.dat"), {"author": "smith", "location": "lab 2"})
+    table.add(os.path.join(root, "sub", "c.dat"), {"author": "jones", "location": "lab 2"})
+    table.add(os.path.join(root, "d.dat"), {"author": "smith"})
+    return table
+
+
+def test_group_by_one_and_several_keywords():
+    table = create_table()
+    assert table.group_by("author") == Counter({"smith": 3, "jones": 1})
+    assert table.group_by("author", "location") == Counter({("smith", "lab 1"): 1, ("smith", "lab 2"): 1,
+                                                            ("jones", "lab 2"): 1, ("smith", ""): 1})
+
+
+def test_group_by_below_a_directory():
+    table = create_table(os.path.abspath("wd"))
+    assert table.group_by("author", below="wd/sub") == Counter({"smith": 1, "jones": 1})
+    assert table.count(below="wd/sub") == 2
+    assert table.count("author", "smith", below="wd/sub") == 1
+
+
+def test_removed_and_changed_rows():
+    table = create_table()
+    table.remove("/wd/a.dat", None)
+    table.change("/wd/sub/c.dat", "author", "jones", "smith")
+    assert len(table) == 3
+    assert table.group_by("author") == Counter({"smith": 3})
+    assert table.group_by("author", "location") == Counter({("smith", "lab 2"): 2, ("smith", ""): 1})
+    assert sorted(table.paths_where("location", "lab 2")) == ["/wd/sub/b.dat", "/wd/sub/c.dat"]
+
+
+def test_columns_widen_with_many_distinct_values():
+    column = MD_column()
+    for i in range(70000):
+        column.append(str(i))
+    assert column.codes.typecode == "I"
+    assert column.values[column.codes[69999]] == "69999"
+
+
+def test_new_and_renamed_keywords():
+    table = create_table()
+    table.rename_keyword("author", "name")
+    table.set_keywords(["name", "location", "sensor"])
+    assert table.group_by("sensor") == Counter({"": 4})
+    assert table.count("name", "jones") == 1
+
+
+def test_from_files_reads_without_creating_metadata_files(tmp_path):
+    paths = [str(tmp_path / name) for name in ("a.dat", "b.dat")]
+    for path in paths:
+        with open(path, "w") as f:
+            f.write("data")
+    MD_file(paths[0], ["author"])["author"] = "smith"
+
+    table = MD_table.from_files(paths, ["author"], workers=2)
+    assert table.group_by("author") == Counter({"smith": 1, "": 1})
+    assert not os.path.exists(get_metadata_path(paths[1]))
@@ -0,0 +1,137 @@
+import os
+from manifest import Scan_manifest
+from snapshot import WD_snapshot
+from moves import find_moves, reconcile_moves
+from md_file import MD_file, get_metadata_path
+
+
+def scan(working_dir, store=None):
+    manifest = Scan_manifest(working_dir)
+    snapshot = WD_snapshot(working_dir, manifest)
+    moves = reconcile_moves(snapshot, manifest, store)
+    manifest.save(WD_snapshot(working_dir, manifest) if len(moves) > 0 else snapshot)
+    return moves
+
+
+def create(path, content="data"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def read_info(path):
+    return MD_file(path, ["a"], exists=True)["a"]
+
+
+def test_first_scan_finds_no_moves(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    create(str(tmp_path / "wd" / "a.dat"))
+    manifest = Scan_manifest(str(tmp_path / "wd"))
+    assert find_moves(WD_snapshot(str(tmp_path / "wd"), manifest), manifest) == []
+
+
+def test_metadata_follows_a_renamed_data_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wd = str(tmp_path / "wd")
+    old, new = os.path.join(wd, "a.dat"), os.path.join(wd, "sub", "b.dat")
+    create(old)
+    MD_file(old, ["a"])["a"] = "alice"
+    scan(wd)
+
+    os.makedirs(os.path.dirname(new))
+    os.rename(old, new)
+    assert scan(wd) == [(old, new)]
+    assert not os.path.exists(get_metadata_path(old))
+    assert read_info(new) == "alice"
+    with open(get_metadata_path(new)) as f:
+        assert f.readline().strip().endswith(new)
+
+
+def test_data_file_changed_in_place_is_found_after_a_rename(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wd = str(tmp_path / "wd")
+    old, new = os.path.join(wd, "a.dat"), os.path.join(wd, "b.dat")
+    create(old)
+    MD_file(old, ["a"])["a"] = "alice"
+    scan(wd)
+
+    # a growing file which is renamed before the next scan, its inode is still the same
+    with open(old, "a") as f:
+        f.write("more data")
+    os.rename(old, new)
+    assert scan(wd) == [(old, new)]
+    assert read_info(new) == "alice"
+
+
+def test_failed_move_is_tried_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wd = str(tmp_path / "wd")
+    old, new = os.path.join(wd, "a.dat"), os.path.join(wd, "b.dat")
+    create(old)
+    MD_file(old, ["a"])["a"] = "alice"
+    scan(wd)
+
+    os.rename(old, new)
+    # the new data file already has a metadata file, nothing is overwritten
+    MD_file(new, ["a"])
+    assert scan(wd) == []
+    assert os.path.exists(get_metadata_path(old))
+
+    os.remove(get_metadata_path(new))
+    assert scan(wd) == [(old, new)]
+    assert read_info(new) == "alice"
+
+
+def test_ambiguous_copies_are_not_moves(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wd = str(tmp_path / "wd")
+    a, b = os.path.join(wd, "a.dat"), os.path.join(wd, "b.dat")
+    create(a)
+    create(b)
+    os.utime(a, ns=(10**18, 10**18))
+    os.utime(b, ns=(10**18, 10**18))
+    MD_file(a, ["a"])["a"] = "alice"
+    scan(wd)
+
+    # new files with the same size and time but other inodes (e.g. copied from another file system)
+    for name in ("c.dat", "d.dat"):
+        create(os.path.join(wd, name))
+        os.utime(os.path.join(wd, name), ns=(10**18, 10**18))
+    os.remove(a)
+    os.remove(b)
+    assert scan(wd) == []
+    assert os.path.exists(get_metadata_path(a))
+
+
+def test_only_new_data_files_are_stated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wd = str(tmp_path / "wd")
+    for name in ("a.dat", "b.dat", "c.dat"):
+        create(os.path.join(wd, name))
+    scan(wd)
+    create(os.path.join(wd, "d.dat"))
+
+    stated = []
+    stat = os.stat
+    monkeypatch.setattr(os, "stat", lambda path, *args, **kwargs: stated.append(path) or stat(path, *args, **kwargs))
+    manifest = Scan_manifest(wd)
+    find_moves(WD_snapshot(wd, manifest), manifest)
+    assert [path for path in stated if path.endswith(".dat")] == [os.path.join(wd, "d.dat")]
+
+
+def test_disappeared_hard_links_are_ambiguous(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wd = str(tmp_path / "wd")
+    a, b = os.path.join(wd, "a.dat"), os.path.join(wd, "b.dat")
+    create(a)
+    os.link(a, b)
+    MD_file(a, ["a"])["a"] = "alice"
+    MD_file(b, ["a"])["a"] = "bob"
+    scan(wd)
+
+    # both names of the same file are renamed
+    os.rename(a, os.path.join(wd, "c.dat"))
+    os.rename(b, os.path.join(wd, "d.dat"))
+    assert scan(wd) == []
+    assert os.path.exists(get_metadata_path(a))
+    assert os.path.exists(get_metadata_path(b))
@@ -0,0 +1,69 @@
+import cli
+from md_file import MD_file
+from process_description import PD_handler, get_process_id, is_process_id
+from utils import save_processes, load_processes
+
+
+def test_add_id_never_rebinds_an_existing_id():
+    processes = PD_handler()
+    processes.add("Etching", "etch for 5 min")
+    first = processes.add_id("etch for 5 min", "Etching")
+    assert first == get_process_id("etch for 5 min")
+    # the same process keeps its ID
+    assert processes.add_id("etch for 5 min", "Etching") == first
+
+    # files of the deleted process still save the ID, a new process with the same text gets the next one
+    processes.remove("Etching", "etch for 5 min")
+    processes.add("Cleaning", "etch for 5 min")
+    second = processes.get_value("Cleaning", True)
+    assert second == get_process_id("etch for 5 min", 1)
+    assert processes.ids[first] == "No Description"
+    assert processes[[second]] == "Cleaning"
+
+
+def test_id_keeps_pointing_to_its_process_after_an_edit():
+    processes = PD_handler()
+    processes.add("Etching", "etch for 5 min")
+    process_id = processes.get_value("Etching", True)
+
+    processes["Etching"] = "etch for 6 min"
+    assert processes[[process_id]] == "Etching"
+    assert processes.resolve(process_id) == "etch for 6 min"
+    assert processes.get_value("Etching", True) == get_process_id("etch for 6 min")
+
+
+def test_id_round_trips_through_a_metadata_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cli, "DEFAULT_PROCESS_IDS", "on")
+    keywords = ["process", "sample"]
+    processes = PD_handler()
+    processes.add("Etching", "etch for 5 min")
+    save_processes(processes)
+    processes = load_processes()
+
+    data_file = str(tmp_path / "a.dat")
+    with open(data_file, "w") as f:
+        f.write("data")
+    data = cli.parse_values(["process=Etching", "sample=S1"], keywords, processes)
+    MD_file(data_file, keywords).update(data)
+
+    # the file saves the ID instead of the text
+    info = MD_file(data_file, keywords)["process"]
+    assert is_process_id(info)
+    assert processes.resolve(info) == "etch for 5 min"
+    assert processes[[info]] == "Etching"
+
+    # the description can be edited without rewriting the file
+    processes["Etching"] = "etch for 6 min"
+    save_processes(processes)
+    assert load_processes().resolve(MD_file(data_file, keywords)["process"]) == "etch for 6 min"
+
+
+def test_handlers_saved_before_the_ids_get_them(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    processes = PD_handler()
+    processes.add("Etching", "etch for 5 min")
+    del processes.ids
+    save_processes(processes)
+
+    assert load_processes()[[get_process_id("etch for 5 min")]] == "Etching"
@@ -0,0 +1,96 @@
+import os
+from md_file import MD_file
+from md_file_dict import MD_file_dict
+from snapshot import WD_snapshot
+from propagate import MD_propagation
+
+
+def create_tree(tmp_path):
+    """
+    wd/a.dat, wd/sub/b.dat, wd/sub/c.dat, wd/sub/deeper/d.dat, wd/other/e.dat
+    """
+    paths = []
+    for name in ["a.dat", "sub/b.dat", "sub/c.dat", "sub/deeper/d.dat", "other/e.dat"]:
+        path = os.path.join(str(tmp_path), *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write("data")
+        paths.append(path)
+    return paths
+
+
+def propagate(tmp_path, targets, data, **kwargs):
+    MD_files = MD_file_dict(WD_snapshot(str(tmp_path)).data_files, ["a", "b"])
+    propagation = MD_propagation(MD_files, data, targets, **kwargs)
+    return propagation.run()
+
+
+def read(path):
+    return MD_file(path, ["a", "b"]).data
+
+
+def test_targets_of_the_three_buttons(tmp_path):
+    a, b, c, d, e = create_tree(tmp_path)
+    snapshot = WD_snapshot(str(tmp_path))
+    sub = os.path.dirname(b)
+
+    # [>] the directory of the current file
+    assert sorted(snapshot.data_files_in(sub)) == [b, c]
+    # [>>] the directory and its subdirectories
+    assert sorted(snapshot.data_files_below(sub)) == [b, c, d]
+    # [>>>] the whole working directory
+    assert sorted(snapshot.data_files) == sorted([a, b, c, d, e])
+
+
+def test_propagation_writes_only_the_targets(tmp_path):
+    a, b, c, d, e = create_tree(tmp_path)
+    targets = WD_snapshot(str(tmp_path)).data_files_below(os.path.dirname(b))
+
+    summary = propagate(tmp_path, targets, {"a": "x", "b": "y"}, batch_size=2)
+    assert summary["files"] == 3 and summary["changed"] == 3
+    for path in (b, c, d):
+        assert read(path) == {"a": "x", "b": "y"}
+    for path in (a, e):
+        assert read(path) == {"a": "", "b": ""}
+
+
+def test_unchanged_files_are_not_rewritten(tmp_path):
+    a, b, c, d, e = create_tree(tmp_path)
+    propagate(tmp_path, [a, b], {"a": "x"})
+
+    mtimes = {path: os.stat(MD_file(path, ["a", "b"]).metadata_path).st_mtime_ns for path in (a, b)}
+    summary = propagate(tmp_path, [a, b, c], {"a": "x"}, workers=4)
+
+    assert summary["unchanged"] == 2 and summary["changed"] == 1 and summary["failed"] == 0
+    for path in (a, b):
+        assert os.stat(MD_file(path, ["a", "b"]).metadata_path).st_mtime_ns == mtimes[path]
+    assert read(c)["a"] == "x"
+
+
+def test_cancel_stops_before_the_next_batch(tmp_path):
+    paths = create_tree(tmp_path)
+    MD_files = MD_file_dict(paths, ["a", "b"])
+    propagation = MD_propagation(MD_files, {"a": "x"}, paths, batch_size=2)
+
+    assert propagation.step()
+    propagation.cancel()
+    assert not propagation.step()
+
+    assert propagation.done() == 2 and propagation.finished()
+    assert propagation.summary["changed"] == 2 and propagation.summary["cancelled"]
+    assert [read(path)["a"] for path in paths] == ["x", "x", "", "", ""]
+
+
+def test_summary_counts_failed_files(tmp_path):
+    a, b, c, d, e = create_tree(tmp_path)
+    propagate(tmp_path, [a], {"a": "x"})
+    # a directory in place of the metadata file can not be written
+    blocked = MD_file(c, ["a", "b"]).metadata_path
+    os.remove(blocked)
+    os.makedirs(blocked)
+
+    summary = propagate(tmp_path, [a, b, c, d, e, str(tmp_path / "unknown.dat")], {"a": "x"})
+    # unknown files are not targets
+    assert summary["files"] == 5
+    assert (summary["changed"], summary["unchanged"], summary["failed"]) == (3, 1, 1)
+    assert [error["path"] for error in summary["errors"]] == [c]
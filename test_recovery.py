@@ -0,0 +1,65 @@
+import os
+import time
+import recovery
+from md_file import MD_file
+from manifest import Scan_manifest
+from process_description import PD_handler
+from recovery import group_headers, find_from_other_users, extract_keywords, get_data_path
+
+
+def create(tmp_path, name, keywords, data):
+    path = tmp_path / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_text("data")
+    md = MD_file(str(path), keywords)
+    md.update(data)
+    return md.metadata_path
+
+
+def test_group_headers_buckets_files_by_keywords(tmp_path):
+    a = create(tmp_path, "a.dat", ["process", "x"], {"process": "etch"})
+    b = create(tmp_path, "sub/b.dat", ["process", "x", "y"], {"process": "clean"})
+    c = create(tmp_path, "c.dat", ["process", "x"], {"process": "etch"})
+    d = create(tmp_path, "d.dat", ["process", "x"], {})
+
+    groups, pds = group_headers([a, b, c, d], workers=4)
+    assert groups == {("process", "x"): [a, c, d], ("process", "x", "y"): [b]}
+    # the process descriptions in the order they were found
+    assert list(pds.items()) == [("etch", 2), ("clean", 1), ("", 1)]
+
+
+def test_unchanged_headers_come_from_the_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    a = create(tmp_path, "wd/a.dat", ["process", "x"], {"process": "etch"})
+    mtime = time.time() - 60
+    os.utime(a, (mtime, mtime))
+
+    manifest = Scan_manifest(str(tmp_path / "wd"))
+    assert group_headers([a], manifest)[0] == {("process", "x"): [a]}
+
+    def parse_metadata(*args, **kwargs):
+        raise AssertionError("parsed again")
+
+    monkeypatch.setattr(recovery, "parse_metadata", parse_metadata)
+    assert group_headers([a], manifest) == ({("process", "x"): [a]}, {"etch": 1})
+
+
+def test_find_from_other_users(tmp_path):
+    processes = PD_handler()
+    processes.add("Etching", "etch")
+    create(tmp_path, "a.dat", ["process", "x"], {"process": "etch"})
+    create(tmp_path, "b.dat", ["process", "x", "new"], {"process": "unknown"})
+    # an ID of another instance can not be resolved
+    create(tmp_path, "c.dat", ["process", "x"], {"process": "pd:0123456789abcdef"})
+    # another name of the process description keyword is renamed
+    other = create(tmp_path, "d.dat", ["procedure", "x"], {"procedure": "etch"})
+
+    not_saved_keys, not_saved_pds = find_from_other_users(str(tmp_path), ["process", "x"], processes, workers=2)
+    assert not_saved_keys == ["new"]
+    assert not_saved_pds == ["unknown"]
+    assert extract_keywords(other) == ["process", "x"]
+
+
+def test_get_data_path_is_the_inverse_of_the_metadata_path(tmp_path):
+    md = create(tmp_path, "sub/some-name.dat", ["process"], {})
+    assert get_data_path(md) == str(tmp_path / "sub" / "some-name.dat")
@@ -0,0 +1,49 @@
+from schema import Keyword_schema
+
+
+def test_plan_of_current_keywords_is_empty():
+    schema = Keyword_schema(["a", "b"])
+    schema.rename(1, "c")
+    assert schema.plan(["a", "c"]) == {}
+
+
+def test_plan_follows_renames_over_several_versions():
+    schema = Keyword_schema(["a", "b", "c"])
+    schema.rename(1, "b2")
+    schema.rename(1, "b3")
+    assert schema.plan(["a", "b", "c"]) == {"b": "b3"}
+    assert schema.plan(["a", "b2", "c"]) == {"b2": "b3"}
+
+
+def test_plan_drops_removed_keywords():
+    schema = Keyword_schema(["a", "b", "c"])
+    schema.set_keywords(["a", "c", "d"])
+    assert schema.plan(["a", "b", "c"]) == {"b": None}
+
+
+def test_plan_of_a_rename_after_a_removal():
+    schema = Keyword_schema(["a", "b", "c"])
+    schema.set_keywords(["a", "c"])
+    schema.rename(1, "c2")
+    assert schema.plan(["a", "b", "c"]) == {"b": None, "c": "c2"}
+
+
+def test_plan_of_an_unknown_keyword_list():
+    schema = Keyword_schema(["a", "b"])
+    schema.rename(1, "b2")
+    # a file of another user: unknown keywords stay, old ones are followed, current ones stay
+    assert schema.plan(["x", "b", "a"]) == {"b": "b2"}
+
+
+def test_plan_never_merges_two_keywords_of_a_file():
+    schema = Keyword_schema(["a", "b"])
+    schema.rename(1, "c")
+    # the file already has the new keyword next to the old one
+    assert schema.plan(["b", "c", "a"]) == {}
+
+
+def test_migrate_moves_information_to_the_current_keywords():
+    schema = Keyword_schema(["a", "b", "c"])
+    schema.rename(0, "a2")
+    schema.set_keywords(["a2", "b"])
+    assert schema.migrate(["a", "b", "c"], ["1", "2", "3"]) == {"a2": "1", "b": "2"}
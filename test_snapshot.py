@@ -0,0 +1,60 @@
+import os
+from snapshot import WD_snapshot, walk_data_files, TOOL_FILE_PREFIX
+
+
+def create(tmp_path, names):
+    paths = []
+    for name in names:
+        path = os.path.join(str(tmp_path), *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write("data")
+        paths.append(path)
+    return paths
+
+
+def test_snapshot_sorts_data_and_metadata_files(tmp_path):
+    a, b, md_a, md_b, tool = create(tmp_path, ["a.dat", "sub/b.dat", "metadata/a-metadata.txt",
+                                                "sub/metadata/b-metadata.txt", TOOL_FILE_PREFIX + ".sqlite"])
+    snapshot = WD_snapshot(str(tmp_path))
+
+    assert sorted(snapshot.data_files) == [a, b]
+    assert sorted(snapshot.metadata_files) == sorted([md_a, md_b])
+    assert sorted(snapshot.directories) == sorted([str(tmp_path), str(tmp_path / "metadata"), str(tmp_path / "sub"),
+                                                   str(tmp_path / "sub" / "metadata")])
+    # metadata directories and files of the tool are not shown in the file browser
+    assert sorted(snapshot.children(str(tmp_path))) == [("a.dat", False), ("sub", True)]
+
+
+def test_data_files_in_and_below(tmp_path):
+    a, b, c = create(tmp_path, ["a.dat", "sub/b.dat", "sub/deeper/c.dat"])
+    snapshot = WD_snapshot(str(tmp_path))
+
+    assert snapshot.data_files_in(str(tmp_path)) == (a,)
+    assert sorted(snapshot.data_files_below(str(tmp_path / "sub"))) == [b, c]
+    assert snapshot.data_files_in(str(tmp_path / "unknown")) == ()
+
+
+def test_symbolic_links_to_directories_are_not_followed(tmp_path):
+    a, = create(tmp_path, ["sub/a.dat"])
+    os.symlink(str(tmp_path / "sub"), str(tmp_path / "link"))
+    snapshot = WD_snapshot(str(tmp_path))
+
+    assert snapshot.data_files == (a,)
+    assert ("link", True) in snapshot.children(str(tmp_path))
+
+
+def test_rescan_lists_only_the_changed_directories(tmp_path):
+    a, b = create(tmp_path, ["a.dat", "sub/b.dat"])
+    snapshot = WD_snapshot(str(tmp_path))
+
+    c, d = create(tmp_path, ["c.dat", "sub/d.dat"])
+    rescanned = snapshot.rescan([str(tmp_path)])
+    # sub was not listed again
+    assert sorted(rescanned.data_files) == sorted([a, b, c])
+    assert sorted(rescanned.rescan([str(tmp_path / "sub")]).data_files) == sorted([a, b, c, d])
+
+
+def test_walk_data_files_finds_the_same_files(tmp_path):
+    create(tmp_path, ["a.dat", "sub/b.dat", "sub/metadata/b-metadata.txt", "x/y/z.dat"])
+    assert list(walk_data_files(str(tmp_path))) == list(WD_snapshot(str(tmp_path)).data_files)
@@ -0,0 +1,131 @@
+import os
+import startup
+from startup import Startup
+from md_file import MD_file, get_metadata_path
+from process_description import PD_handler
+from schema import Keyword_schema
+
+
+KEYWORDS = ["process", "sample"]
+
+
+class Sync_io:
+    """
+    Stand-in for the I/O worker of the GUI which runs every request right away
+    """
+    def submit(self, function, *args, callback=None, errback=None):
+        try:
+            result = function(*args)
+        except Exception as e:
+            if not errback is None:
+                errback(e)
+            return
+        if not callback is None:
+            callback(result)
+
+
+class Fake_master:
+    def update_idletasks(self):
+        pass
+
+
+class Fake_GUI:
+    """
+    Stand-in for the main window which only remembers what the startup showed
+    """
+    def __init__(self):
+        self.master = Fake_master()
+        self.io = Sync_io()
+        self.MD_files = None
+        self.snapshot = None
+        self.attached = None
+        self.status = []
+
+    def show_status(self, text, done=None, total=None):
+        self.status.append((text, done, total))
+
+    def hide_status(self):
+        self.status.append(None)
+
+    def show_snapshot(self, snapshot):
+        self.snapshot = snapshot
+
+    def attach(self, MD_files, process_index=None, watcher=None):
+        self.attached = (MD_files, process_index, watcher)
+
+
+def run_startup(tmp_path, monkeypatch, **defaults):
+    monkeypatch.chdir(tmp_path)
+    for name, value in dict({"DEFAULT_WATCH": "off", "DEFAULT_BACKEND": "text", "DEFAULT_PRELOAD": "on"}, **defaults).items():
+        monkeypatch.setattr(startup, name, value)
+
+    processes = PD_handler()
+    processes.add("Etching", "etch")
+    gui = Fake_GUI()
+    start = Startup(gui, str(tmp_path / "wd"), list(KEYWORDS), processes, Keyword_schema(list(KEYWORDS)))
+    start.start()
+    if not start.journal is None:
+        start.journal.close()
+    return gui, start
+
+
+def create(tmp_path, name, data=None):
+    path = tmp_path / "wd" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("data")
+    if not data is None:
+        MD_file(str(path), KEYWORDS).update(data)
+    return str(path)
+
+
+def test_startup_shows_the_tree_and_attaches_the_metadata(tmp_path, monkeypatch):
+    a = create(tmp_path, "a.dat", {"process": "etch", "sample": "S1"})
+    b = create(tmp_path, "sub/b.dat")
+    monkeypatch.setattr(startup, "PRELOAD_CHUNK", 1)
+    gui, start = run_startup(tmp_path, monkeypatch)
+
+    assert sorted(gui.snapshot.data_files) == [a, b]
+    MD_files, process_index, watcher = gui.attached
+    assert gui.MD_files is MD_files and watcher is None
+    assert MD_files[a]["sample"] == "S1"
+    # the first MD_files are loaded chunk by chunk and the status line is hidden at the end
+    assert start.preloaded == 2
+    assert gui.status[0] == ("scanning the working directory", None, None)
+    assert ("loading metadata", 1, 2) in gui.status
+    assert gui.status[-1] is None
+
+
+def test_metadata_follows_a_moved_data_file(tmp_path, monkeypatch):
+    a = create(tmp_path, "a.dat", {"sample": "S1"})
+    run_startup(tmp_path, monkeypatch)
+
+    moved = str(tmp_path / "wd" / "sub" / "moved.dat")
+    os.makedirs(os.path.dirname(moved))
+    os.rename(a, moved)
+    gui, start = run_startup(tmp_path, monkeypatch)
+
+    assert start.moves == [(a, moved)]
+    assert gui.MD_files[moved]["sample"] == "S1"
+    assert not os.path.exists(get_metadata_path(a))
+
+
+def test_sqlite_backend_takes_over_the_metadata_files(tmp_path, monkeypatch):
+    a = create(tmp_path, "a.dat", {"sample": "S1"})
+    gui, start = run_startup(tmp_path, monkeypatch, DEFAULT_BACKEND="sqlite")
+
+    assert start.store.read(a)["sample"] == "S1"
+    assert gui.MD_files[a]["sample"] == "S1"
+    start.store.close()
+
+
+def test_failed_scan_hides_the_status_and_attaches_nothing(tmp_path, monkeypatch):
+    create(tmp_path, "a.dat")
+
+    def broken(*args, **kwargs):
+        raise OSError("not readable")
+
+    monkeypatch.setattr(startup, "WD_snapshot", broken)
+    gui, start = run_startup(tmp_path, monkeypatch)
+
+    assert gui.status == [("scanning the working directory", None, None), None]
+    assert gui.attached is None and gui.MD_files is None
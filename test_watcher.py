@@ -0,0 +1,60 @@
+import os
+import time
+from snapshot import WD_snapshot
+from watcher import WD_watcher, diff_snapshots
+
+
+def create(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("data")
+
+
+def wait_for_changes(watcher, timeout=5.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        dirs = watcher.changes()
+        if len(dirs) > 0:
+            return dirs
+        time.sleep(0.02)
+    return set()
+
+
+def test_diff_snapshots_finds_added_and_removed_data_files(tmp_path):
+    wd = str(tmp_path)
+    create(os.path.join(wd, "a.dat"))
+    create(os.path.join(wd, "sub", "b.dat"))
+    snapshot = WD_snapshot(wd)
+
+    os.remove(os.path.join(wd, "a.dat"))
+    create(os.path.join(wd, "c.dat"))
+    create(os.path.join(wd, "new", "d.dat"))
+    rescanned = snapshot.rescan([wd])
+
+    added, removed, changed = diff_snapshots(snapshot, rescanned, [wd])
+    assert sorted(added) == [os.path.join(wd, "c.dat"), os.path.join(wd, "new", "d.dat")]
+    assert removed == [os.path.join(wd, "a.dat")]
+    assert os.path.join(wd, "new") in changed
+    assert not os.path.join(wd, "sub") in changed
+
+
+def test_watcher_reports_changed_directories(tmp_path):
+    wd = str(tmp_path)
+    create(os.path.join(wd, "sub", "a.dat"))
+    for mode in ("inotify", "poll"):
+        watcher = WD_watcher([wd, os.path.join(wd, "sub")], mode=mode, debounce=0.05, interval=0.05)
+        watcher.start()
+        try:
+            # the mtime of a directory has a limited resolution
+            time.sleep(0.05)
+            create(os.path.join(wd, "sub", mode + ".dat"))
+            assert os.path.join(wd, "sub") in wait_for_changes(watcher)
+        finally:
+            watcher.stop()
+
+
+def test_tool_directories_are_not_watched(tmp_path):
+    wd = str(tmp_path)
+    os.makedirs(os.path.join(wd, "metadata"))
+    watcher = WD_watcher([wd, os.path.join(wd, "metadata")], mode="poll")
+    assert watcher.directories == [os.path.normpath(wd)]
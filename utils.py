@@ -1,18 +1,41 @@
 import os
-import tkinter as tk
-from tkinter import filedialog
 from md_file import MD_file
+from md_file_dict import MD_file_dict
+from snapshot import WD_snapshot
+from schema import Keyword_schema
 import pickle
 
 
+# number of threads used to open metadata files in parallel (waiting for network storage overlaps)
+DEFAULT_WORKERS = int(os.environ.get("MD_TOOL_WORKERS", 8))
+
+# where the metadata is kept: "text" (one metadata file per data file) or "sqlite" (one database per working directory)
+DEFAULT_BACKEND = os.environ.get("MD_TOOL_BACKEND", "text")
+
+# watch the working directory for new and removed files while the GUI runs: "inotify" (polling if not available), "poll" or "off"
+DEFAULT_WATCH = os.environ.get("MD_TOOL_WATCH", "off")
+
+# save metadata files with old keywords in the background after the keywords were changed: "on" or "off"
+# (off: they are migrated when they are read and saved with the new keywords on their next change)
+DEFAULT_COMPACTION = os.environ.get("MD_TOOL_COMPACTION", "off")
+
+# load the first MD_files in the background after the start so that selecting them is fast: "on" or "off"
+DEFAULT_PRELOAD = os.environ.get("MD_TOOL_PRELOAD", "on")
+
+# save the short ID of a process description instead of its text: "on" or "off" (text, readable by older versions of the tool)
+DEFAULT_PROCESS_IDS = os.environ.get("MD_TOOL_PROCESS_IDS", "off")
+
+
 """
 This file contains useful utility functions:
 
     load_keywords()
     save_keywords(keyword_list)
-    get_working_dir()
-    create_data_file_list(dir)
-    create_MD_file_dict(data_files, keywords)
+    load_schema(keywords)
+    save_schema(schema)
+    get_working_dir(master)
+    create_data_file_list(dir, snapshot)
+    create_MD_file_dict(data_files, keywords, max_entries, manifest, workers, preload, store, journal, schema)
     load_processes()
     save_processes(PD_handler)
 """
@@ -48,64 +71,99 @@ def save_keywords(keywords):
         pickle.dump(keywords, f)
 
 
-def get_working_dir():
+def load_schema(keywords):
+    """
+    Function which loads the versions of the keywords from keyword_schema.pkl
+
+        keywords - list             ... list containing the current keywords as strings
+    returns:
+        schema   - Keyword_schema   ... versions of the keywords, the current version are the given keywords
+    """
+    schema = None
+
+    if os.path.isfile("keyword_schema.pkl"):
+        with open("keyword_schema.pkl", "rb") as f:
+            schema = pickle.load(f)
+
+    if schema is None:
+        schema = Keyword_schema(keywords)
+    else:
+        # keywords.pkl could have been changed without the schema (e.g. by an import of foreign keywords)
+        schema.set_keywords(keywords)
+    return schema
+
+
+def save_schema(schema):
+    """
+    Function to save the versions of the keywords to keyword_schema.pkl
+
+        schema   - Keyword_schema   ... versions of the keywords
+    """
+    with open("keyword_schema.pkl", "wb") as f:
+        pickle.dump(schema, f)
+
+
+def get_working_dir(master=None):
     """
     Function which executes the open file dialog and gets the working directory
+
+        master  - tk.Tk     ... the root window of the tool (a hidden one is created if not given)
     """
+    # tkinter is only imported here so that the other utils work without a display
+    import tkinter as tk
+    from tkinter import filedialog
+
     # select the working_dir
-    root = tk.Tk()
-    # withdraw the standard window which is created
-    root.withdraw()
-    working_dir = filedialog.askdirectory()
+    if master is None:
+        master = tk.Tk()
+        # withdraw the standard window which is created
+        master.withdraw()
+    working_dir = filedialog.askdirectory(parent=master)
     return working_dir
 
 
-def create_data_file_list(dir):
+def create_data_file_list(dir, snapshot=None):
     """
     Function to create a list of all files in a given directory
     
-        dir - string/path   ... path to the working directory
+        dir      - string/path  ... path to the working directory
+        snapshot - WD_snapshot  ... already created snapshot of the working directory (optional)
     returns:
         file_list - list    ... containg paths to all files in the working directory
     """
-    # initialize data file list
-    data_file_list = []
-
-    # create directory walk
-    w = os.walk(dir)
-    # filling the list with all file paths
-    for root, _, files in w:
-        # iterate over all files
-        for f in files:
-            # create the path
-            path = os.path.join(root, f)
+    # walk the directory only if no snapshot is given
+    if snapshot is None:
+        snapshot = WD_snapshot(dir)
 
-            # check if metadata is in the filename or directory above
-            if not "metadata" in f and not "metadata" in os.path.split(root)[1]:
-                data_file_list.append(os.path.normpath(path))
-
-    return data_file_list
+    return list(snapshot.data_files)
 
     
-def create_MD_file_dict(data_files, keywords):
+def create_MD_file_dict(data_files, keywords, max_entries=10000, manifest=None, workers=1, preload=False, store=None, journal=None, schema=None):
     """
     Function that creates a dict of MD_file objects
     as pseudo dict wrapper around the metadata files.
 
-    This also creates empty metadata files if no files are present.
-
-        data_files   - list   ... containing all paths to data files
-        keywords     - list   ... list with all keywords as strings
+    The MD_files are only created on first access,
+    this also creates empty metadata files if no files are present.
+
+        data_files   - list         ... containing all paths to data files
+        keywords     - list         ... list with all keywords as strings
+        max_entries  - int          ... maximal number of MD_files kept in memory
+        manifest     - Scan_manifest... metadata files known to the manifest are not checked on the disc (optional)
+        workers      - int          ... number of threads used to load several MD_files at once
+        preload      - bool         ... load the first max_entries MD_files right away (in parallel)
+        store        - MD_store     ... keep the metadata in this database instead of metadata files (optional)
+        journal      - Write_journal... write the metadata files crash-safe in groups (optional)
+        schema       - Keyword_schema ... versions of the keywords, files with older keywords are migrated (optional)
     returns:
-        MD_file_dict - dict   ... containing one MD_file for each data file, the key is the path to the datafile
-    """
-    # initialize empty dict
-    MD_file_dict = {}
-    # iterate over the data files
-    for data_file in data_files:
-        # fill the dict
-        MD_file_dict[data_file] = MD_file(data_file, keywords)
-    return MD_file_dict
+        MD_file_dict - MD_file_dict ... lazy dict with one MD_file for each data file, the key is the path to the datafile
+    """
+    MD_files = MD_file_dict(data_files, keywords, max_entries=max_entries, manifest=manifest, workers=workers, store=store, journal=journal, schema=schema)
+
+    if preload:
+        MD_files.preload(data_files if max_entries is None else data_files[:max_entries])
+
+    return MD_files
 
 def load_processes():
     """
@@ -0,0 +1,330 @@
+import os
+import time
+import errno
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+from snapshot import TOOL_FILE_PREFIX
+
+
+# inotify constants (see inotify(7))
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# only entries which are added, removed or renamed are of interest (not the content of files)
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+# wd, mask, cookie, length of the name
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_watched(dir):
+    """
+    Function to check if a directory is watched
+    (metadata directories only change because of the tool itself)
+
+        dir     - string/path   ... path to the directory
+    """
+    return not "metadata" in os.path.basename(dir)
+
+
+def is_relevant(name):
+    """
+    Function to check if a changed entry could be a data file or a directory with data files
+    (metadata files and files of the tool are ignored)
+
+        name    - string    ... name of the changed entry
+    """
+    return not "metadata" in name and not name.startswith(TOOL_FILE_PREFIX)
+
+
+def diff_snapshots(old, new, dirs):
+    """
+    Function which compares two snapshots in the changed directories
+
+        old     - WD_snapshot   ... snapshot before the changes
+        new     - WD_snapshot   ... snapshot after the changes
+        dirs    - iterable      ... paths to the directories which were listed again
+    returns:
+        added   - list          ... data files which are new
+        removed - list          ... data files which are gone
+        changed - set           ... directories whose entries changed (including new and removed ones)
+    """
+    changed = set(os.path.normpath(dir) for dir in dirs) | (set(old.directories) ^ set(new.directories))
+
+    added = []
+    removed = []
+    for dir in changed:
+        old_files = set(old.data_files_in(dir))
+        new_files = set(new.data_files_in(dir))
+        added.extend(sorted(new_files - old_files))
+        removed.extend(sorted(old_files - new_files))
+    return added, removed, changed
+
+
+class WD_watcher:
+    """
+    Class which watches the directories of the working directory for added, removed or renamed entries.
+
+    Idea:
+        - Linux: inotify (through ctypes), every directory except metadata directories is watched
+        - otherwise (or if inotify fails): the mtimes of the directories are polled
+        - events are collected on a background thread, bursts are debounced:
+          changes() only returns the changed directories after nothing happened for a moment
+
+        watcher = WD_watcher(snapshot.directories)
+        watcher.start()
+        dirs = watcher.changes()    # = changed directories (empty while events are still arriving)
+        snapshot = snapshot.rescan(dirs)
+    """
+    def __init__(self, directories, mode="inotify", debounce=0.5, max_delay=5.0, interval=2.0):
+        """
+        Initialization of the watcher
+
+            directories - iterable  ... paths to the directories which should be watched
+            mode        - string    ... "inotify" (falls back to polling if not available) or "poll"
+            debounce    - float     ... seconds without events before changes are reported
+            max_delay   - float     ... seconds after the first event after which changes are reported anyway
+            interval    - float     ... seconds between two polls (polling only)
+        """
+        self.directories = [os.path.normpath(dir) for dir in directories if is_watched(dir)]
+        self.mode = mode
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.interval = interval
+
+        # changed directories which were not reported yet
+        self.lock = threading.Lock()
+        self.dirty = set()
+        self.first_event = None
+        self.last_event = None
+
+        self.stopped = threading.Event()
+        self.thread = None
+
+        # inotify
+        self.fd = None
+        self.libc = None
+        # watch descriptor -> directory
+        self.watches = {}
+
+        # polling: directory -> mtime
+        self.mtimes = {}
+
+    def start(self):
+        """
+        Function which starts watching on a background thread
+        """
+        if self.mode == "inotify":
+            try:
+                self.init_inotify()
+            except OSError:
+                # e.g. not Linux or too many directories for the inotify limit
+                self.close_inotify()
+                self.mode = "poll"
+
+        if self.mode == "poll":
+            for dir in self.directories:
+                self.mtimes[dir] = self.get_mtime(dir)
+
+        self.thread = threading.Thread(target=self.run, name="WD_watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Function which stops watching
+        """
+        self.stopped.set()
+        if not self.thread is None:
+            self.thread.join()
+        self.close_inotify()
+
+    def init_inotify(self):
+        """
+        Function which sets up inotify and watches all directories
+        """
+        if not hasattr(os, "O_NONBLOCK"):
+            raise OSError("inotify is not available")
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        for dir in self.directories:
+            self.add_watch(dir)
+
+    def add_watch(self, dir):
+        """
+        Function which adds an inotify watch for a directory
+
+            dir     - string/path   ... path to the directory
+        """
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            # the directory was removed in the meantime
+            if error in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return
+            raise OSError(error, "inotify_add_watch failed: " + dir)
+        self.watches[wd] = dir
+
+    def close_inotify(self):
+        """
+        Function which closes the inotify file descriptor
+        """
+        if not self.fd is None and self.fd >= 0:
+            os.close(self.fd)
+        self.fd = None
+
+    def mark(self, dir):
+        """
+        Function to remember a changed directory (called from the background thread)
+
+            dir     - string/path   ... path to the directory
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.dirty.add(dir)
+            if self.first_event is None:
+                self.first_event = now
+            self.last_event = now
+
+    def changes(self):
+        """
+        Function to get the changed directories once the events calmed down
+
+        returns:
+            dirs    - set   ... paths to the changed directories (empty if nothing changed or events are still arriving)
+        """
+        now = time.monotonic()
+        with self.lock:
+            if len(self.dirty) == 0:
+                return set()
+            if now - self.last_event < self.debounce and now - self.first_event < self.max_delay:
+                return set()
+
+            dirs = self.dirty
+            self.dirty = set()
+            self.first_event = None
+            self.last_event = None
+            return dirs
+
+    def run(self):
+        """
+        Function which collects the events on the background thread
+        """
+        if self.mode == "inotify":
+            self.run_inotify()
+        else:
+            self.run_polling()
+
+    def run_inotify(self):
+        """
+        Function which reads the inotify events
+        """
+        while not self.stopped.is_set():
+            try:
+                readable, _, _ = select.select([self.fd], [], [], 0.5)
+                if len(readable) == 0:
+                    continue
+                data = os.read(self.fd, 65536)
+            except OSError:
+                continue
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                self.handle_event(wd, mask, os.fsdecode(name))
+
+    def handle_event(self, wd, mask, name):
+        """
+        Function which handles one inotify event
+
+            wd      - int       ... watch descriptor of the directory
+            mask    - int       ... kind of the event
+            name    - string    ... name of the changed entry
+        """
+        if mask & IN_Q_OVERFLOW:
+            # events were lost, every directory is listed again
+            for dir in list(self.watches.values()):
+                self.mark(dir)
+            return
+
+        dir = self.watches.get(wd)
+        if dir is None:
+            return
+
+        if mask & IN_IGNORED:
+            # the directory is gone
+            del self.watches[wd]
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            # the parent directory reports the change
+            return
+
+        if not is_relevant(name):
+            return
+        self.mark(dir)
+
+        # new directories (and everything below them) are watched as well
+        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            path = os.path.join(dir, name)
+            for root, dirs, _ in os.walk(path):
+                dirs[:] = [d for d in dirs if is_watched(d)]
+                try:
+                    self.add_watch(root)
+                except OSError:
+                    pass
+
+    def get_mtime(self, dir):
+        """
+        Function to get the mtime of a directory (None if it is gone)
+        """
+        try:
+            return os.stat(dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def run_polling(self):
+        """
+        Function which compares the mtimes of all directories every interval
+        """
+        while not self.stopped.wait(self.interval):
+            for dir in list(self.mtimes):
+                mtime = self.get_mtime(dir)
+                if mtime == self.mtimes[dir]:
+                    continue
+                self.mtimes[dir] = mtime
+
+                if mtime is None:
+                    # the directory is gone, the parent directory reports the change
+                    del self.mtimes[dir]
+                    continue
+                self.mark(dir)
+
+                # new directories are polled as well
+                try:
+                    with os.scandir(dir) as it:
+                        for entry in it:
+                            if entry.is_dir(follow_symlinks=False) and is_watched(entry.path) \
+                               and is_relevant(entry.name) and not entry.path in self.mtimes:
+                                self.mtimes[entry.path] = None
+                except OSError:
+                    pass